@@ -1,10 +1,201 @@
+import hashlib
+import os
+import queue
 import shutil
 import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+import cv2
 import streamlit as st
+import torch
 
+from sorawm.configs import (
+    STREAMLIT_POOL_SIZE,
+    STREAMLIT_RESULT_CACHE_DIR,
+    STREAMLIT_RESULT_CACHE_MAX_BYTES,
+    UPLOAD_CHUNK_SIZE,
+)
 from sorawm.core import SoraWM
+from sorawm.utils.fingerprint_utils import result_cache_key
+
+
+class PipelinePool:
+    """
+    本进程所有浏览器会话共享的 SoraWM 实例池。
+
+    实例按需创建，最多 size 个；实例都在使用时会话排队等待，而不是各自加载模型。
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle: queue.Queue[SoraWM] = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        # torch / OpenCV thread pools are process-wide, split the CPU between pipelines
+        threads = max(1, (os.cpu_count() or 1) // self.size)
+        torch.set_num_threads(threads)
+        cv2.setNumThreads(threads)
+
+    def _create(self) -> SoraWM | None:
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return SoraWM()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def preload(self):
+        """预先加载第一个实例，首个访问者无需等待模型加载"""
+        if self._created == 0:
+            sora_wm = self._create()
+            if sora_wm is not None:
+                self._idle.put(sora_wm)
+
+    def is_busy(self) -> bool:
+        return self._idle.empty() and self._created >= self.size
+
+    @contextmanager
+    def acquire(self):
+        try:
+            sora_wm = self._idle.get_nowait()
+        except queue.Empty:
+            sora_wm = self._create() or self._idle.get()
+        try:
+            yield sora_wm
+        finally:
+            self._idle.put(sora_wm)
+
+
+class ResultCache:
+    """磁盘上的处理结果缓存，键为上传内容哈希与流水线指纹"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.cache_dir / f"{key}{suffix}"
+
+    def get(self, key: str, suffix: str) -> Path | None:
+        path = self._path(key, suffix)
+        with self._lock:
+            if not path.exists():
+                return None
+            # mtime doubles as last-used time for eviction
+            os.utime(path)
+        return path
+
+    def put(self, key: str, output_path: Path) -> Path:
+        path = self._path(key, output_path.suffix)
+        with self._lock:
+            shutil.move(output_path, path)
+            self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: Path):
+        files = sorted(
+            (f for f in self.cache_dir.iterdir() if f.is_file()),
+            key=lambda f: f.stat().st_mtime,
+        )
+        total = sum(f.stat().st_size for f in files)
+        for f in files:
+            if total <= self.max_bytes:
+                break
+            if f == keep:
+                continue
+            total -= f.stat().st_size
+            f.unlink(missing_ok=True)
+
+
+@st.cache_resource(show_spinner=False)
+def get_pipeline_pool() -> PipelinePool:
+    return PipelinePool(STREAMLIT_POOL_SIZE)
+
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache() -> ResultCache:
+    return ResultCache(STREAMLIT_RESULT_CACHE_DIR, STREAMLIT_RESULT_CACHE_MAX_BYTES)
+
+
+def save_upload(uploaded_file, output_path: Path) -> str:
+    """
+    把上传内容按块写入临时文件并返回 sha256。
+
+    st.file_uploader 已把整个上传保存在内存中（BytesIO），这里只是分块写盘、
+    避免再拷贝一份 bytes，并不能降低上传本身的内存占用
+    """
+    sha256 = hashlib.sha256()
+    uploaded_file.seek(0)
+    with open(output_path, "wb") as f:
+        while chunk := uploaded_file.read(UPLOAD_CHUNK_SIZE):
+            sha256.update(chunk)
+            f.write(chunk)
+    return sha256.hexdigest()
+
+
+def show_result(output_path: Path, file_name: str):
+    st.markdown("### Result")
+    st.video(str(output_path))
+
+    # Download button
+    with open(output_path, "rb") as f:
+        st.download_button(
+            label="⬇️ Download Cleaned Video",
+            data=f,
+            file_name=f"cleaned_{file_name}",
+            mime="video/mp4",
+            use_container_width=True,
+        )
+
+
+def process_video(
+    pool: PipelinePool,
+    result_cache: ResultCache,
+    cache_key: str,
+    input_path: Path,
+    file_name: str,
+):
+    output_path = input_path.parent / f"cleaned_{file_name}"
+
+    try:
+        # Create progress bar and status text
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+
+        def update_progress(progress: int):
+            progress_bar.progress(progress / 100)
+            if progress < 50:
+                status_text.text(f"🔍 Detecting watermarks... {progress}%")
+            elif progress < 95:
+                status_text.text(f"🧹 Removing watermarks... {progress}%")
+            else:
+                status_text.text(f"🎵 Merging audio... {progress}%")
+
+        if pool.is_busy():
+            status_text.text("⏳ Waiting for another video to finish...")
+
+        # Run the watermark removal with progress callback
+        with pool.acquire() as sora_wm:
+            sora_wm.run(input_path, output_path, progress_callback=update_progress)
+
+        # Complete the progress bar
+        progress_bar.progress(100)
+        status_text.text("✅ Processing complete!")
+
+        st.success("✅ Watermark removed successfully!")
+
+        show_result(result_cache.put(cache_key, output_path), file_name)
+
+    except Exception as e:
+        st.error(f"❌ Error processing video: {str(e)}")
 
 
 def main():
@@ -15,10 +206,11 @@ def main():
     st.title("🎬 Sora Watermark Cleaner")
     st.markdown("Remove watermarks from Sora-generated videos with ease")
 
-    # Initialize SoraWM
-    if "sora_wm" not in st.session_state:
-        with st.spinner("Loading AI models..."):
-            st.session_state.sora_wm = SoraWM()
+    # Models are loaded once per process and shared by all sessions
+    pool = get_pipeline_pool()
+    with st.spinner("Loading AI models..."):
+        pool.preload()
+    result_cache = get_result_cache()
 
     st.markdown("---")
 
@@ -41,53 +233,17 @@ def main():
 
                 # Save uploaded file
                 input_path = tmp_path / uploaded_file.name
-                with open(input_path, "wb") as f:
-                    f.write(uploaded_file.read())
-
-                # Process video
-                output_path = tmp_path / f"cleaned_{uploaded_file.name}"
-
-                try:
-                    # Create progress bar and status text
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-
-                    def update_progress(progress: int):
-                        progress_bar.progress(progress / 100)
-                        if progress < 50:
-                            status_text.text(f"🔍 Detecting watermarks... {progress}%")
-                        elif progress < 95:
-                            status_text.text(f"🧹 Removing watermarks... {progress}%")
-                        else:
-                            status_text.text(f"🎵 Merging audio... {progress}%")
-
-                    # Run the watermark removal with progress callback
-                    st.session_state.sora_wm.run(
-                        input_path, output_path, progress_callback=update_progress
-                    )
+                content_hash = save_upload(uploaded_file, input_path)
+                cache_key = result_cache_key(content_hash)
 
-                    # Complete the progress bar
-                    progress_bar.progress(100)
-                    status_text.text("✅ Processing complete!")
-
-                    st.success("✅ Watermark removed successfully!")
-
-                    # Display result
-                    st.markdown("### Result")
-                    st.video(str(output_path))
-
-                    # Download button
-                    with open(output_path, "rb") as f:
-                        st.download_button(
-                            label="⬇️ Download Cleaned Video",
-                            data=f,
-                            file_name=f"cleaned_{uploaded_file.name}",
-                            mime="video/mp4",
-                            use_container_width=True,
-                        )
-
-                except Exception as e:
-                    st.error(f"❌ Error processing video: {str(e)}")
+                cached_path = result_cache.get(cache_key, input_path.suffix)
+                if cached_path is not None:
+                    st.success("✅ Watermark removed successfully! (cached result)")
+                    show_result(cached_path, uploaded_file.name)
+                else:
+                    process_video(
+                        pool, result_cache, cache_key, input_path, uploaded_file.name
+                    )
 
     # Footer
     st.markdown("---")
@@ -0,0 +1,350 @@
+"""
+基准测试公共工具
+合成测试视频、配置临时覆盖、峰值内存采样、阶段计时与基线对比
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import ffmpeg
+import numpy as np
+import psutil
+import torch
+
+from sorawm.configs import WATER_MARK_TEMPLATE_IMAGE_PATH
+from sorawm.utils.precision_utils import bbox_iou
+from sorawm.utils.tracing import add_span_listener, remove_span_listener
+
+BBox = Tuple[int, int, int, int]
+
+# 水印宽度占帧宽的比例，与 Sora 成片中的水印大小相近
+TEMPLATE_WIDTH_RATIO = 0.2
+# 水印在锚点之间跳转的间隔（秒），模拟 Sora 水印周期性换位
+TRAJECTORY_HOLD_SECONDS = 1.0
+# 锚点为可放置区域内的相对位置
+TRAJECTORY_ANCHORS = ((0.05, 0.05), (0.9, 0.5), (0.1, 0.9), (0.6, 0.15))
+
+SYNTHETIC_SOURCES = {
+    "testsrc2": "testsrc2=size={width}x{height}:rate={fps}",
+    "noise": "color=c=gray:size={width}x{height}:rate={fps},noise=alls=60:allf=t+u",
+}
+
+
+@dataclass
+class SyntheticClip:
+    path: Path
+    width: int
+    height: int
+    fps: int
+    boxes: List[BBox] = field(default_factory=list)
+
+    @property
+    def frames(self) -> int:
+        return len(self.boxes)
+
+
+def parse_resolution(value: str) -> Tuple[int, int]:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def load_template(width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    读取带透明通道的水印模板并按帧宽缩放
+
+    Returns:
+        (BGR 模板, [0, 1] 浮点 alpha)
+    """
+    template = cv2.imread(str(WATER_MARK_TEMPLATE_IMAGE_PATH), cv2.IMREAD_UNCHANGED)
+    if template is None:
+        raise FileNotFoundError(WATER_MARK_TEMPLATE_IMAGE_PATH)
+    target_w = max(8, int(width * TEMPLATE_WIDTH_RATIO))
+    target_h = max(8, int(template.shape[0] * target_w / template.shape[1]))
+    template = cv2.resize(template, (target_w, target_h), interpolation=cv2.INTER_AREA)
+    if template.shape[2] == 4:
+        alpha = template[:, :, 3:4].astype(np.float32) / 255.0
+    else:
+        alpha = np.ones((*template.shape[:2], 1), dtype=np.float32)
+    return template[:, :, :3], alpha
+
+
+def scripted_trajectory(
+    num_frames: int, fps: int, width: int, height: int, box_w: int, box_h: int
+) -> List[BBox]:
+    """按锚点轮换生成逐帧水印位置"""
+    hold = max(1, int(round(TRAJECTORY_HOLD_SECONDS * fps)))
+    free_w, free_h = width - box_w, height - box_h
+    boxes = []
+    for idx in range(num_frames):
+        ax, ay = TRAJECTORY_ANCHORS[(idx // hold) % len(TRAJECTORY_ANCHORS)]
+        x1, y1 = int(ax * free_w), int(ay * free_h)
+        boxes.append((x1, y1, x1 + box_w, y1 + box_h))
+    return boxes
+
+
+def make_synthetic_video(
+    output_path: Path,
+    width: int,
+    height: int,
+    seconds: float,
+    fps: int = 30,
+    source: str = "testsrc2",
+) -> SyntheticClip:
+    """
+    用 ffmpeg lavfi 生成背景，逐帧叠加水印模板后编码为带静音音轨的 mp4
+
+    Args:
+        output_path: 输出视频路径
+        width: 宽度
+        height: 高度
+        seconds: 时长
+        fps: 帧率
+        source: 背景来源，testsrc2 或 noise
+
+    Returns:
+        SyntheticClip，boxes 为逐帧真实水印框
+    """
+    if source not in SYNTHETIC_SOURCES:
+        raise ValueError(f"Unknown source {source}, choose from {list(SYNTHETIC_SOURCES)}")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    num_frames = int(round(seconds * fps))
+    template, alpha = load_template(width)
+    box_h, box_w = template.shape[:2]
+    boxes = scripted_trajectory(num_frames, fps, width, height, box_w, box_h)
+
+    process_in = (
+        ffmpeg.input(SYNTHETIC_SOURCES[source].format(width=width, height=height, fps=fps), f="lavfi")
+        .output("pipe:", format="rawvideo", pix_fmt="bgr24", vframes=num_frames)
+        .global_args("-loglevel", "error")
+        .run_async(pipe_stdout=True)
+    )
+    video_in = ffmpeg.input(
+        "pipe:", format="rawvideo", pix_fmt="bgr24", s=f"{width}x{height}", r=fps
+    )
+    # merge_audio_track 需要输入带音轨
+    audio_in = ffmpeg.input("anullsrc=r=44100:cl=mono", f="lavfi", t=seconds)
+    process_out = (
+        ffmpeg.output(
+            video_in,
+            audio_in,
+            str(output_path),
+            vcodec="libx264",
+            pix_fmt="yuv420p",
+            crf=18,
+            acodec="aac",
+            shortest=None,
+        )
+        .overwrite_output()
+        .global_args("-loglevel", "error")
+        .run_async(pipe_stdin=True)
+    )
+
+    frame_size = width * height * 3
+    try:
+        for x1, y1, x2, y2 in boxes:
+            buffer = process_in.stdout.read(frame_size)
+            if len(buffer) < frame_size:
+                raise RuntimeError(f"ffmpeg source {source} ended early")
+            frame = np.frombuffer(buffer, np.uint8).reshape(height, width, 3).copy()
+            region = frame[y1:y2, x1:x2].astype(np.float32)
+            frame[y1:y2, x1:x2] = (
+                region * (1 - alpha) + template.astype(np.float32) * alpha
+            ).astype(np.uint8)
+            process_out.stdin.write(frame.tobytes())
+    finally:
+        process_in.stdout.close()
+        process_in.wait()
+        process_out.stdin.close()
+        process_out.wait()
+
+    return SyntheticClip(output_path, width, height, fps, boxes)
+
+
+def detection_accuracy(
+    predicted: Sequence[Optional[BBox]], truth: Sequence[BBox], threshold: float = 0.5
+) -> Dict[str, float]:
+    """逐帧 IoU 均值（漏检记 0）与 IoU 超过阈值的帧占比"""
+    ious = [0.0 if p is None else bbox_iou(p, t) for p, t in zip(predicted, truth)]
+    ious += [0.0] * (len(truth) - len(ious))
+    if not ious:
+        return {"mean_iou": 0.0, "hit_rate": 0.0}
+    return {
+        "mean_iou": float(np.mean(ious)),
+        "hit_rate": float(np.mean([iou >= threshold for iou in ious])),
+    }
+
+
+@contextmanager
+def override_configs(**values) -> Iterator[None]:
+    """
+    临时覆盖配置项
+
+    各模块以 from sorawm.configs import X 绑定常量，因此同时替换 sorawm.configs
+    与所有已加载 sorawm 模块中的同名全局变量，退出时恢复
+    """
+    patched = []
+    for module_name, module in list(sys.modules.items()):
+        if module is None or not (module_name == "sorawm" or module_name.startswith("sorawm.")):
+            continue
+        for key, value in values.items():
+            if key in vars(module):
+                patched.append((module, key, getattr(module, key)))
+                setattr(module, key, value)
+    try:
+        yield
+    finally:
+        for module, key, original in reversed(patched):
+            setattr(module, key, original)
+
+
+class PeakRSSSampler:
+    """后台线程采样本进程及子进程（ffmpeg）的常驻内存峰值"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._process = psutil.Process(os.getpid())
+
+    def _sample(self) -> int:
+        total = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "PeakRSSSampler":
+        self.peak_bytes = self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._sample())
+
+
+class StageTimer:
+    """通过 span 监听器累计各阶段耗时与条数，不导出 trace 文件"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.items: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, seconds: float, items: int):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.items[stage] = self.items.get(stage, 0) + items
+
+    def __enter__(self) -> "StageTimer":
+        add_span_listener(self)
+        return self
+
+    def __exit__(self, *exc):
+        remove_span_listener(self)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {
+            stage: {"seconds": self.seconds[stage], "items": self.items[stage]}
+            for stage in sorted(self.seconds, key=self.seconds.get, reverse=True)
+        }
+
+
+def system_info() -> Dict[str, Any]:
+    info = {
+        "cpu_count": psutil.cpu_count(),
+        "memory_total": psutil.virtual_memory().total,
+        "pytorch_version": torch.__version__,
+        "cuda_available": torch.cuda.is_available(),
+        "torch_threads": torch.get_num_threads(),
+    }
+    if torch.cuda.is_available():
+        info["gpu_name"] = torch.cuda.get_device_name(0)
+    return info
+
+
+def timed(fn, *args, **kwargs) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def compare_to_baseline(
+    current: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerances: Dict[str, Tuple[str, float]],
+) -> List[str]:
+    """
+    按容差带对比当前结果与基线
+
+    Args:
+        current: {用例名: {指标: 值}}
+        baseline: 同结构的基线
+        tolerances: {指标: (方向, 容差)}，方向 higher 表示越大越好，容差为相对比例；
+            方向 higher_abs / lower_abs 使用绝对容差
+
+    Returns:
+        回归描述列表，为空表示全部在容差内
+    """
+    regressions = []
+    for case, metrics in current.items():
+        reference = baseline.get(case)
+        if reference is None:
+            continue
+        for metric, (direction, tolerance) in tolerances.items():
+            if metric not in metrics or metric not in reference:
+                continue
+            value, expected = metrics[metric], reference[metric]
+            if direction == "higher":
+                limit = expected * (1 - tolerance)
+                failed = value < limit
+            elif direction == "lower":
+                limit = expected * (1 + tolerance)
+                failed = value > limit
+            elif direction == "higher_abs":
+                limit = expected - tolerance
+                failed = value < limit
+            elif direction == "lower_abs":
+                limit = expected + tolerance
+                failed = value > limit
+            else:
+                raise ValueError(f"Unknown direction {direction}")
+            if failed:
+                regressions.append(
+                    f"{case}.{metric}: {value:.4g} vs baseline {expected:.4g} (limit {limit:.4g})"
+                )
+    return regressions
+
+
+def save_json(data: Dict[str, Any], output_path: Path):
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def load_json(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def timestamp() -> str:
+    return datetime.now().strftime("%Y%m%d_%H%M%S")
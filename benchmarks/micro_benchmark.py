@@ -0,0 +1,322 @@
+"""
+sorawm.utils 热点函数微基准
+在常见帧尺寸与序列长度下测量逐帧工具函数的 ops/s 与内存分配（tracemalloc），
+结果写入 JSON，并可与基线对比标记回归。
+
+用法:
+    python -m benchmarks.micro_benchmark
+    python -m benchmarks.micro_benchmark --filter mask --save-baseline benchmarks/baselines/micro.json
+    python -m benchmarks.micro_benchmark --baseline benchmarks/baselines/micro.json
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from benchmarks.bench_utils import (
+    compare_to_baseline,
+    load_json,
+    load_template,
+    parse_resolution,
+    save_json,
+    scripted_trajectory,
+    system_info,
+    timestamp,
+)
+
+FRAME_SIZES = ("1280x720", "1920x1080")
+SEQUENCE_LENGTHS = (150, 600, 1800)
+# 变点检测为 O(n^2)，只测较短序列
+BKPS_SEQUENCE_LENGTHS = (150, 600)
+
+# 回归容差: (方向, 容差)
+DEFAULT_TOLERANCES = {
+    "ops_per_sec": ("higher", 0.20),
+    "peak_alloc_kb": ("lower", 0.25),
+}
+
+
+@dataclass
+class MicroCase:
+    name: str
+    # setup 返回无参可调用对象，每次调用处理一个单位（一帧或一段序列）
+    setup: Callable[[], Callable[[], Any]]
+
+
+def _jittered_boxes(count: int, width: int, height: int, seed: int = 0, miss_rate: float = 0.1):
+    """脚本轨迹加像素级抖动与随机漏检，模拟检测器输出"""
+    rng = np.random.default_rng(seed)
+    # 与水印模板（286x234）同宽高比
+    box_w = int(width * 0.2)
+    box_h = int(box_w * 234 / 286)
+    boxes = []
+    for x1, y1, x2, y2 in scripted_trajectory(count, 30, width, height, box_w, box_h):
+        if rng.random() < miss_rate:
+            boxes.append(None)
+            continue
+        dx, dy = rng.integers(-3, 4, size=2)
+        boxes.append((int(x1 + dx), int(y1 + dy), int(x2 + dx), int(y2 + dy)))
+    return boxes
+
+
+def _watermarked_frame(width: int, height: int, seed: int = 0):
+    """随机背景上叠加水印模板，返回 (帧, 水印框)"""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    template, alpha = load_template(width)
+    th, tw = template.shape[:2]
+    x1, y1 = width // 10, height // 10
+    region = frame[y1 : y1 + th, x1 : x1 + tw].astype(np.float32)
+    frame[y1 : y1 + th, x1 : x1 + tw] = (
+        region * (1 - alpha) + template.astype(np.float32) * alpha
+    ).astype(np.uint8)
+    return frame, (x1, y1, x1 + tw, y1 + th)
+
+
+def _cycle(items: List[Any]) -> Iterator[Tuple[int, Any]]:
+    idx = 0
+    while True:
+        yield idx, items[idx % len(items)]
+        idx += 1
+
+
+def build_cases() -> List[MicroCase]:
+    from sorawm.utils.bbox_utils import expand_and_clip_bbox
+    from sorawm.utils.enhanced_bbox_utils import enhanced_smooth_bbox_sequence
+    from sorawm.utils.enhanced_mask_utils import (
+        EnhancedMaskGenerator,
+        build_enhanced_dilated_mask,
+    )
+    from sorawm.utils.imputation_utils import find_2d_data_bkps
+    from sorawm.utils.template_matching import WatermarkTemplateMatcher
+    from sorawm.utils.temporal_detector import TemporalConsistencyDetector
+
+    cases = []
+    for size in FRAME_SIZES:
+        width, height = parse_resolution(size)
+
+        def expand_setup(width=width, height=height):
+            boxes = _cycle([b for b in _jittered_boxes(300, width, height) if b])
+            return lambda: expand_and_clip_bbox(
+                next(boxes)[1], width, height, padding_ratio=0.3, min_edge=32
+            )
+
+        def mask_setup(width=width, height=height):
+            generator = EnhancedMaskGenerator()
+            boxes = _cycle([b for b in _jittered_boxes(300, width, height) if b])
+            previous = [None]
+
+            def run():
+                idx, bbox = next(boxes)
+                mask = build_enhanced_dilated_mask(
+                    height,
+                    width,
+                    bbox,
+                    confidence=0.8,
+                    previous_bbox=previous[0],
+                    frame_idx=idx,
+                    generator=generator,
+                )
+                previous[0] = bbox
+                return mask
+
+            return run
+
+        def match_full_setup(width=width, height=height):
+            matcher = WatermarkTemplateMatcher()
+            frame, _ = _watermarked_frame(width, height)
+            return lambda: matcher.match(frame)
+
+        def match_local_setup(width=width, height=height):
+            matcher = WatermarkTemplateMatcher()
+            frame, bbox = _watermarked_frame(width, height)
+            return lambda: matcher.match(frame, bbox)
+
+        cases += [
+            MicroCase(f"expand_and_clip_bbox@{size}", expand_setup),
+            MicroCase(f"build_enhanced_dilated_mask@{size}", mask_setup),
+            MicroCase(f"template_match_full@{size}", match_full_setup),
+            MicroCase(f"template_match_local@{size}", match_local_setup),
+        ]
+
+    def tracker_setup():
+        detector = TemporalConsistencyDetector()
+        boxes = _cycle(_jittered_boxes(600, 1280, 720))
+
+        def run():
+            idx, bbox = next(boxes)
+            result = {
+                "detected": bbox is not None,
+                "bbox": bbox,
+                "confidence": 0.0 if bbox is None else 0.7,
+                "center": None
+                if bbox is None
+                else ((bbox[0] + bbox[2]) // 2, (bbox[1] + bbox[3]) // 2),
+            }
+            return detector.process_detection(result, idx)
+
+        return run
+
+    cases.append(MicroCase("temporal_process_detection", tracker_setup))
+
+    for length in SEQUENCE_LENGTHS:
+
+        def smooth_setup(length=length):
+            boxes = _jittered_boxes(length, 1280, 720)
+            confidences = [0.0 if b is None else 0.7 for b in boxes]
+            return lambda: enhanced_smooth_bbox_sequence(boxes, confidences, 1280, 720)
+
+        cases.append(MicroCase(f"enhanced_smooth_bbox_sequence@{length}", smooth_setup))
+
+    for length in BKPS_SEQUENCE_LENGTHS:
+
+        def bkps_setup(length=length):
+            centers = [
+                None if b is None else ((b[0] + b[2]) // 2, (b[1] + b[3]) // 2)
+                for b in _jittered_boxes(length, 1280, 720)
+            ]
+            return lambda: find_2d_data_bkps(centers)
+
+        cases.append(MicroCase(f"find_2d_data_bkps@{length}", bkps_setup))
+
+    return cases
+
+
+def measure_speed(fn: Callable[[], Any], min_time: float, rounds: int) -> Dict[str, float]:
+    """
+    先预热并标定每轮调用次数，使单轮耗时约为 min_time，再取多轮中位数
+
+    Returns:
+        ops_per_sec（中位数）、best_ops_per_sec 与每轮调用次数
+    """
+    fn()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    rates = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rates.append(number / (time.perf_counter() - start))
+    return {
+        "ops_per_sec": statistics.median(rates),
+        "best_ops_per_sec": max(rates),
+        "calls_per_round": number,
+    }
+
+
+def measure_allocations(fn: Callable[[], Any], calls: int) -> Dict[str, float]:
+    """
+    tracemalloc 下单次调用的峰值分配与多次调用后的净增内存
+
+    与计时分开运行，避免追踪开销影响 ops/s
+    """
+    fn()
+    tracemalloc.start()
+    try:
+        peaks = []
+        baseline, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - start)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_alloc_kb": statistics.median(peaks) / 1024,
+        "retained_kb_per_call": max(0, current - baseline) / 1024 / calls,
+    }
+
+
+def run_cases(cases: List[MicroCase], min_time: float, rounds: int, alloc_calls: int):
+    from loguru import logger
+
+    results = {}
+    for case in cases:
+        logger.info(f"Benchmarking {case.name}")
+        try:
+            results[case.name] = {
+                **measure_speed(case.setup(), min_time, rounds),
+                # 有状态的用例（追踪器、掩码生成器）需重新构造，保证两次测量起点一致
+                **measure_allocations(case.setup(), alloc_calls),
+            }
+        except Exception as e:
+            logger.error(f"{case.name} failed: {e}")
+            results[case.name] = {"error": str(e)}
+    return results
+
+
+def print_report(results: Dict[str, Dict[str, Any]]):
+    print(f"{'case':<46}{'ops/s':>12}{'peak KB':>12}{'retained KB':>13}")
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<46}  failed: {r['error']}")
+            continue
+        print(
+            f"{name:<46}{r['ops_per_sec']:>12.1f}{r['peak_alloc_kb']:>12.1f}"
+            f"{r['retained_kb_per_call']:>13.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sorawm.utils 热点函数微基准")
+    parser.add_argument("--filter", help="只运行名称包含该子串的用例")
+    parser.add_argument("--min-time", type=float, default=0.2, help="单轮最短耗时（秒）")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--alloc-calls", type=int, default=20)
+    parser.add_argument("--output", default="benchmark_output/micro")
+    parser.add_argument("--baseline", help="对比的基线 JSON，超出容差时以非零状态退出")
+    parser.add_argument("--save-baseline", help="把本次结果另存为基线")
+    args = parser.parse_args()
+
+    from loguru import logger
+
+    cases = build_cases()
+    if args.filter:
+        cases = [case for case in cases if args.filter in case.name]
+
+    run_id = timestamp()
+    results = {
+        "test_info": {"timestamp": run_id, "system_info": system_info()},
+        "cases": run_cases(cases, args.min_time, args.rounds, args.alloc_calls),
+    }
+    output_path = Path(args.output) / f"micro_results_{run_id}.json"
+    save_json(results, output_path)
+    logger.info(f"Results saved to: {output_path}")
+    print_report(results["cases"])
+
+    if args.save_baseline:
+        save_json(results, Path(args.save_baseline))
+        logger.info(f"Baseline saved to: {args.save_baseline}")
+
+    if args.baseline:
+        baseline = load_json(Path(args.baseline))
+        current = {k: v for k, v in results["cases"].items() if "error" not in v}
+        regressions = compare_to_baseline(current, baseline["cases"], DEFAULT_TOLERANCES)
+        regressions += [f"{k}: failed" for k, v in results["cases"].items() if "error" in v]
+        if regressions:
+            logger.error("Regressions against baseline:\n" + "\n".join(regressions))
+            sys.exit(1)
+        logger.info("All cases within baseline tolerances")
+
+
+if __name__ == "__main__":
+    main()
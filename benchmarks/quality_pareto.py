@@ -0,0 +1,359 @@
+"""
+质量 / 速度 Pareto 评估
+在参考视频上以多种配置运行流水线，与参考配置（整帧修复、fp32）的输出对比：
+掩码区域 PSNR / SSIM、ROI 内帧间闪烁、掩码外像素保真度与吞吐，
+输出 Pareto 表并按门限给出通过 / 失败，可在 CPU CI 中使用。
+
+用法:
+    python -m benchmarks.quality_pareto --cpu
+    python -m benchmarks.quality_pareto --cpu --videos resources/dog_vs_sam.mp4
+"""
+
+import argparse
+import math
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+REFERENCE_CONFIG = "reference"
+
+# 候选配置；检测步长、补丁复用等开关接入配置后在此添加即可
+CONFIGURATIONS: Dict[str, Dict[str, Any]] = {
+    REFERENCE_CONFIG: {
+        "ENABLE_ROI_COMPOSITING": False,
+        "LAMA_CPU_PRECISION": "fp32",
+        "YOLO_CPU_PRECISION": "fp32",
+    },
+    "roi": {"ENABLE_ROI_COMPOSITING": True},
+    "roi_margin_64": {"ENABLE_ROI_COMPOSITING": True, "ROI_CONTEXT_MARGIN": 64},
+    "lama_bf16": {"ENABLE_ROI_COMPOSITING": True, "LAMA_CPU_PRECISION": "bf16"},
+    "yolo_int8": {"ENABLE_ROI_COMPOSITING": True, "YOLO_CPU_PRECISION": "int8_dynamic"},
+}
+
+# 在 SoraWM 构造时读取的配置，取值不同需要单独的实例
+INIT_TIME_KEYS = ("LAMA_CPU_PRECISION", "YOLO_CPU_PRECISION", "USE_FP16")
+
+# 门限默认值
+GATE_MIN_MASKED_PSNR = 30.0  # 掩码区域相对参考输出的 PSNR 下限（dB）
+GATE_MIN_MASKED_SSIM = 0.90  # 掩码区域 SSIM 下限
+GATE_MIN_OUTSIDE_PSNR = 35.0  # 掩码外相对输入帧的 PSNR 下限（dB）
+GATE_MAX_FLICKER_INCREASE = 1.0  # ROI 帧间平均绝对差相对参考的最大增量（灰度级）
+
+# 掩码外区域额外排除的边距，覆盖掩码膨胀与羽化
+OUTSIDE_MARGIN_PX = 16
+# 完全一致时 PSNR 为 inf，求均值前截断
+PSNR_CAP = 100.0
+
+# Pareto 目标: (指标, 是否越大越好)
+PARETO_OBJECTIVES = (
+    ("processing_fps", True),
+    ("masked_psnr", True),
+    ("masked_ssim", True),
+    ("outside_psnr", True),
+    ("flicker", False),
+)
+
+
+def ssim(reference, candidate) -> float:
+    """灰度 SSIM，11x11 高斯窗口（sigma 1.5）"""
+    import cv2
+    import numpy as np
+
+    a = cv2.cvtColor(reference, cv2.COLOR_BGR2GRAY).astype(np.float64)
+    b = cv2.cvtColor(candidate, cv2.COLOR_BGR2GRAY).astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def blur(x):
+        return cv2.GaussianBlur(x, (11, 11), 1.5)
+
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a**2
+    var_b = blur(b * b) - mu_b**2
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / (
+        (mu_a**2 + mu_b**2 + c1) * (var_a + var_b + c2)
+    )
+    return float(ssim_map.mean())
+
+
+def evaluate_outputs(
+    input_path: Path,
+    reference_path: Path,
+    candidate_path: Path,
+    boxes: Sequence[Optional[Tuple[int, int, int, int]]],
+) -> Dict[str, float]:
+    """
+    逐帧对比候选输出与参考输出 / 输入帧
+
+    Args:
+        input_path: 原始输入视频
+        reference_path: 参考配置的输出
+        candidate_path: 候选配置的输出
+        boxes: 逐帧修复区域（已扩展），None 表示该帧无水印
+
+    Returns:
+        masked_psnr / masked_ssim / flicker / outside_psnr 的逐帧均值
+    """
+    import numpy as np
+
+    from sorawm.utils.precision_utils import masked_psnr
+    from sorawm.utils.video_utils import VideoLoader
+
+    masked_psnrs, masked_ssims, flickers, outside_psnrs = [], [], [], []
+    previous = None
+    frames = zip(
+        VideoLoader(input_path), VideoLoader(reference_path), VideoLoader(candidate_path)
+    )
+    for idx, (source, reference, candidate) in enumerate(frames):
+        height, width = source.shape[:2]
+        box = boxes[idx] if idx < len(boxes) else None
+        outside = np.ones((height, width), dtype=np.uint8)
+        if box is not None:
+            x1, y1, x2, y2 = box
+            ref_roi, cand_roi = reference[y1:y2, x1:x2], candidate[y1:y2, x1:x2]
+            masked_psnrs.append(
+                min(PSNR_CAP, masked_psnr(ref_roi, cand_roi, np.ones(ref_roi.shape[:2])))
+            )
+            masked_ssims.append(ssim(ref_roi, cand_roi))
+            if previous is not None:
+                flickers.append(
+                    float(
+                        np.mean(
+                            np.abs(
+                                cand_roi.astype(np.int16)
+                                - previous[y1:y2, x1:x2].astype(np.int16)
+                            )
+                        )
+                    )
+                )
+            outside[
+                max(0, y1 - OUTSIDE_MARGIN_PX) : y2 + OUTSIDE_MARGIN_PX,
+                max(0, x1 - OUTSIDE_MARGIN_PX) : x2 + OUTSIDE_MARGIN_PX,
+            ] = 0
+        outside_psnrs.append(min(PSNR_CAP, masked_psnr(source, candidate, outside)))
+        previous = candidate
+
+    def mean(values: List[float]) -> float:
+        return float(np.mean(values)) if values else math.nan
+
+    return {
+        "masked_psnr": mean(masked_psnrs),
+        "masked_ssim": mean(masked_ssims),
+        "flicker": mean(flickers),
+        "outside_psnr": mean(outside_psnrs),
+    }
+
+
+def repair_boxes(bboxes, width: int, height: int):
+    """把检测框扩展为与流水线一致的修复区域"""
+    from sorawm.configs import BBOX_MIN_EDGE_PX, BBOX_PADDING_RATIO
+    from sorawm.utils.bbox_utils import expand_and_clip_bbox
+
+    return [
+        None
+        if bbox is None
+        else expand_and_clip_bbox(
+            bbox, width, height, padding_ratio=BBOX_PADDING_RATIO, min_edge=BBOX_MIN_EDGE_PX
+        )
+        for bbox in bboxes
+    ]
+
+
+class PipelinePool:
+    """按构造期配置缓存 SoraWM 实例，避免重复加载模型"""
+
+    def __init__(self):
+        self._instances = {}
+
+    def get(self, overrides: Dict[str, Any]):
+        from benchmarks.bench_utils import override_configs
+        from sorawm.core import SoraWM
+
+        key = tuple((k, overrides.get(k)) for k in INIT_TIME_KEYS)
+        if key not in self._instances:
+            with override_configs(**overrides):
+                self._instances[key] = SoraWM()
+        return self._instances[key]
+
+
+def run_video(video_path: Path, output_dir: Path, configs: List[str], pool: PipelinePool):
+    """
+    在一段视频上运行全部配置并与参考输出对比
+
+    Returns:
+        {配置名: 指标}
+    """
+    from loguru import logger
+
+    from benchmarks.bench_utils import override_configs, timed
+    from sorawm.utils.video_utils import VideoLoader
+
+    loader = VideoLoader(video_path)
+    names = [REFERENCE_CONFIG] + [c for c in configs if c != REFERENCE_CONFIG]
+    outputs, results = {}, {}
+    boxes = None
+    for name in names:
+        overrides = {**CONFIGURATIONS[REFERENCE_CONFIG], **CONFIGURATIONS[name]}
+        output_path = output_dir / f"{video_path.stem}_{name}.mp4"
+        logger.info(f"Running {name} on {video_path}")
+        sora_wm = pool.get(overrides)
+        with override_configs(**overrides):
+            _, elapsed = timed(sora_wm.run, video_path, output_path)
+        outputs[name] = output_path
+        if name == REFERENCE_CONFIG:
+            boxes = repair_boxes(sora_wm.last_bboxes, loader.width, loader.height)
+        results[name] = {
+            "processing_fps": loader.total_frames / elapsed,
+            "total_time": elapsed,
+        }
+
+    for name in names:
+        results[name].update(
+            evaluate_outputs(video_path, outputs[REFERENCE_CONFIG], outputs[name], boxes)
+        )
+    reference_flicker = results[REFERENCE_CONFIG]["flicker"]
+    for metrics in results.values():
+        metrics["flicker_increase"] = metrics["flicker"] - reference_flicker
+    return results
+
+
+def aggregate(per_video: Dict[str, Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """跨视频取均值（忽略 nan）"""
+    import numpy as np
+
+    merged: Dict[str, Dict[str, List[float]]] = {}
+    for results in per_video.values():
+        for name, metrics in results.items():
+            for metric, value in metrics.items():
+                merged.setdefault(name, {}).setdefault(metric, []).append(value)
+    return {
+        name: {
+            metric: float(np.nanmean(values)) if not all(map(math.isnan, values)) else math.nan
+            for metric, values in metrics.items()
+        }
+        for name, metrics in merged.items()
+    }
+
+
+def pareto_front(results: Dict[str, Dict[str, float]]) -> List[str]:
+    """返回不被其他配置支配的配置名"""
+
+    def score(metrics, metric, higher):
+        value = metrics.get(metric, math.nan)
+        if math.isnan(value):
+            value = -math.inf if higher else math.inf
+        return value if higher else -value
+
+    def dominates(a, b):
+        pairs = [
+            (score(a, m, h), score(b, m, h)) for m, h in PARETO_OBJECTIVES
+        ]
+        return all(x >= y for x, y in pairs) and any(x > y for x, y in pairs)
+
+    return [
+        name
+        for name, metrics in results.items()
+        if not any(dominates(other, metrics) for o, other in results.items() if o != name)
+    ]
+
+
+def apply_gate(results: Dict[str, Dict[str, float]], args) -> Dict[str, List[str]]:
+    """返回每个候选配置未通过的门限，参考配置不参与"""
+    failures = {}
+    for name, metrics in results.items():
+        if name == REFERENCE_CONFIG:
+            continue
+        reasons = []
+        if not metrics["masked_psnr"] >= args.min_masked_psnr:
+            reasons.append(f"masked_psnr {metrics['masked_psnr']:.2f} < {args.min_masked_psnr}")
+        if not metrics["masked_ssim"] >= args.min_masked_ssim:
+            reasons.append(f"masked_ssim {metrics['masked_ssim']:.3f} < {args.min_masked_ssim}")
+        if not metrics["outside_psnr"] >= args.min_outside_psnr:
+            reasons.append(f"outside_psnr {metrics['outside_psnr']:.2f} < {args.min_outside_psnr}")
+        if metrics["flicker_increase"] > args.max_flicker_increase:
+            reasons.append(
+                f"flicker_increase {metrics['flicker_increase']:.2f} > {args.max_flicker_increase}"
+            )
+        failures[name] = reasons
+    return failures
+
+
+def format_table(
+    results: Dict[str, Dict[str, float]], front: List[str], failures: Dict[str, List[str]]
+) -> str:
+    lines = [
+        f"{'config':<18}{'fps':>8}{'PSNR':>8}{'SSIM':>8}{'outside':>9}"
+        f"{'flicker':>9}{'Δflicker':>10}{'pareto':>8}{'gate':>7}"
+    ]
+    for name, m in sorted(results.items(), key=lambda kv: -kv[1]["processing_fps"]):
+        gate = "-" if name == REFERENCE_CONFIG else ("FAIL" if failures.get(name) else "PASS")
+        lines.append(
+            f"{name:<18}{m['processing_fps']:>8.2f}{m['masked_psnr']:>8.2f}"
+            f"{m['masked_ssim']:>8.3f}{m['outside_psnr']:>9.2f}{m['flicker']:>9.2f}"
+            f"{m['flicker_increase']:>10.2f}{'*' if name in front else '':>8}{gate:>7}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SoraWM 质量 / 速度 Pareto 评估")
+    parser.add_argument("--videos", nargs="*", help="参考视频；缺省时生成合成视频")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS))
+    parser.add_argument("--output", default="benchmark_output/quality")
+    parser.add_argument("--min-masked-psnr", type=float, default=GATE_MIN_MASKED_PSNR)
+    parser.add_argument("--min-masked-ssim", type=float, default=GATE_MIN_MASKED_SSIM)
+    parser.add_argument("--min-outside-psnr", type=float, default=GATE_MIN_OUTSIDE_PSNR)
+    parser.add_argument("--max-flicker-increase", type=float, default=GATE_MAX_FLICKER_INCREASE)
+    parser.add_argument("--cpu", action="store_true", help="隐藏 CUDA 设备，只用 CPU")
+    args = parser.parse_args()
+
+    if args.cpu:
+        # 需在导入 torch 之前设置
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+    from loguru import logger
+
+    from benchmarks.bench_utils import make_synthetic_video, save_json, system_info, timestamp
+
+    output_dir = Path(args.output)
+    if args.videos:
+        videos = [Path(v) for v in args.videos]
+    else:
+        videos = [
+            make_synthetic_video(output_dir / "videos" / f"{source}_640x360.mp4", 640, 360, 2.0, source=source).path
+            for source in ("testsrc2", "noise")
+        ]
+
+    pool = PipelinePool()
+    per_video = {str(v): run_video(v, output_dir, args.configs, pool) for v in videos}
+    results = aggregate(per_video)
+    front = pareto_front(results)
+    failures = apply_gate(results, args)
+    table = format_table(results, front, failures)
+
+    run_id = timestamp()
+    save_json(
+        {
+            "test_info": {"timestamp": run_id, "system_info": system_info()},
+            "configurations": {name: CONFIGURATIONS[name] for name in results},
+            "per_video": per_video,
+            "summary": results,
+            "pareto_front": front,
+            "gate_failures": failures,
+        },
+        output_dir / f"quality_pareto_{run_id}.json",
+    )
+    (output_dir / f"quality_pareto_{run_id}.txt").write_text(table + "\n", encoding="utf-8")
+    print(table)
+
+    failed = {name: reasons for name, reasons in failures.items() if reasons}
+    if failed:
+        for name, reasons in failed.items():
+            logger.error(f"{name} failed quality gate: {'; '.join(reasons)}")
+        sys.exit(1)
+    logger.info("All configurations passed the quality gate")
+
+
+if __name__ == "__main__":
+    main()
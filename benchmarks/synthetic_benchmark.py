@@ -0,0 +1,189 @@
+"""
+合成视频端到端基准测试
+本地用 ffmpeg lavfi 生成带已知水印轨迹的测试视频，不需要真实 Sora 视频、GPU 或网络
+（模型权重需已下载到本地）。对每种处理模式记录 FPS、各阶段耗时、峰值内存与检测 IoU，
+结果写入 JSON，并可与保存的基线按容差带对比。
+
+用法:
+    python -m benchmarks.synthetic_benchmark --cpu
+    python -m benchmarks.synthetic_benchmark --cpu --save-baseline benchmarks/baselines/synthetic_cpu.json
+    python -m benchmarks.synthetic_benchmark --cpu --baseline benchmarks/baselines/synthetic_cpu.json
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 基线对比容差: (方向, 容差)
+DEFAULT_TOLERANCES = {
+    "processing_fps": ("higher", 0.15),
+    "peak_rss_mb": ("lower", 0.20),
+    "mean_iou": ("higher_abs", 0.05),
+    "hit_rate": ("higher_abs", 0.05),
+}
+
+# 各处理模式对应的配置覆盖
+MODES: Dict[str, Dict[str, Any]] = {
+    "original": {"ENABLE_BATCH_PROCESSING": False},
+    "batch": {"ENABLE_BATCH_PROCESSING": True},
+    "batch_full_frame": {
+        "ENABLE_BATCH_PROCESSING": True,
+        "ENABLE_ROI_COMPOSITING": False,
+    },
+}
+
+
+def run_case(sora_wm, clip, mode: str, output_dir: Path) -> Dict[str, Any]:
+    """
+    在一段合成视频上以指定模式运行 SoraWM
+
+    Returns:
+        单个用例的指标字典
+    """
+    from benchmarks.bench_utils import (
+        PeakRSSSampler,
+        StageTimer,
+        detection_accuracy,
+        override_configs,
+        timed,
+    )
+
+    output_path = output_dir / f"{clip.path.stem}_{mode}.mp4"
+    with override_configs(**MODES[mode]), StageTimer() as stages, PeakRSSSampler() as rss:
+        _, elapsed = timed(sora_wm.run, clip.path, output_path)
+
+    accuracy = detection_accuracy(sora_wm.last_bboxes, clip.boxes)
+    return {
+        "mode": mode,
+        "width": clip.width,
+        "height": clip.height,
+        "frames": clip.frames,
+        "total_time": elapsed,
+        "processing_fps": clip.frames / elapsed,
+        "peak_rss_mb": rss.peak_bytes / (1024 * 1024),
+        **accuracy,
+        "stages": stages.as_dict(),
+    }
+
+
+def run_suite(args) -> Dict[str, Any]:
+    from loguru import logger
+
+    from benchmarks.bench_utils import (
+        make_synthetic_video,
+        parse_resolution,
+        system_info,
+        timed,
+        timestamp,
+    )
+    from sorawm.core import SoraWM
+
+    output_dir = Path(args.output)
+    video_dir = output_dir / "videos"
+
+    sora_wm, load_time = timed(SoraWM)
+    logger.info(f"SoraWM loaded in {load_time:.2f}s")
+
+    results = {
+        "test_info": {
+            "timestamp": timestamp(),
+            "source": args.source,
+            "model_load_time": load_time,
+            "system_info": system_info(),
+        },
+        "cases": {},
+    }
+    for resolution in args.resolutions:
+        width, height = parse_resolution(resolution)
+        for seconds in args.durations:
+            clip = make_synthetic_video(
+                video_dir / f"{args.source}_{width}x{height}_{seconds:g}s.mp4",
+                width,
+                height,
+                seconds,
+                fps=args.fps,
+                source=args.source,
+            )
+            for mode in args.modes:
+                case_name = f"{mode}@{width}x{height}x{clip.frames}"
+                logger.info(f"Running case {case_name}")
+                try:
+                    case = run_case(sora_wm, clip, mode, output_dir)
+                except Exception as e:
+                    logger.error(f"Case {case_name} failed: {e}")
+                    case = {"mode": mode, "error": str(e)}
+                results["cases"][case_name] = case
+    return results
+
+
+def print_report(results: Dict[str, Any]):
+    print(f"{'case':<36}{'fps':>10}{'peak MB':>10}{'IoU':>8}{'hit':>8}  top stages")
+    for name, case in results["cases"].items():
+        if "error" in case:
+            print(f"{name:<36}  failed: {case['error']}")
+            continue
+        top = ", ".join(
+            f"{stage} {stats['seconds']:.2f}s"
+            for stage, stats in list(case["stages"].items())[:3]
+        )
+        print(
+            f"{name:<36}{case['processing_fps']:>10.2f}{case['peak_rss_mb']:>10.0f}"
+            f"{case['mean_iou']:>8.3f}{case['hit_rate']:>8.2f}  {top}"
+        )
+
+
+def check_baseline(results: Dict[str, Any], baseline_path: Path) -> List[str]:
+    from benchmarks.bench_utils import compare_to_baseline, load_json
+
+    baseline = load_json(baseline_path)
+    current = {k: v for k, v in results["cases"].items() if "error" not in v}
+    reference = {k: v for k, v in baseline["cases"].items() if "error" not in v}
+    regressions = compare_to_baseline(current, reference, DEFAULT_TOLERANCES)
+    failed = [k for k, v in results["cases"].items() if "error" in v]
+    regressions += [f"{name}: failed" for name in failed]
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SoraWM 合成视频端到端基准测试")
+    parser.add_argument("--resolutions", nargs="+", default=["640x360", "1280x720"])
+    parser.add_argument("--durations", nargs="+", type=float, default=[2.0, 5.0])
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--source", choices=["testsrc2", "noise"], default="testsrc2")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--output", default="benchmark_output/synthetic")
+    parser.add_argument("--baseline", help="对比的基线 JSON，超出容差时以非零状态退出")
+    parser.add_argument("--save-baseline", help="把本次结果另存为基线")
+    parser.add_argument("--cpu", action="store_true", help="隐藏 CUDA 设备，只用 CPU")
+    args = parser.parse_args()
+
+    if args.cpu:
+        # 需在导入 torch 之前设置
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+    from loguru import logger
+
+    from benchmarks.bench_utils import save_json
+
+    results = run_suite(args)
+    output_path = Path(args.output) / f"synthetic_results_{results['test_info']['timestamp']}.json"
+    save_json(results, output_path)
+    logger.info(f"Results saved to: {output_path}")
+    print_report(results)
+
+    if args.save_baseline:
+        save_json(results, Path(args.save_baseline))
+        logger.info(f"Baseline saved to: {args.save_baseline}")
+
+    if args.baseline:
+        regressions = check_baseline(results, Path(args.baseline))
+        if regressions:
+            logger.error("Regressions against baseline:\n" + "\n".join(regressions))
+            sys.exit(1)
+        logger.info("All cases within baseline tolerances")
+
+
+if __name__ == "__main__":
+    main()
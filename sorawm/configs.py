@@ -8,9 +8,9 @@ WATER_MARK_TEMPLATE_IMAGE_PATH = RESOURCES_DIR / "watermark_template.png"
 
 WATER_MARK_DETECT_YOLO_WEIGHTS = RESOURCES_DIR / "best.pt"
 
-OUTPUT_DIR = ROOT / "output"
+DATASETS_DEMO_DIR = ROOT / "datasets" / "demo"
 
-OUTPUT_DIR.mkdir(exist_ok=True, parents=True)
+OUTPUT_DIR = ROOT / "output"
 
 # 水印检测精度配置
 DETECTION_MIN_CONFIDENCE = 0.25  # 提高置信度阈值，减少误检
@@ -36,16 +36,22 @@ MASK_DILATION_ITERATIONS = 2  # 增加膨胀迭代次数
 DEFAULT_WATERMARK_REMOVE_MODEL = "lama"
 
 WORKING_DIR = ROOT / "working_dir"
-WORKING_DIR.mkdir(exist_ok=True, parents=True)
 
 LOGS_PATH = ROOT / "logs"
-LOGS_PATH.mkdir(exist_ok=True, parents=True)
 
 DATA_PATH = ROOT / "data"
-DATA_PATH.mkdir(exist_ok=True, parents=True)
 
 SQLITE_PATH = DATA_PATH / "db.sqlite3"
 
+PRECISION_CACHE_DIR = DATA_PATH / "precision"
+
+
+def ensure_runtime_dirs():
+    """创建输出、工作、日志与数据目录；由服务等入口调用，导入配置时不产生文件系统副作用"""
+    for path in (OUTPUT_DIR, WORKING_DIR, LOGS_PATH, DATA_PATH):
+        path.mkdir(exist_ok=True, parents=True)
+
+
 # 性能优化配置
 BATCH_SIZE = 8  # 批处理大小（降低以避免内存问题）
 USE_FP16 = True  # 半精度推理
@@ -54,3 +60,93 @@ FRAME_BUFFER_SIZE = 100  # 帧缓冲区大小
 ENCODING_PRESET = "medium"  # FFmpeg 编码预设 (slow/medium/fast/faster)
 ENABLE_HW_ACCEL = True  # 启用硬件编码加速
 MAX_WORKERS = 4  # 多进程数量
+
+# 批处理大小自动调优：实测各批大小的吞吐与内存，在内存上限内收敛到最优，按 (主机, 分辨率, 模型) 持久化
+ENABLE_BATCH_AUTOTUNE = True
+BATCH_AUTOTUNE_CANDIDATES = (1, 2, 4, 8, 16, 32)
+BATCH_AUTOTUNE_PROBE_BATCHES = 3  # 每个批大小计时的批次数（另有 1 个不计时的预热批次）
+BATCH_AUTOTUNE_MIN_GAIN = 0.05  # 更大批次吞吐提升不足该比例时选较小批次
+BATCH_AUTOTUNE_MAX_RSS_RATIO = 0.7  # 进程常驻内存上限占物理内存的比例
+BATCH_AUTOTUNE_PATH = DATA_PATH / "batch_autotune.json"
+
+# 性能追踪配置：记录各阶段 span，导出 Chrome trace 与 p50/p95/p99 汇总
+ENABLE_TRACING = False
+TRACE_OUTPUT_DIR = LOGS_PATH / "traces"
+
+# CPU 低精度推理配置（仅在 CPU 设备上生效）: fp32 / bf16 / int8_dynamic / int8_static_onnx
+# LaMa 为 TorchScript 模型，int8_dynamic 对其无效，int8 请用 int8_static_onnx
+LAMA_CPU_PRECISION = "fp32"
+YOLO_CPU_PRECISION = "fp32"
+PRECISION_GATE_ENABLED = True  # 启用前在校准集上做精度校验
+PRECISION_GATE_MIN_PSNR = 38.0  # 掩码区域 PSNR 下限（dB）
+PRECISION_GATE_MAX_MAP_DROP = 0.02  # datasets/demo 上允许的 mAP@0.5 最大下降
+
+# 预热缓存：持久化精度门限结论与最近推理尺寸，重启后跳过校准并按实际尺寸预热
+WARMUP_CACHE_PATH = DATA_PATH / "warmup_cache.json"
+WARMUP_MAX_SHAPES = 4  # 每个模型记录的最近推理尺寸数
+
+# ROI 合成配置：只修复掩码区域并原地羽化合成回原帧
+ENABLE_ROI_COMPOSITING = True
+ROI_CONTEXT_MARGIN = 128  # 送入模型的上下文边距（与 hd_strategy_crop_margin 一致）
+ROI_FEATHER_PX = 3  # 合成边缘羽化半径（像素）
+
+# 上传配置：按块流式写盘，内存占用与块大小同阶
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 每次读取的块大小（字节）
+MAX_UPLOAD_FORM_FIELD_SIZE = 64 * 1024  # 上传表单中单个文本字段的大小上限（字节）
+MAX_UPLOAD_SIZE = 2 * 1024**3  # 上传请求体大小上限（字节），先按 Content-Length 检查，接收中累计超限即中断
+
+# 服务端流水线池配置
+WORKER_POOL_SIZE = 1  # 并发处理视频的 SoraWM 实例数
+WORKER_THREADS_PER_PIPELINE = 0  # 每条流水线的 CPU 线程预算，0 表示按核数均分
+WORKER_MIN_FREE_MEMORY_MB = 2048  # 启动新任务前要求的最小可用内存（MB）
+WORKER_ADMISSION_POLL_INTERVAL = 2.0  # 内存不足时重新检查的间隔（秒）
+WORKER_ERROR_BACKOFF = 2.0  # 流水线循环遇到异常（如 sqlite 锁超时）后的等待时间（秒）
+
+# 持久化任务队列配置（多进程共享 sqlite tasks 表）
+QUEUE_POLL_INTERVAL = 1.0  # 队列为空时的轮询间隔（秒）
+TASK_LEASE_SECONDS = 60  # 任务 lease 有效期（秒）
+TASK_HEARTBEAT_INTERVAL = 15  # lease 心跳续期间隔（秒）
+TASK_MAX_ATTEMPTS = 3  # lease 过期后最多重试次数
+CANCEL_POLL_INTERVAL = 2.0  # 处理中任务检查取消请求的间隔（秒）
+
+# 任务状态缓存配置
+PROGRESS_FLUSH_INTERVAL = 2.0  # 进度合并写库的间隔（秒）
+STATUS_CACHE_TTL = 2.0  # 其他进程处理中任务的状态缓存时间（秒）
+STATUS_CACHE_MAX_ENTRIES = 10000  # 状态缓存最大条目数
+
+# 进度推送配置（SSE / WebSocket / webhook）
+EVENT_HEARTBEAT_INTERVAL = 15.0  # 无事件时的心跳间隔（秒），同时兜底检查其他进程的任务状态
+EVENT_SUBSCRIBER_QUEUE_SIZE = 64  # 每个订阅者的事件队列长度，满时丢弃最旧事件
+WEBHOOK_TIMEOUT = 10.0  # 完成回调请求超时（秒）
+
+# 结果缓存配置：相同上传 + 相同流水线配置直接复用输出
+ENABLE_RESULT_CACHE = True
+RESULT_CACHE_DIR = WORKING_DIR / "result_cache"
+RESULT_CACHE_MAX_BYTES = 20 * 1024**3  # 缓存磁盘预算（字节），超出按 LRU 淘汰
+
+# 渐进式输出配置：处理过程中输出 HLS(fMP4) 分片，完成前即可播放
+ENABLE_PROGRESSIVE_OUTPUT = True
+PROGRESSIVE_OUTPUT_DIR = WORKING_DIR / "progressive"
+HLS_SEGMENT_SECONDS = 4  # 分片时长（秒）
+STREAM_CHUNK_SIZE = 256 * 1024  # 文件流式响应的块大小（字节）
+
+# Streamlit 前端配置：所有浏览器会话共享进程内模型池，按内容哈希缓存结果
+STREAMLIT_POOL_SIZE = 1  # 共享的 SoraWM 实例数，会话多于实例时排队
+# 放在 WORKING_DIR 之外，避免被服务端 StorageManager 当作未登记文件清理
+STREAMLIT_RESULT_CACHE_DIR = DATA_PATH / "streamlit_cache"
+STREAMLIT_RESULT_CACHE_MAX_BYTES = 5 * 1024**3  # 结果缓存磁盘预算（字节），超出按最近使用淘汰
+
+# 调度配置：按预估耗时短作业优先，支持优先级与等待老化
+SCHEDULER_DEFAULT_SECONDS_PER_MEGAPIXEL = 0.02  # 无实测数据时每百万像素帧的耗时（秒）
+SCHEDULER_COST_EMA_ALPHA = 0.3  # 实测耗时的滑动平均系数
+SCHEDULER_COST_PATH = DATA_PATH / "scheduler_cost.json"
+SCHEDULER_PRIORITY_STEP_SECONDS = 600  # 每级优先级折算的耗时（秒）
+SCHEDULER_AGING_RATE = 1.0  # 每等待 1 秒抵扣的预估耗时（秒）
+SCHEDULER_ESTIMATE_TTL = 2.0  # 预计开始/完成时间的缓存时间（秒）
+
+# 工作目录存储管理：按 TTL 与容量配额淘汰任务文件
+STORAGE_TTL_SECONDS = 7 * 24 * 3600  # 终态任务文件最后访问后的保留时间（秒）
+STORAGE_QUOTA_BYTES = 50 * 1024**3  # 任务文件总容量配额（字节），超出按 LRU 淘汰
+STORAGE_SWEEP_INTERVAL = 600  # 淘汰检查间隔（秒）
+STORAGE_ORPHAN_GRACE_SECONDS = 3600  # 未登记文件超过该时间未修改才视为孤儿（秒）
+STORAGE_TOUCH_INTERVAL = 60  # 下载访问时间的最小更新间隔（秒）
@@ -1,3 +1,5 @@
+import shutil
+import time
 from pathlib import Path
 from typing import Callable, List, Dict, Any, Optional
 from collections import deque
@@ -16,14 +18,19 @@ from sorawm.configs import (
     MASK_DILATION_ITERATIONS,
     MASK_DILATION_KERNEL_SIZE,
     BATCH_SIZE,
+    ENABLE_BATCH_AUTOTUNE,
     ENABLE_BATCH_PROCESSING,
     FRAME_BUFFER_SIZE,
     ENCODING_PRESET,
     ENABLE_HW_ACCEL,
+    HLS_SEGMENT_SECONDS,
 )
+from sorawm.utils.batch_autotuner import BatchSizeAutotuner, autotune_key
 from sorawm.utils.bbox_utils import expand_and_clip_bbox, smooth_bbox_sequence
+from sorawm.utils.cancellation import CancellationToken, TaskCancelledError
 from sorawm.utils.enhanced_bbox_utils import enhanced_smooth_bbox_sequence
 from sorawm.utils.mask_utils import build_dilated_mask
+from sorawm.utils.tracing import span, trace_run
 from sorawm.utils.enhanced_mask_utils import (
     build_enhanced_dilated_mask,
     EnhancedMaskGenerator,
@@ -48,27 +55,94 @@ class SoraWM:
         # 批处理相关属性
         self.frame_buffer = deque(maxlen=FRAME_BUFFER_SIZE)
         self.bbox_history = deque(maxlen=FRAME_BUFFER_SIZE)
+        # 最近一次运行中检测器给出的逐帧水印框（未检出为 None），供评估使用
+        self.last_bboxes: List[Optional[tuple]] = []
 
     def run(
         self,
         input_video_path: Path,
         output_video_path: Path,
         progress_callback: Callable[[int], None] | None = None,
+        progressive_dir: Path | None = None,
+        cancel_token: CancellationToken | None = None,
+        stage_callback: Callable[[str], None] | None = None,
     ):
         """
         主处理方法，根据配置选择使用批处理或原始方法
+
+        Args:
+            stage_callback: 进入新阶段时以阶段名调用，早于该阶段的第一次 progress_callback；
+                逐帧流水线依次为 detecting、inpainting、muxing，
+                批处理流水线逐批检测并修复，依次为 processing、muxing
+            progressive_dir: 指定时编码器边处理边写 HLS(fMP4) 分片到该目录，
+                可在处理完成前播放；最终 mp4 由分片合并音轨得到
+            cancel_token: 取消令牌，帧 / 批次之间检查；取消时结束 ffmpeg、
+                删除临时与部分输出并抛出 TaskCancelledError
         """
+        cancel_token = cancel_token or CancellationToken()
+        try:
+            with trace_run(Path(input_video_path).stem):
+                return self._dispatch(
+                    input_video_path,
+                    output_video_path,
+                    progress_callback,
+                    progressive_dir,
+                    cancel_token,
+                    stage_callback,
+                )
+        except BaseException:
+            if not cancel_token.cancelled:
+                raise
+            self._discard_outputs(output_video_path, progressive_dir)
+            logger.info(f"Processing of {input_video_path} cancelled")
+            raise TaskCancelledError(f"Processing of {input_video_path} cancelled") from None
+
+    def _dispatch(
+        self,
+        input_video_path: Path,
+        output_video_path: Path,
+        progress_callback: Callable[[int], None] | None,
+        progressive_dir: Path | None,
+        cancel_token: CancellationToken,
+        stage_callback: Callable[[str], None] | None,
+    ):
         if ENABLE_BATCH_PROCESSING:
-            return self.run_batch(input_video_path, output_video_path, progress_callback)
-        else:
-            return self._run_original(input_video_path, output_video_path, progress_callback)
+            return self.run_batch(
+                input_video_path,
+                output_video_path,
+                progress_callback,
+                progressive_dir,
+                cancel_token,
+                stage_callback,
+            )
+        return self._run_original(
+            input_video_path,
+            output_video_path,
+            progress_callback,
+            progressive_dir,
+            cancel_token,
+            stage_callback,
+        )
+
+    @staticmethod
+    def _discard_outputs(output_video_path: Path, progressive_dir: Path | None):
+        """删除取消任务的临时文件与部分输出"""
+        temp_output_path = output_video_path.parent / f"temp_{output_video_path.name}"
+        temp_output_path.unlink(missing_ok=True)
+        output_video_path.unlink(missing_ok=True)
+        if progressive_dir is not None:
+            shutil.rmtree(progressive_dir, ignore_errors=True)
 
     def _run_original(
         self,
         input_video_path: Path,
         output_video_path: Path,
         progress_callback: Callable[[int], None] | None = None,
+        progressive_dir: Path | None = None,
+        cancel_token: CancellationToken | None = None,
+        stage_callback: Callable[[str], None] | None = None,
     ):
+        cancel_token = cancel_token or CancellationToken()
         input_video_loader = VideoLoader(input_video_path)
         output_video_path.parent.mkdir(parents=True, exist_ok=True)
         width = input_video_loader.width
@@ -76,6 +150,7 @@ class SoraWM:
         fps = input_video_loader.fps
         total_frames = input_video_loader.total_frames
         self.mask_generator.reset_state()
+        self.last_bboxes = []
 
         temp_output_path = output_video_path.parent / f"temp_{output_video_path.name}"
         output_options = {
@@ -107,11 +182,14 @@ class SoraWM:
                 s=f"{width}x{height}",
                 r=fps,
             )
-            .output(str(temp_output_path), **output_options)
+            .output(
+                *self._encoder_target(temp_output_path, output_options, progressive_dir)
+            )
             .overwrite_output()
             .global_args("-loglevel", "error")
             .run_async(pipe_stdin=True)
         )
+        cancel_token.register_process(process_out)
 
         frame_and_mask = {}
         detect_missed = []
@@ -121,10 +199,16 @@ class SoraWM:
         logger.debug(
             f"total frames: {total_frames}, fps: {fps}, width: {width}, height: {height}"
         )
+        if stage_callback:
+            stage_callback("detecting")
         for idx, frame in enumerate(
             tqdm(input_video_loader, total=total_frames, desc="Detect watermarks")
         ):
+            cancel_token.raise_if_cancelled()
             detection_result = self.detector.detect(frame, idx)
+            self.last_bboxes.append(
+                detection_result["bbox"] if detection_result["detected"] else None
+            )
             bbox = None
             if detection_result["detected"]:
                 confidence = detection_result.get("confidence")
@@ -212,7 +296,10 @@ class SoraWM:
         for idx, bbox in enumerate(smoothed_bboxes):
             frame_and_mask[idx]["bbox"] = bbox
 
+        if stage_callback:
+            stage_callback("inpainting")
         for idx in tqdm(range(total_frames), desc="Remove watermarks"):
+            cancel_token.raise_if_cancelled()
             frame_info = frame_and_mask[idx]
             frame = frame_info["frame"]
             bbox = frame_info["bbox"]
@@ -223,19 +310,21 @@ class SoraWM:
                 if idx > 0:
                     previous_bbox = frame_and_mask[idx-1].get("bbox")
                 
-                mask = build_enhanced_dilated_mask(
-                    height,
-                    width,
-                    bbox,
-                    confidence=confidence,
-                    previous_bbox=previous_bbox,
-                    frame_idx=idx,
-                    generator=self.mask_generator,
-                )
+                with span("mask"):
+                    mask = build_enhanced_dilated_mask(
+                        height,
+                        width,
+                        bbox,
+                        confidence=confidence,
+                        previous_bbox=previous_bbox,
+                        frame_idx=idx,
+                        generator=self.mask_generator,
+                    )
                 cleaned_frame = self.cleaner.clean(frame, mask)
             else:
                 cleaned_frame = frame
-            process_out.stdin.write(cleaned_frame.tobytes())
+            with span("encode.write"):
+                process_out.stdin.write(cleaned_frame.tobytes())
 
             # 50% - 95%
             if progress_callback and idx % 10 == 0:
@@ -244,38 +333,100 @@ class SoraWM:
 
         process_out.stdin.close()
         process_out.wait()
+        cancel_token.raise_if_cancelled()
 
         # 95% - 99%
+        if stage_callback:
+            stage_callback("muxing")
         if progress_callback:
             progress_callback(95)
 
-        self.merge_audio_track(input_video_path, temp_output_path, output_video_path)
+        self.merge_audio_track(
+            input_video_path,
+            self._encoded_video_path(temp_output_path, progressive_dir),
+            output_video_path,
+            cleanup=progressive_dir is None,
+            cancel_token=cancel_token,
+        )
 
         if progress_callback:
             progress_callback(99)
 
     def merge_audio_track(
-        self, input_video_path: Path, temp_output_path: Path, output_video_path: Path
+        self,
+        input_video_path: Path,
+        temp_output_path: Path,
+        output_video_path: Path,
+        cleanup: bool = True,
+        cancel_token: Optional[CancellationToken] = None,
     ):
         logger.info("Merging audio track...")
         video_stream = ffmpeg.input(str(temp_output_path))
         audio_stream = ffmpeg.input(str(input_video_path)).audio
 
-        (
-            ffmpeg.output(
-                video_stream,
-                audio_stream,
-                str(output_video_path),
-                vcodec="copy",
-                acodec="aac",
+        with span("audio_mux"):
+            process = (
+                ffmpeg.output(
+                    video_stream,
+                    audio_stream,
+                    str(output_video_path),
+                    vcodec="copy",
+                    acodec="aac",
+                )
+                .overwrite_output()
+                .run_async(pipe_stdout=True, pipe_stderr=True)
             )
-            .overwrite_output()
-            .run(quiet=True)
-        )
+            # 登记到取消令牌，混流期间取消会立即结束 ffmpeg
+            if cancel_token is not None:
+                cancel_token.register_process(process)
+            out, err = process.communicate()
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        if process.returncode != 0:
+            raise ffmpeg.Error("ffmpeg", out, err)
         # Clean up temporary file
-        temp_output_path.unlink()
+        if cleanup:
+            temp_output_path.unlink()
         logger.info(f"Saved no watermark video with audio at: {output_video_path}")
 
+    @staticmethod
+    def _encoded_video_path(
+        temp_output_path: Path, progressive_dir: Path | None
+    ) -> Path:
+        if progressive_dir is None:
+            return temp_output_path
+        return progressive_dir / "index.m3u8"
+
+    def _encoder_target(
+        self,
+        temp_output_path: Path,
+        output_options: Dict[str, str],
+        progressive_dir: Path | None,
+    ):
+        """
+        编码器输出目标
+
+        Returns:
+            (输出路径, ffmpeg 输出参数)；progressive_dir 为 None 时写单个临时文件，
+            否则写 HLS 播放列表与 fMP4 分片，分片边界强制关键帧
+        """
+        if progressive_dir is None:
+            return str(temp_output_path), output_options
+
+        progressive_dir.mkdir(parents=True, exist_ok=True)
+        hls_options = {
+            **output_options,
+            "format": "hls",
+            "hls_time": str(HLS_SEGMENT_SECONDS),
+            "hls_playlist_type": "event",
+            "hls_segment_type": "fmp4",
+            "hls_fmp4_init_filename": "init.mp4",
+            "hls_segment_filename": str(progressive_dir / "segment_%05d.m4s"),
+            "hls_flags": "independent_segments+temp_file",
+            "force_key_frames": f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        }
+        return str(self._encoded_video_path(temp_output_path, progressive_dir)), hls_options
+
     def _detect_hw_encoder(self) -> Optional[Dict[str, str]]:
         """
         检测可用的硬件编码器
@@ -320,6 +471,9 @@ class SoraWM:
         input_video_path: Path,
         output_video_path: Path,
         progress_callback: Callable[[int], None] | None = None,
+        progressive_dir: Path | None = None,
+        cancel_token: CancellationToken | None = None,
+        stage_callback: Callable[[str], None] | None = None,
     ):
         """
         使用批处理流水线处理视频，显著提升性能
@@ -328,10 +482,21 @@ class SoraWM:
             input_video_path: 输入视频路径
             output_video_path: 输出视频路径
             progress_callback: 进度回调函数
+            progressive_dir: HLS 分片输出目录，None 表示只输出最终文件
+            cancel_token: 取消令牌，每个批次之前检查
+            stage_callback: 阶段回调函数，见 run
         """
         if not ENABLE_BATCH_PROCESSING:
             logger.info("Batch processing disabled, falling back to original method")
-            return self.run(input_video_path, output_video_path, progress_callback)
+            return self.run(
+                input_video_path,
+                output_video_path,
+                progress_callback,
+                progressive_dir,
+                cancel_token,
+                stage_callback,
+            )
+        cancel_token = cancel_token or CancellationToken()
         
         logger.info("Starting batch processing pipeline")
         input_video_loader = VideoLoader(input_video_path)
@@ -342,6 +507,7 @@ class SoraWM:
         fps = input_video_loader.fps
         total_frames = input_video_loader.total_frames
         self.mask_generator.reset_state()
+        self.last_bboxes = []
         
         # 设置输出编码参数
         temp_output_path = output_video_path.parent / f"temp_{output_video_path.name}"
@@ -374,22 +540,39 @@ class SoraWM:
                 s=f"{width}x{height}",
                 r=fps,
             )
-            .output(str(temp_output_path), **output_options)
+            .output(
+                *self._encoder_target(temp_output_path, output_options, progressive_dir)
+            )
             .overwrite_output()
             .global_args("-loglevel", "error")
             .run_async(pipe_stdin=True)
         )
+        cancel_token.register_process(process_out)
         
         # 记录初始内存使用情况
         memory_manager.log_memory_usage("before processing")
         
-        # 动态调整批处理大小
-        optimal_batch_size = memory_manager.get_optimal_batch_size(BATCH_SIZE, (height, width, 3))
+        # 动态调整批处理大小：开启自动调优时按实测吞吐与内存选择，否则按剩余内存估算
+        autotuner = None
+        if ENABLE_BATCH_AUTOTUNE:
+            autotuner = BatchSizeAutotuner(
+                autotune_key(width, height, self.cleaner.model),
+                BATCH_SIZE,
+                memory_pressure=memory_manager.is_memory_pressure_high,
+            )
+            optimal_batch_size = autotuner.batch_size
+        else:
+            optimal_batch_size = memory_manager.get_optimal_batch_size(BATCH_SIZE, (height, width, 3))
         
         # 批处理流水线
         frame_batch = []
         frame_indices = []
         processed_frames = 0
+        processed_batches = 0
+        # 批次耗时从上一批写出后开始计，包含解码时间
+        batch_start = time.perf_counter()
+        if stage_callback:
+            stage_callback("processing")
         
         try:
             for idx, frame in enumerate(tqdm(input_video_loader, total=total_frames, desc="Batch processing")):
@@ -398,9 +581,15 @@ class SoraWM:
                 
                 # 当批次满了或者是最后一帧时，处理批次
                 if len(frame_batch) >= optimal_batch_size or idx == total_frames - 1:
+                    cancel_token.raise_if_cancelled()
+
                     # 批量检测（传递起始帧索引）
                     start_frame_idx = frame_indices[0] if frame_indices else 0
                     detection_results = self.detector.detect_batch(frame_batch, start_frame_idx)
+                    self.last_bboxes.extend(
+                        result["bbox"] if result["detected"] else None
+                        for result in detection_results
+                    )
                     
                     # 批量清理
                     cleaned_frames = self._process_batch_cleaning(
@@ -413,35 +602,57 @@ class SoraWM:
                     )
                     
                     # 写入输出
-                    for cleaned_frame in cleaned_frames:
-                        process_out.stdin.write(cleaned_frame.tobytes())
+                    with span("encode.write", len(cleaned_frames)):
+                        for cleaned_frame in cleaned_frames:
+                            process_out.stdin.write(cleaned_frame.tobytes())
                     
                     processed_frames += len(frame_batch)
+                    processed_batches += 1
                     
                     # 更新进度
                     if progress_callback:
-                        progress = int((processed_frames / total_frames) * 90)  # 90% 用于处理
+                        # 10% - 90%，与逐帧流水线一致，从 worker 领取任务时的 10% 起算
+                        progress = 10 + int((processed_frames / total_frames) * 80)
                         progress_callback(progress)
                     
+                    if autotuner is not None:
+                        autotuner.observe(len(frame_batch), time.perf_counter() - batch_start)
+                        optimal_batch_size = autotuner.batch_size
+                    
                     # 定期清理内存
-                    if processed_frames % (optimal_batch_size * 5) == 0:  # 每处理 5 个批次清理一次
+                    if processed_batches % 5 == 0:  # 每处理 5 个批次清理一次
                         memory_manager.cleanup_memory()
-                        # 重新评估批处理大小
-                        optimal_batch_size = memory_manager.get_optimal_batch_size(BATCH_SIZE, (height, width, 3))
+                        if autotuner is None:
+                            # 重新评估批处理大小
+                            optimal_batch_size = memory_manager.get_optimal_batch_size(BATCH_SIZE, (height, width, 3))
                     
                     # 重置批次
                     frame_batch = []
                     frame_indices = []
+                    batch_start = time.perf_counter()
         
         finally:
-            process_out.stdin.close()
+            try:
+                process_out.stdin.close()
+            except OSError:
+                # 取消时编码进程已被结束，管道可能已断开
+                pass
             process_out.wait()
+        cancel_token.raise_if_cancelled()
         
         # 合并音频轨道
+        if stage_callback:
+            stage_callback("muxing")
         if progress_callback:
             progress_callback(95)
         
-        self.merge_audio_track(input_video_path, temp_output_path, output_video_path)
+        self.merge_audio_track(
+            input_video_path,
+            self._encoded_video_path(temp_output_path, progressive_dir),
+            output_video_path,
+            cleanup=progressive_dir is None,
+            cancel_token=cancel_token,
+        )
         
         if progress_callback:
             progress_callback(100)
@@ -480,40 +691,41 @@ class SoraWM:
         generator = generator or self.mask_generator
         
         # 为每帧生成增强掩码
-        for i, detection_result in enumerate(detection_results):
-            if detection_result["detected"]:
-                bbox = expand_and_clip_bbox(
-                    detection_result["bbox"],
-                    width,
-                    height,
-                    padding_ratio=BBOX_PADDING_RATIO,
-                    min_edge=BBOX_MIN_EDGE_PX,
-                )
+        with span("mask", len(detection_results)):
+            for i, detection_result in enumerate(detection_results):
+                if detection_result["detected"]:
+                    bbox = expand_and_clip_bbox(
+                        detection_result["bbox"],
+                        width,
+                        height,
+                        padding_ratio=BBOX_PADDING_RATIO,
+                        min_edge=BBOX_MIN_EDGE_PX,
+                    )
                 
-                # 使用增强的掩码生成器
-                confidence = detection_result.get("confidence", 1.0)
-                previous_bbox = None
-                if i > 0 and detection_results[i-1]["detected"]:
-                    previous_bbox = detection_results[i-1]["bbox"]
+                    # 使用增强的掩码生成器
+                    confidence = detection_result.get("confidence", 1.0)
+                    previous_bbox = None
+                    if i > 0 and detection_results[i-1]["detected"]:
+                        previous_bbox = detection_results[i-1]["bbox"]
                 
-                global_idx = (
-                    frame_indices[i]
-                    if frame_indices and i < len(frame_indices)
-                    else i
-                )
+                    global_idx = (
+                        frame_indices[i]
+                        if frame_indices and i < len(frame_indices)
+                        else i
+                    )
 
-                mask = build_enhanced_dilated_mask(
-                    height,
-                    width,
-                    bbox,
-                    confidence=confidence,
-                    previous_bbox=previous_bbox,
-                    frame_idx=global_idx,
-                    generator=generator,
-                )
-            else:
-                mask = np.zeros((height, width), dtype=np.uint8)
-            masks.append(mask)
+                    mask = build_enhanced_dilated_mask(
+                        height,
+                        width,
+                        bbox,
+                        confidence=confidence,
+                        previous_bbox=previous_bbox,
+                        frame_idx=global_idx,
+                        generator=generator,
+                    )
+                else:
+                    mask = np.zeros((height, width), dtype=np.uint8)
+                masks.append(mask)
         
         # 批量清理
         try:
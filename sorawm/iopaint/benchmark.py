@@ -1,17 +1,37 @@
 #!/usr/bin/env python3
+"""Shape-sweep benchmark for erase models.
+
+Runs each model over ROI crops (128-1024), full 720p/1080p frames and several
+batch sizes on any device, and writes cold-start time, warm latency
+percentiles, throughput and peak RSS to CSV and JSON.
+
+    python -m sorawm.iopaint.benchmark --models lama migan cv2 --device cpu
+"""
 
 import argparse
+import csv
+import gc
+import json
 import os
+import threading
 import time
+from datetime import datetime
+from pathlib import Path
 
+import cv2
 import numpy as np
-import nvidia_smi
 import psutil
 import torch
+from loguru import logger
 
 from sorawm.iopaint.model_manager import ModelManager
 from sorawm.iopaint.schema import HDStrategy, InpaintRequest, SDSampler
 
+try:
+    import nvidia_smi
+except ImportError:
+    nvidia_smi = None
+
 try:
     torch._C._jit_override_can_fuse_on_cpu(False)
     torch._C._jit_override_can_fuse_on_gpu(False)
@@ -30,80 +50,281 @@ os.environ["NUMEXPR_NUM_THREADS"] = NUM_THREADS
 if os.environ.get("CACHE_DIR"):
     os.environ["TORCH_HOME"] = os.environ["CACHE_DIR"]
 
+ERASE_MODELS = ["lama", "mat", "fcf", "migan", "zits", "cv2"]
+ROI_SIZES = [128, 256, 384, 512, 768, 1024]
+FRAME_SIZES = {"720p": (720, 1280), "1080p": (1080, 1920)}
+BATCH_SIZES = [1, 2, 4, 8]
+# Watermark width relative to frame width, as in Sora output
+WATERMARK_WIDTH_RATIO = 0.2
+
+
+def make_image(height, width, seed=0):
+    """Low-frequency colour field with mild texture, closer to video content than noise"""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(2, height // 32), max(2, width // 32), 3))
+    image = cv2.resize(coarse.astype(np.uint8), (width, height), interpolation=cv2.INTER_CUBIC)
+    texture = rng.normal(0, 6, (height, width, 3))
+    return np.clip(image + texture, 0, 255).astype(np.uint8)
+
+
+def make_watermark_mask(height, width, box):
+    """Dilated text-like strokes inside box, similar to the masks SoraWM builds"""
+    mask = np.zeros((height, width), dtype=np.uint8)
+    x1, y1, x2, y2 = box
+    box_h = y2 - y1
+    for i, ratio in enumerate((0.25, 0.5, 0.75)):
+        y = y1 + int(box_h * ratio)
+        x_end = x2 - int((x2 - x1) * 0.15 * i)
+        cv2.line(mask, (x1, y), (x_end, y), 255, max(2, box_h // 10))
+    cv2.ellipse(
+        mask,
+        (x1 + box_h // 4, y1 + box_h // 2),
+        (box_h // 5, box_h // 5),
+        0, 0, 360, 255, -1,
+    )
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (11, 11))
+    return cv2.dilate(mask, kernel, iterations=2)
+
+
+def roi_case(size):
+    """Square crop with the watermark in the middle and context margin around it"""
+    margin = size // 4
+    box = (margin, margin + size // 8, size - margin, size - margin - size // 8)
+    return make_image(size, size), make_watermark_mask(size, size, box)
+
+
+def frame_case(height, width):
+    box_w = int(width * WATERMARK_WIDTH_RATIO)
+    box_h = box_w * 234 // 286
+    x1, y1 = width // 20, height // 20
+    box = (x1, y1, x1 + box_w, y1 + box_h)
+    return make_image(height, width), make_watermark_mask(height, width, box)
+
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    elif device.type == "mps":
+        torch.mps.synchronize()
+
+
+class PeakRSS:
+    """Sample process RSS in a background thread, since ru_maxrss never resets"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._process = psutil.Process(os.getpid())
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
 
-def run_model(model, size):
-    # RGB
-    image = np.random.randint(0, 256, (size[0], size[1], 3)).astype(np.uint8)
-    mask = np.random.randint(0, 255, size).astype(np.uint8)
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
 
-    config = InpaintRequest(
+
+class GpuMemory:
+    def __init__(self, device):
+        self.device = device
+        self.handle = None
+        if device.type == "cuda" and nvidia_smi is not None:
+            nvidia_smi.nvmlInit()
+            self.handle = nvidia_smi.nvmlDeviceGetHandleByIndex(device.index or 0)
+
+    def reset(self):
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats()
+
+    def stats(self):
+        if self.device.type != "cuda":
+            return {}
+        stats = {"gpu_peak_allocated_mb": torch.cuda.max_memory_allocated() / 1024**2}
+        if self.handle is not None:
+            stats["gpu_used_mb"] = nvidia_smi.nvmlDeviceGetMemoryInfo(self.handle).used / 1024**2
+        return stats
+
+    def close(self):
+        if self.handle is not None:
+            nvidia_smi.nvmlShutdown()
+
+
+def make_config(hd_strategy):
+    return InpaintRequest(
         ldm_steps=2,
-        hd_strategy=HDStrategy.ORIGINAL,
+        hd_strategy=hd_strategy,
         hd_strategy_crop_margin=128,
-        hd_strategy_crop_trigger_size=128,
-        hd_strategy_resize_limit=128,
         prompt="a fox is sitting on a bench",
         sd_steps=5,
         sd_sampler=SDSampler.ddim,
     )
-    model(image, mask, config)
 
 
-def benchmark(model, times: int, empty_cache: bool):
-    sizes = [(512, 512)]
+def make_runner(model, image, mask, batch_size, config):
+    if batch_size == 1:
+        return lambda: model(image, mask, config)
+    # Crops of one shape go through the model as one batch when it supports it
+    images, masks = [image] * batch_size, [mask] * batch_size
+    return lambda: model.model._pad_forward_batch(images, masks, config)
+
+
+def time_case(run, device, warmup, times):
+    for _ in range(warmup):
+        run()
+    synchronize(device)
+    latencies = []
+    for _ in range(times):
+        start = time.perf_counter()
+        run()
+        synchronize(device)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def iter_cases(roi_sizes, frame_sizes, batch_sizes):
+    for size in roi_sizes:
+        for batch_size in batch_sizes:
+            yield f"roi{size}", size, size, batch_size, HDStrategy.ORIGINAL
+    for name in frame_sizes:
+        height, width = FRAME_SIZES[name]
+        # Full frames go through the same crop strategy SoraWM uses
+        yield name, height, width, 1, HDStrategy.CROP
 
-    nvidia_smi.nvmlInit()
-    device_id = 0
-    handle = nvidia_smi.nvmlDeviceGetHandleByIndex(device_id)
 
-    def format(metrics):
-        return f"{np.mean(metrics):.2f} ± {np.std(metrics):.2f}"
+def benchmark_model(name, device, args, gpu_memory):
+    rows = []
+    gpu_memory.reset()
+    with PeakRSS() as load_rss:
+        start = time.perf_counter()
+        model = ModelManager(
+            name=name, device=device, disable_nsfw=True, sd_cpu_textencoder=True
+        )
+        load_seconds = time.perf_counter() - start
+    logger.info(f"{name} loaded in {load_seconds:.2f}s")
 
-    process = psutil.Process(os.getpid())
-    # 每个 size 给出显存和内存占用的指标
-    for size in sizes:
+    first_call_done = False
+    for shape, height, width, batch_size, hd_strategy in iter_cases(
+        args.roi_sizes, args.frame_sizes, args.batch_sizes
+    ):
+        row = {
+            "model": name,
+            "device": str(device),
+            "shape": shape,
+            "height": height,
+            "width": width,
+            "batch_size": batch_size,
+            "batched": batch_size == 1 or model.model.supports_tensor_forward,
+            "load_seconds": load_seconds,
+            "load_peak_rss_mb": load_rss.peak / 1024**2,
+        }
+        image, mask = (
+            roi_case(height) if shape.startswith("roi") else frame_case(height, width)
+        )
+        run = make_runner(model, image, mask, batch_size, make_config(hd_strategy))
+        gpu_memory.reset()
+        try:
+            with PeakRSS() as rss:
+                if not first_call_done:
+                    start = time.perf_counter()
+                    run()
+                    synchronize(device)
+                    row["first_call_seconds"] = time.perf_counter() - start
+                    first_call_done = True
+                latencies = time_case(run, device, args.warmup, args.times)
+        except Exception as e:
+            logger.warning(f"{name} {shape} batch {batch_size} failed: {e}")
+            rows.append({**row, "error": str(e)})
+            continue
+
+        mean_ms = float(np.mean(latencies))
+        row.update(
+            {
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p90_ms": float(np.percentile(latencies, 90)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "mean_ms": mean_ms,
+                "images_per_sec": batch_size * 1000 / mean_ms,
+                "megapixels_per_sec": batch_size * height * width / 1e6 * 1000 / mean_ms,
+                "peak_rss_mb": rss.peak / 1024**2,
+                **gpu_memory.stats(),
+            }
+        )
+        logger.info(
+            f"{name} {shape} x{batch_size}: p50 {row['p50_ms']:.1f}ms "
+            f"{row['images_per_sec']:.2f} img/s"
+        )
+        rows.append(row)
+
+    del model
+    gc.collect()
+    if device.type == "cuda":
         torch.cuda.empty_cache()
-        time_metrics = []
-        cpu_metrics = []
-        memory_metrics = []
-        gpu_memory_metrics = []
-        for _ in range(times):
-            start = time.time()
-            run_model(model, size)
-            torch.cuda.synchronize()
-
-            # cpu_metrics.append(process.cpu_percent())
-            time_metrics.append((time.time() - start) * 1000)
-            memory_metrics.append(process.memory_info().rss / 1024 / 1024)
-            gpu_memory_metrics.append(
-                nvidia_smi.nvmlDeviceGetMemoryInfo(handle).used / 1024 / 1024
-            )
-
-        print(f"size: {size}".center(80, "-"))
-        # print(f"cpu: {format(cpu_metrics)}")
-        print(f"latency: {format(time_metrics)}ms")
-        print(f"memory: {format(memory_metrics)} MB")
-        print(f"gpu memory: {format(gpu_memory_metrics)} MB")
-
-    nvidia_smi.nvmlShutdown()
+    return rows
+
+
+def write_results(rows, output_dir: Path):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"iopaint_benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    json_path = output_dir / f"{stem}.json"
+    json_path.write_text(json.dumps(rows, indent=2))
+
+    fields = []
+    for row in rows:
+        fields += [k for k in row if k not in fields]
+    csv_path = output_dir / f"{stem}.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return json_path, csv_path
+
+
+def default_device():
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
 
 
 def get_args_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--name")
-    parser.add_argument("--device", default="cuda", type=str)
+    parser.add_argument("--models", nargs="+", default=ERASE_MODELS)
+    parser.add_argument("--device", default=default_device(), type=str)
+    parser.add_argument("--roi-sizes", nargs="*", type=int, default=ROI_SIZES)
+    parser.add_argument(
+        "--frame-sizes", nargs="*", choices=list(FRAME_SIZES), default=list(FRAME_SIZES)
+    )
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=BATCH_SIZES)
     parser.add_argument("--times", default=10, type=int)
-    parser.add_argument("--empty-cache", action="store_true")
+    parser.add_argument("--warmup", default=2, type=int)
+    parser.add_argument("--output", default="benchmark_output/iopaint", type=Path)
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = get_args_parser()
     device = torch.device(args.device)
-    model = ModelManager(
-        name=args.name,
-        device=device,
-        disable_nsfw=True,
-        sd_cpu_textencoder=True,
-    )
-    benchmark(model, args.times, args.empty_cache)
+    gpu_memory = GpuMemory(device)
+    rows = []
+    try:
+        for name in args.models:
+            try:
+                rows += benchmark_model(name, device, args, gpu_memory)
+            except Exception as e:
+                logger.error(f"Failed to benchmark {name}: {e}")
+                rows.append({"model": name, "device": str(device), "error": str(e)})
+    finally:
+        gpu_memory.close()
+    json_path, csv_path = write_results(rows, args.output)
+    logger.info(f"Results saved to {json_path} and {csv_path}")
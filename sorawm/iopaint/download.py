@@ -1,9 +1,10 @@
 import glob
+import hashlib
 import json
 import os
 from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from loguru import logger
 
@@ -117,6 +118,7 @@ def scan_single_file_diffusion_models(cache_dir) -> List[ModelInfo]:
                 assert isinstance(model_type_cache, dict)
         except:
             pass
+    cached_model_types = dict(model_type_cache)
 
     res = []
     for it in stable_diffusion_dir.glob("*.*"):
@@ -138,7 +140,7 @@ def scan_single_file_diffusion_models(cache_dir) -> List[ModelInfo]:
                 is_single_file_diffusers=True,
             )
         )
-    if stable_diffusion_dir.exists():
+    if stable_diffusion_dir.exists() and model_type_cache != cached_model_types:
         with open(cache_file, "w", encoding="utf-8") as fw:
             json.dump(model_type_cache, fw, indent=2, ensure_ascii=False)
 
@@ -152,6 +154,7 @@ def scan_single_file_diffusion_models(cache_dir) -> List[ModelInfo]:
                 assert isinstance(sdxl_model_type_cache, dict)
         except:
             pass
+    cached_sdxl_model_types = dict(sdxl_model_type_cache)
 
     for it in stable_diffusion_xl_dir.glob("*.*"):
         if it.suffix not in [".safetensors", ".ckpt"]:
@@ -164,10 +167,6 @@ def scan_single_file_diffusion_models(cache_dir) -> List[ModelInfo]:
             continue
 
         sdxl_model_type_cache[it.name] = model_type
-        if stable_diffusion_xl_dir.exists():
-            with open(sdxl_cache_file, "w", encoding="utf-8") as fw:
-                json.dump(sdxl_model_type_cache, fw, indent=2, ensure_ascii=False)
-
         res.append(
             ModelInfo(
                 name=it.name,
@@ -176,6 +175,12 @@ def scan_single_file_diffusion_models(cache_dir) -> List[ModelInfo]:
                 is_single_file_diffusers=True,
             )
         )
+    if (
+        stable_diffusion_xl_dir.exists()
+        and sdxl_model_type_cache != cached_sdxl_model_types
+    ):
+        with open(sdxl_cache_file, "w", encoding="utf-8") as fw:
+            json.dump(sdxl_model_type_cache, fw, indent=2, ensure_ascii=False)
     return res
 
 
@@ -185,8 +190,9 @@ def scan_inpaint_models(model_dir: Path) -> List[ModelInfo]:
 
     # logger.info(f"Scanning inpaint models in {model_dir}")
 
-    for name, m in models.items():
-        if m.is_erase_model and m.is_downloaded():
+    # Only erase models are scanned here, so the diffusion classes stay unimported
+    for name in models.erase_model_names():
+        if models[name].is_downloaded():
             res.append(
                 ModelInfo(
                     name=name,
@@ -304,11 +310,116 @@ def scan_converted_diffusers_models(cache_dir) -> List[ModelInfo]:
     return available_models
 
 
-def scan_models() -> List[ModelInfo]:
-    model_dir = os.getenv("XDG_CACHE_HOME", DEFAULT_MODEL_DIR)
+MODEL_REGISTRY_FILE = "iopaint_model_registry.json"
+MODEL_REGISTRY_VERSION = 1
+# Files written by the scan itself, excluded so they don't invalidate the fingerprint
+_REGISTRY_IGNORED_FILES = {"iopaint_cache.json", MODEL_REGISTRY_FILE}
+_MODEL_INFO_FIELDS = {"name", "path", "model_type", "is_single_file_diffusers"}
+
+_scanned_models: Dict[str, List[ModelInfo]] = {}
+
+
+def _registry_roots(model_dir) -> List[Path]:
+    from huggingface_hub.constants import HF_HUB_CACHE
+    from torch.hub import get_dir
+
+    model_dir = Path(model_dir)
+    return [
+        model_dir,
+        model_dir / "stable_diffusion",
+        model_dir / "stable_diffusion_xl",
+        Path(HF_HUB_CACHE),
+        # erase models are downloaded by torch.hub
+        Path(get_dir()) / "checkpoints",
+    ]
+
+
+def registry_fingerprint(model_dir) -> str:
+    """Hash of name, size and mtime of every entry directly under the model
+    directories. Downloading or deleting a model changes it; an unchanged
+    fingerprint means a rescan would find the same models."""
+    listing = []
+    for root in _registry_roots(model_dir):
+        entries = []
+        try:
+            with os.scandir(root) as it:
+                for entry in it:
+                    if entry.name in _REGISTRY_IGNORED_FILES:
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append([entry.name, stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            entries = None
+        listing.append([str(root), sorted(entries) if entries is not None else None])
+    return hashlib.sha256(json.dumps(listing).encode()).hexdigest()
+
+
+def _load_registry(registry_path: Path, fingerprint: str) -> Optional[List[ModelInfo]]:
+    try:
+        with open(registry_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if (
+            data.get("version") != MODEL_REGISTRY_VERSION
+            or data.get("fingerprint") != fingerprint
+        ):
+            return None
+        return [ModelInfo(**it) for it in data["models"]]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignore invalid model registry {registry_path}: {e}")
+        return None
+
+
+def _save_registry(registry_path: Path, fingerprint: str, models: List[ModelInfo]):
+    data = {
+        "version": MODEL_REGISTRY_VERSION,
+        "fingerprint": fingerprint,
+        "models": [it.model_dump(mode="json", include=_MODEL_INFO_FIELDS) for it in models],
+    }
+    if not registry_path.parent.is_dir():
+        return
+    try:
+        tmp_path = registry_path.with_name(f"{registry_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fw:
+            json.dump(data, fw, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, registry_path)
+    except OSError as e:
+        logger.warning(f"Failed to save model registry {registry_path}: {e}")
+
+
+def _scan_all_models(model_dir) -> List[ModelInfo]:
     available_models = []
     available_models.extend(scan_inpaint_models(model_dir))
     available_models.extend(scan_single_file_diffusion_models(model_dir))
     available_models.extend(scan_diffusers_models())
     available_models.extend(scan_converted_diffusers_models(model_dir))
     return available_models
+
+
+def scan_models() -> List[ModelInfo]:
+    """Available models, rescanned only when the model directories change.
+
+    Results are kept per process and persisted in MODEL_REGISTRY_FILE, keyed by
+    registry_fingerprint, so a restarted worker skips globbing and sniffing
+    checkpoint types.
+    """
+    model_dir = os.getenv("XDG_CACHE_HOME", DEFAULT_MODEL_DIR)
+    registry_path = Path(model_dir) / MODEL_REGISTRY_FILE
+    fingerprint = registry_fingerprint(model_dir)
+    if fingerprint in _scanned_models:
+        return list(_scanned_models[fingerprint])
+
+    available_models = _load_registry(registry_path, fingerprint)
+    if available_models is None:
+        available_models = _scan_all_models(model_dir)
+        # Scanning may create cache directories, so fingerprint the result
+        fingerprint = registry_fingerprint(model_dir)
+        _save_registry(registry_path, fingerprint, available_models)
+
+    _scanned_models.clear()
+    _scanned_models[fingerprint] = available_models
+    return list(available_models)
@@ -106,14 +106,26 @@ def load_jit_model(url_or_path, device, model_md5: str):
         model_path = download_model(url_or_path, model_md5)
 
     logger.info(f"Loading model from: {model_path}")
+    # TorchScript archives can't be mmapped, but on CUDA the tensors can be
+    # restored straight onto the device instead of staging a CPU copy
+    map_location = device if torch.device(device).type == "cuda" else "cpu"
     try:
-        model = torch.jit.load(model_path, map_location="cpu").to(device)
+        model = torch.jit.load(model_path, map_location=map_location).to(device)
     except Exception as e:
         handle_error(model_path, model_md5, e)
     model.eval()
     return model
 
 
+def load_state_dict_mmap(model_path):
+    """Memory-map zip-format checkpoints so pages are read lazily and shared
+    between processes; legacy pickle checkpoints fall back to a full read."""
+    try:
+        return torch.load(model_path, map_location="cpu", mmap=True)
+    except RuntimeError:
+        return torch.load(model_path, map_location="cpu")
+
+
 def load_model(model: torch.nn.Module, url_or_path, device, model_md5):
     if os.path.exists(url_or_path):
         model_path = url_or_path
@@ -122,7 +134,7 @@ def load_model(model: torch.nn.Module, url_or_path, device, model_md5):
 
     try:
         logger.info(f"Loading model from: {model_path}")
-        state_dict = torch.load(model_path, map_location="cpu")
+        state_dict = load_state_dict_mmap(model_path)
         model.load_state_dict(state_dict, strict=True)
         model.to(device)
     except Exception as e:
@@ -224,6 +236,22 @@ def pad_img_to_modulo(
     if len(img.shape) == 2:
         img = img[:, :, np.newaxis]
     height, width = img.shape[:2]
+    out_height, out_width = get_padded_size(height, width, mod, square, min_size)
+
+    return np.pad(
+        img,
+        ((0, out_height - height), (0, out_width - width), (0, 0)),
+        mode="symmetric",
+    )
+
+
+def get_padded_size(
+    height: int,
+    width: int,
+    mod: int,
+    square: bool = False,
+    min_size: Optional[int] = None,
+) -> Tuple[int, int]:
     out_height = ceil_modulo(height, mod)
     out_width = ceil_modulo(width, mod)
 
@@ -236,12 +264,194 @@ def pad_img_to_modulo(
         max_size = max(out_height, out_width)
         out_height = max_size
         out_width = max_size
+    return out_height, out_width
 
-    return np.pad(
-        img,
-        ((0, out_height - height), (0, out_width - width), (0, 0)),
-        mode="symmetric",
-    )
+
+def symmetric_pad_index(size: int, out_size: int) -> np.ndarray:
+    """
+    Index map that reproduces np.pad(mode="symmetric") along one axis,
+    including pads larger than the axis itself.
+    """
+    idx = np.arange(out_size) % (2 * size)
+    return np.where(idx < size, idx, 2 * size - 1 - idx)
+
+
+class TensorTransferBuffers:
+    """
+    Uploads uint8 images/masks once and does padding, normalisation and
+    channel reordering as tensor ops on the model device.
+
+    On CUDA the upload goes through reusable pinned staging buffers; on CPU
+    the numpy array is wrapped without a copy. The outputs are bit-identical
+    to pad_img_to_modulo + norm_img.
+    """
+
+    def __init__(self, device):
+        self.device = torch.device(device)
+        self.use_pinned = self.device.type == "cuda"
+        self._staging: Dict[str, torch.Tensor] = {}
+        self._device_buffers: Dict[str, torch.Tensor] = {}
+        self._copy_events: Dict[str, "torch.cuda.Event"] = {}
+        self._pad_indices: Dict[Tuple[int, int, int, int], Tuple[torch.Tensor, torch.Tensor]] = {}
+
+    def upload(self, array: np.ndarray, key: str) -> torch.Tensor:
+        array = np.ascontiguousarray(array)
+        if not self.use_pinned:
+            return torch.from_numpy(array).to(self.device)
+
+        staging = self._staging.get(key)
+        if staging is None or tuple(staging.shape) != array.shape:
+            staging = torch.empty(array.shape, dtype=torch.uint8).pin_memory()
+            self._staging[key] = staging
+            self._device_buffers[key] = torch.empty(
+                array.shape, dtype=torch.uint8, device=self.device
+            )
+        elif key in self._copy_events:
+            # the previous async copy must finish reading the staging buffer
+            self._copy_events[key].synchronize()
+        staging.numpy()[...] = array
+        device_buffer = self._device_buffers[key]
+        device_buffer.copy_(staging, non_blocking=True)
+        event = self._copy_events.setdefault(key, torch.cuda.Event())
+        event.record()
+        return device_buffer
+
+    def _pad_index(self, height: int, width: int, out_height: int, out_width: int):
+        key = (height, width, out_height, out_width)
+        if key not in self._pad_indices:
+            self._pad_indices[key] = (
+                torch.from_numpy(symmetric_pad_index(height, out_height)).to(self.device),
+                torch.from_numpy(symmetric_pad_index(width, out_width)).to(self.device),
+            )
+        return self._pad_indices[key]
+
+    def pad(self, tensor: torch.Tensor, out_height: int, out_width: int) -> torch.Tensor:
+        """Symmetric padding of a [H, W, ...] tensor to [out_height, out_width, ...]"""
+        height, width = tensor.shape[:2]
+        if (height, width) == (out_height, out_width):
+            return tensor
+        rows, cols = self._pad_index(height, width, out_height, out_width)
+        return tensor.index_select(0, rows).index_select(1, cols)
+
+    def prepare(
+        self,
+        image: np.ndarray,
+        mask: np.ndarray,
+        mod: int,
+        square: bool = False,
+        min_size: Optional[int] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Args:
+            image: [H, W, C] uint8
+            mask: [H, W] or [H, W, 1] uint8
+
+        Returns:
+            image [1, C, H', W'] float32 in [0, 1], mask [1, 1, H', W'] int64 in {0, 1}
+        """
+        if mask.ndim == 3:
+            mask = mask[:, :, 0]
+        height, width = image.shape[:2]
+        out_height, out_width = get_padded_size(height, width, mod, square, min_size)
+
+        image_t = self.pad(self.upload(image, "image"), out_height, out_width)
+        mask_t = self.pad(self.upload(mask, "mask"), out_height, out_width)
+
+        image_t = image_t.permute(2, 0, 1).unsqueeze(0).float().div_(255).contiguous()
+        mask_t = (mask_t > 0).to(torch.int64)[None, None]
+        return image_t, mask_t
+
+
+def tensor_to_bgr_image(output: torch.Tensor, height: int, width: int) -> np.ndarray:
+    """
+    Fused post-process for a [1, 3, H', W'] RGB output in [0, 1]: crop to the
+    original size, scale, clip, cast and swap to BGR on the device, then do a
+    single uint8 transfer. Matches np.clip(x * 255, 0, 255).astype("uint8")
+    followed by cv2.cvtColor(RGB2BGR).
+    """
+    output = output[0, :, :height, :width]
+    output = torch.clamp(output * 255, 0, 255).to(torch.uint8)
+    return output.flip(0).permute(1, 2, 0).contiguous().cpu().numpy()
+
+
+def merge_overlapping_boxes(boxes: List[List[int]]) -> List[List[int]]:
+    """
+    Merge [l, t, r, b] boxes until no two overlap. The result is sorted by
+    (t, l, b, r) so paste-back order does not depend on contour order.
+    """
+    merged = [list(map(int, box)) for box in boxes]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    merged[i] = [
+                        min(a[0], b[0]),
+                        min(a[1], b[1]),
+                        max(a[2], b[2]),
+                        max(a[3], b[3]),
+                    ]
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return sorted(merged, key=lambda box: (box[1], box[0], box[3], box[2]))
+
+
+def histogram_lookup(source_cdf: np.ndarray, reference_cdf: np.ndarray) -> np.ndarray:
+    """
+    For every source level, the first reference level whose cdf is >= the
+    source cdf. Levels with no match keep the previous value, like the
+    reference nested loop.
+
+    Returns:
+        (256,) uint8 lookup table
+    """
+    if not np.isfinite(reference_cdf).all():
+        return np.zeros(256, dtype=np.uint8)
+    lookup = np.searchsorted(reference_cdf, source_cdf, side="left")
+    valid = (lookup < len(reference_cdf)) & np.isfinite(source_cdf)
+    # source_cdf is non-decreasing, so matches are too and misses only occur
+    # at the tail: a running max carries the last match forward.
+    lookup = np.maximum.accumulate(np.where(valid, lookup, 0))
+    return lookup.astype(np.uint8)
+
+
+def blend_unmasked_area(
+    result: np.ndarray, image: np.ndarray, mask: np.ndarray
+) -> np.ndarray:
+    """
+    Keep the unmasked area of image, blending by mask inside its bounding box
+    only. Fixed-point uint16, rounds to nearest.
+
+    Args:
+        result: [H, W, C] uint8
+        image: [H, W, C] uint8, same channel order as result
+        mask: [H, W] or [H, W, 1] 0~255
+
+    Returns:
+        [H, W, C] uint8
+    """
+    if mask.ndim == 3:
+        mask = mask[:, :, 0]
+    if result.dtype != np.uint8:
+        result = np.clip(result, 0, 255).astype(np.uint8)
+
+    output = np.ascontiguousarray(image, dtype=np.uint8).copy()
+    l, t, w, h = cv2.boundingRect(mask.astype(np.uint8))
+    if w == 0 or h == 0:
+        return output
+
+    m = mask[t : t + h, l : l + w, np.newaxis].astype(np.uint16)
+    blended = result[t : t + h, l : l + w].astype(np.uint16) * m
+    blended += output[t : t + h, l : l + w].astype(np.uint16) * (255 - m)
+    blended += 127
+    blended //= 255
+    output[t : t + h, l : l + w] = blended
+    return output
 
 
 def boxes_from_mask(mask: np.ndarray) -> List[np.ndarray]:
@@ -1,38 +1,94 @@
-from .anytext.anytext_model import AnyText
-from .controlnet import ControlNet
-from .fcf import FcF
-from .instruct_pix2pix import InstructPix2Pix
-from .kandinsky import Kandinsky22
-from .lama import AnimeLaMa, LaMa
-from .ldm import LDM
-from .manga import Manga
-from .mat import MAT
-from .mi_gan import MIGAN
-from .opencv2 import OpenCV2
-from .paint_by_example import PaintByExample
-from .power_paint.power_paint import PowerPaint
-from .sd import SD, SD2, SD15, Anything4, RealisticVision14
-from .sdxl import SDXL
-from .zits import ZITS
-
-models = {
-    LaMa.name: LaMa,
-    AnimeLaMa.name: AnimeLaMa,
-    LDM.name: LDM,
-    ZITS.name: ZITS,
-    MAT.name: MAT,
-    FcF.name: FcF,
-    OpenCV2.name: OpenCV2,
-    Manga.name: Manga,
-    MIGAN.name: MIGAN,
-    SD15.name: SD15,
-    Anything4.name: Anything4,
-    RealisticVision14.name: RealisticVision14,
-    SD2.name: SD2,
-    PaintByExample.name: PaintByExample,
-    InstructPix2Pix.name: InstructPix2Pix,
-    Kandinsky22.name: Kandinsky22,
-    SDXL.name: SDXL,
-    PowerPaint.name: PowerPaint,
-    AnyText.name: AnyText,
+import importlib
+from collections.abc import Mapping
+
+from sorawm.iopaint.const import (
+    ANYTEXT_NAME,
+    INSTRUCT_PIX2PIX_NAME,
+    KANDINSKY22_NAME,
+    POWERPAINT_NAME,
+)
+
+# Model classes are imported on first use: the diffusion pipelines pull in
+# diffusers/transformers, which erase-only users never need.
+_EXPORTS = {
+    "AnyText": ".anytext.anytext_model",
+    "ControlNet": ".controlnet",
+    "FcF": ".fcf",
+    "InstructPix2Pix": ".instruct_pix2pix",
+    "Kandinsky22": ".kandinsky",
+    "AnimeLaMa": ".lama",
+    "LaMa": ".lama",
+    "LDM": ".ldm",
+    "Manga": ".manga",
+    "MAT": ".mat",
+    "MIGAN": ".mi_gan",
+    "OpenCV2": ".opencv2",
+    "PaintByExample": ".paint_by_example",
+    "PowerPaint": ".power_paint.power_paint",
+    "SD": ".sd",
+    "SD2": ".sd",
+    "SD15": ".sd",
+    "Anything4": ".sd",
+    "RealisticVision14": ".sd",
+    "SDXL": ".sdxl",
+    "ZITS": ".zits",
 }
+
+# name -> (class name, is_erase_model)
+_MODELS = {
+    "lama": ("LaMa", True),
+    "anime-lama": ("AnimeLaMa", True),
+    "ldm": ("LDM", True),
+    "zits": ("ZITS", True),
+    "mat": ("MAT", True),
+    "fcf": ("FcF", True),
+    "cv2": ("OpenCV2", True),
+    "manga": ("Manga", True),
+    "migan": ("MIGAN", True),
+    "runwayml/stable-diffusion-inpainting": ("SD15", False),
+    "Sanster/anything-4.0-inpainting": ("Anything4", False),
+    "Sanster/Realistic_Vision_V1.4-inpainting": ("RealisticVision14", False),
+    "stabilityai/stable-diffusion-2-inpainting": ("SD2", False),
+    "Fantasy-Studio/Paint-by-Example": ("PaintByExample", False),
+    INSTRUCT_PIX2PIX_NAME: ("InstructPix2Pix", False),
+    KANDINSKY22_NAME: ("Kandinsky22", False),
+    "diffusers/stable-diffusion-xl-1.0-inpainting-0.1": ("SDXL", False),
+    POWERPAINT_NAME: ("PowerPaint", False),
+    ANYTEXT_NAME: ("AnyText", False),
+}
+
+
+def _load(class_name: str):
+    module = importlib.import_module(_EXPORTS[class_name], __name__)
+    value = getattr(module, class_name)
+    globals()[class_name] = value
+    return value
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        return _load(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _ModelRegistry(Mapping):
+    """Model name -> class, importing each class the first time it is looked up"""
+
+    def __getitem__(self, name: str):
+        class_name, _ = _MODELS[name]
+        return globals().get(class_name) or _load(class_name)
+
+    def __iter__(self):
+        return iter(_MODELS)
+
+    def __len__(self):
+        return len(_MODELS)
+
+    def __contains__(self, name) -> bool:
+        return name in _MODELS
+
+    def erase_model_names(self):
+        return [name for name, (_, is_erase) in _MODELS.items() if is_erase]
+
+
+models = _ModelRegistry()
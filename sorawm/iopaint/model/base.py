@@ -7,12 +7,19 @@ import torch
 from loguru import logger
 
 from sorawm.iopaint.helper import (
+    TensorTransferBuffers,
+    blend_unmasked_area,
     boxes_from_mask,
+    get_padded_size,
+    histogram_lookup,
+    merge_overlapping_boxes,
     pad_img_to_modulo,
     resize_max_size,
     switch_mps_device,
+    tensor_to_bgr_image,
 )
 from sorawm.iopaint.schema import HDStrategy, InpaintRequest, SDSampler
+from sorawm.utils.tracing import span
 
 from .helper.g_diffuser_bot import expand_image
 from .utils import get_scheduler
@@ -24,6 +31,8 @@ class InpaintModel:
     pad_mod = 8
     pad_to_square = False
     is_erase_model = False
+    # Models that implement forward_tensor get device-side pre/post-processing
+    supports_tensor_forward = False
 
     def __init__(self, device, **kwargs):
         """
@@ -33,6 +42,7 @@ class InpaintModel:
         """
         device = switch_mps_device(self.name, device)
         self.device = device
+        self.transfer_buffers = TensorTransferBuffers(device)
         self.init_model(device, **kwargs)
 
     @abc.abstractmethod
@@ -53,31 +63,105 @@ class InpaintModel:
         """
         ...
 
+    def forward_tensor(self, image, mask, config: InpaintRequest):
+        """Tensor variant of forward used when supports_tensor_forward is set
+        image: [1, C, H, W] RGB float32 in [0, 1], already padded
+        mask: [1, 1, H, W] int64 in {0, 1}
+        return: [1, C, H, W] RGB float in [0, 1]
+        """
+        raise NotImplementedError
+
     @staticmethod
     def download():
         ...
 
     def _pad_forward(self, image, mask, config: InpaintRequest):
         origin_height, origin_width = image.shape[:2]
-        pad_image = pad_img_to_modulo(
-            image, mod=self.pad_mod, square=self.pad_to_square, min_size=self.min_size
-        )
-        pad_mask = pad_img_to_modulo(
-            mask, mod=self.pad_mod, square=self.pad_to_square, min_size=self.min_size
-        )
+        if self.supports_tensor_forward:
+            with span("inpaint.pre"):
+                image_t, mask_t = self.transfer_buffers.prepare(
+                    image,
+                    mask,
+                    mod=self.pad_mod,
+                    square=self.pad_to_square,
+                    min_size=self.min_size,
+                )
+            with span("inpaint.forward"):
+                output = self.forward_tensor(image_t, mask_t, config)
+            # Device sync happens on the copy back, so it is counted as post
+            with span("inpaint.post"):
+                result = tensor_to_bgr_image(output, origin_height, origin_width)
+                return self._finish_forward(result, image, mask, config)
+
+        with span("inpaint.pre"):
+            pad_image = pad_img_to_modulo(
+                image,
+                mod=self.pad_mod,
+                square=self.pad_to_square,
+                min_size=self.min_size,
+            )
+            pad_mask = pad_img_to_modulo(
+                mask,
+                mod=self.pad_mod,
+                square=self.pad_to_square,
+                min_size=self.min_size,
+            )
 
         # logger.info(f"final forward pad size: {pad_image.shape}")
 
-        image, mask = self.forward_pre_process(image, mask, config)
-
-        result = self.forward(pad_image, pad_mask, config)
+        with span("inpaint.forward"):
+            result = self.forward(pad_image, pad_mask, config)
         result = result[0:origin_height, 0:origin_width, :]
 
+        with span("inpaint.post"):
+            return self._finish_forward(result, image, mask, config)
+
+    def _pad_forward_batch(self, images, masks, config: InpaintRequest):
+        """Run crops that pad to the same size through the model as one batch
+
+        Returns:
+            list of BGR IMAGE, same order as images
+        """
+        if not self.supports_tensor_forward or len(images) == 1:
+            return [
+                self._pad_forward(image, mask, config)
+                for image, mask in zip(images, masks)
+            ]
+
+        with span("inpaint.pre", len(images)):
+            prepared = [
+                self.transfer_buffers.prepare(
+                    image,
+                    mask,
+                    mod=self.pad_mod,
+                    square=self.pad_to_square,
+                    min_size=self.min_size,
+                )
+                for image, mask in zip(images, masks)
+            ]
+        with span("inpaint.forward", len(images)):
+            output = self.forward_tensor(
+                torch.cat([image_t for image_t, _ in prepared]),
+                torch.cat([mask_t for _, mask_t in prepared]),
+                config,
+            )
+
+        results = []
+        with span("inpaint.post", len(images)):
+            for i, (image, mask) in enumerate(zip(images, masks)):
+                result = tensor_to_bgr_image(
+                    output[i : i + 1], image.shape[0], image.shape[1]
+                )
+                results.append(self._finish_forward(result, image, mask, config))
+        return results
+
+    def _finish_forward(self, result, image, mask, config: InpaintRequest):
+        image, mask = self.forward_pre_process(image, mask, config)
+
         result, image, mask = self.forward_post_process(result, image, mask, config)
 
         if config.sd_keep_unmasked_area:
-            mask = mask[:, :, np.newaxis]
-            result = result * (mask / 255) + image[:, :, ::-1] * (1 - (mask / 255))
+            result = blend_unmasked_area(result, image[:, :, ::-1], mask)
         return result
 
     def forward_pre_process(self, image, mask, config):
@@ -99,10 +183,7 @@ class InpaintModel:
             if max(image.shape) > config.hd_strategy_crop_trigger_size:
                 # logger.info("Run crop strategy")
                 boxes = boxes_from_mask(mask)
-                crop_result = []
-                for box in boxes:
-                    crop_image, crop_box = self._run_box(image, mask, box, config)
-                    crop_result.append((crop_image, crop_box))
+                crop_result = self._run_boxes(image, mask, boxes, config)
 
                 inpaint_result = image[:, :, ::-1].copy()
                 for crop_image, crop_box in crop_result:
@@ -200,15 +281,7 @@ class InpaintModel:
         return normalized_cdf
 
     def _calculate_lookup(self, source_cdf, reference_cdf):
-        lookup_table = np.zeros(256)
-        lookup_val = 0
-        for source_index, source_val in enumerate(source_cdf):
-            for reference_index, reference_val in enumerate(reference_cdf):
-                if reference_val >= source_val:
-                    lookup_val = reference_index
-                    break
-            lookup_table[source_index] = lookup_val
-        return lookup_table
+        return histogram_lookup(source_cdf, reference_cdf)
 
     def _match_histograms(self, source, reference, mask):
         transformed_channels = []
@@ -232,10 +305,7 @@ class InpaintModel:
 
             transformed_channels.append(cv2.LUT(source_channel, lookup))
 
-        result = cv2.merge(transformed_channels)
-        result = cv2.convertScaleAbs(result)
-
-        return result
+        return cv2.merge(transformed_channels)
 
     def _apply_cropper(self, image, mask, config: InpaintRequest):
         img_h, img_w = image.shape[:2]
@@ -272,6 +342,42 @@ class InpaintModel:
 
         return self._pad_forward(crop_img, crop_mask, config), [l, t, r, b]
 
+    def _run_boxes(self, image, mask, boxes, config: InpaintRequest):
+        """
+        Merge overlapping crop windows, bucket them by padded size and run
+        each bucket as one batch.
+
+        Args:
+            image: [H, W, C] RGB
+            mask: [H, W, 1]
+            boxes: list of [left,top,right,bottom]
+
+        Returns:
+            list of (BGR IMAGE, [l, t, r, b]) in deterministic paste-back order
+        """
+        windows = merge_overlapping_boxes(
+            [self._crop_box(image, mask, box, config)[2] for box in boxes]
+        )
+
+        buckets = {}
+        for l, t, r, b in windows:
+            padded_size = get_padded_size(
+                b - t, r - l, self.pad_mod, self.pad_to_square, self.min_size
+            )
+            buckets.setdefault(padded_size, []).append([l, t, r, b])
+
+        results = {}
+        for bucket_windows in buckets.values():
+            crop_results = self._pad_forward_batch(
+                [image[t:b, l:r, :] for l, t, r, b in bucket_windows],
+                [mask[t:b, l:r] for l, t, r, b in bucket_windows],
+                config,
+            )
+            for window, crop_image in zip(bucket_windows, crop_results):
+                results[tuple(window)] = crop_image
+
+        return [(results[tuple(window)], window) for window in windows]
+
 
 class DiffusionInpaintModel(InpaintModel):
     def __init__(self, device, **kwargs):
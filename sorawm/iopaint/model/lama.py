@@ -33,6 +33,7 @@ class LaMa(InpaintModel):
     name = "lama"
     pad_mod = 8
     is_erase_model = True
+    supports_tensor_forward = True
 
     @staticmethod
     def download():
@@ -41,6 +42,10 @@ class LaMa(InpaintModel):
     def init_model(self, device, **kwargs):
         self.model = load_jit_model(LAMA_MODEL_URL, device, LAMA_MODEL_MD5).eval()
 
+    @staticmethod
+    def weights_path() -> str:
+        return get_cache_path_by_url(LAMA_MODEL_URL)
+
     @staticmethod
     def is_downloaded() -> bool:
         return os.path.exists(get_cache_path_by_url(LAMA_MODEL_URL))
@@ -65,6 +70,9 @@ class LaMa(InpaintModel):
         cur_res = cv2.cvtColor(cur_res, cv2.COLOR_RGB2BGR)
         return cur_res
 
+    def forward_tensor(self, image, mask, config: InpaintRequest):
+        return self.model(image, mask)
+
 
 class AnimeLaMa(LaMa):
     name = "anime-lama"
@@ -78,6 +86,10 @@ class AnimeLaMa(LaMa):
             ANIME_LAMA_MODEL_URL, device, ANIME_LAMA_MODEL_MD5
         ).eval()
 
+    @staticmethod
+    def weights_path() -> str:
+        return get_cache_path_by_url(ANIME_LAMA_MODEL_URL)
+
     @staticmethod
     def is_downloaded() -> bool:
         return os.path.exists(get_cache_path_by_url(ANIME_LAMA_MODEL_URL))
@@ -6,10 +6,7 @@ from loguru import logger
 
 from sorawm.iopaint.download import scan_models
 from sorawm.iopaint.helper import switch_mps_device
-from sorawm.iopaint.model import SD, SDXL, ControlNet, models
-from sorawm.iopaint.model.brushnet.brushnet_wrapper import BrushNetWrapper
-from sorawm.iopaint.model.brushnet.brushnet_xl_wrapper import BrushNetXLWrapper
-from sorawm.iopaint.model.power_paint.power_paint_v2 import PowerPaintV2
+from sorawm.iopaint.model import models
 from sorawm.iopaint.model.utils import is_local_files_only, torch_gc
 from sorawm.iopaint.schema import InpaintRequest, ModelInfo, ModelType
 
@@ -60,16 +57,29 @@ class ModelManager:
             "brushnet_method": self.brushnet_method,
         }
 
+        # Pipeline classes are imported only for the model that is selected
         if model_info.support_controlnet and self.enable_controlnet:
+            from sorawm.iopaint.model import ControlNet
+
             return ControlNet(device, **kwargs)
 
         if model_info.support_brushnet and self.enable_brushnet:
             if model_info.model_type == ModelType.DIFFUSERS_SD:
+                from sorawm.iopaint.model.brushnet.brushnet_wrapper import (
+                    BrushNetWrapper,
+                )
+
                 return BrushNetWrapper(device, **kwargs)
             elif model_info.model_type == ModelType.DIFFUSERS_SDXL:
+                from sorawm.iopaint.model.brushnet.brushnet_xl_wrapper import (
+                    BrushNetXLWrapper,
+                )
+
                 return BrushNetXLWrapper(device, **kwargs)
 
         if model_info.support_powerpaint_v2 and self.enable_powerpaint_v2:
+            from sorawm.iopaint.model.power_paint.power_paint_v2 import PowerPaintV2
+
             return PowerPaintV2(device, **kwargs)
 
         if model_info.name in models:
@@ -79,12 +89,16 @@ class ModelManager:
             ModelType.DIFFUSERS_SD_INPAINT,
             ModelType.DIFFUSERS_SD,
         ]:
+            from sorawm.iopaint.model import SD
+
             return SD(device, **kwargs)
 
         if model_info.model_type in [
             ModelType.DIFFUSERS_SDXL_INPAINT,
             ModelType.DIFFUSERS_SDXL,
         ]:
+            from sorawm.iopaint.model import SDXL
+
             return SDXL(device, **kwargs)
 
         raise NotImplementedError(f"Unsupported model: {name}")
@@ -0,0 +1,49 @@
+import pytest
+
+from sorawm.iopaint import download
+from sorawm.iopaint.schema import ModelInfo, ModelType
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(download, "_scanned_models", {})
+    scans = []
+
+    def fake_scan(model_dir):
+        scans.append(model_dir)
+        return [ModelInfo(name="lama", path="lama", model_type=ModelType.INPAINT)]
+
+    monkeypatch.setattr(download, "_scan_all_models", fake_scan)
+    return tmp_path, scans
+
+
+def test_scan_models_is_cached_in_process(model_dir):
+    _, scans = model_dir
+    first = download.scan_models()
+    second = download.scan_models()
+    assert [it.name for it in first] == [it.name for it in second] == ["lama"]
+    assert len(scans) == 1
+
+
+def test_scan_models_reuses_persisted_registry(model_dir, monkeypatch):
+    root, scans = model_dir
+    download.scan_models()
+    assert (root / download.MODEL_REGISTRY_FILE).exists()
+
+    # A restarted process has an empty in-process cache
+    monkeypatch.setattr(download, "_scanned_models", {})
+    models = download.scan_models()
+    assert [it.name for it in models] == ["lama"]
+    assert models[0].model_type == ModelType.INPAINT
+    assert len(scans) == 1
+
+
+def test_scan_models_rescans_when_models_change(model_dir):
+    root, scans = model_dir
+    download.scan_models()
+    sd_dir = root / "stable_diffusion"
+    sd_dir.mkdir()
+    (sd_dir / "new-model.safetensors").write_bytes(b"0")
+    download.scan_models()
+    assert len(scans) == 2
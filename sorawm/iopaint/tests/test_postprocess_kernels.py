@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from sorawm.iopaint.helper import blend_unmasked_area, histogram_lookup
+
+
+def _reference_lookup(source_cdf, reference_cdf):
+    lookup_table = np.zeros(256)
+    lookup_val = 0
+    for source_index, source_val in enumerate(source_cdf):
+        for reference_index, reference_val in enumerate(reference_cdf):
+            if reference_val >= source_val:
+                lookup_val = reference_index
+                break
+        lookup_table[source_index] = lookup_val
+    return lookup_table
+
+
+def _cdf(histogram):
+    cdf = histogram.cumsum()
+    return cdf / float(cdf.max())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_histogram_lookup_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    source = rng.integers(0, 256, 2000)
+    reference = rng.normal(128, 30 + seed * 10, 2000).clip(0, 255).astype(int)
+    source_cdf = _cdf(np.histogram(source, 256, [0, 256])[0])
+    reference_cdf = _cdf(np.histogram(reference, 256, [0, 256])[0])
+
+    lookup = histogram_lookup(source_cdf, reference_cdf)
+    assert lookup.dtype == np.uint8
+    assert np.array_equal(lookup, _reference_lookup(source_cdf, reference_cdf))
+
+
+def test_histogram_lookup_empty_histogram():
+    with np.errstate(invalid="ignore"):
+        empty_cdf = _cdf(np.zeros(256))
+    cdf = _cdf(np.ones(256))
+    for source_cdf, reference_cdf in [(empty_cdf, cdf), (cdf, empty_cdf)]:
+        assert np.array_equal(
+            histogram_lookup(source_cdf, reference_cdf),
+            _reference_lookup(source_cdf, reference_cdf),
+        )
+
+
+def test_blend_unmasked_area_within_one_lsb():
+    rng = np.random.default_rng(0)
+    result = rng.integers(0, 256, (64, 80, 3), dtype=np.uint8)
+    image = rng.integers(0, 256, (64, 80, 3), dtype=np.uint8)
+    mask = np.zeros((64, 80, 1), dtype=np.uint8)
+    mask[10:30, 20:50] = rng.integers(0, 256, (20, 30, 1), dtype=np.uint8)
+
+    expected = result * (mask / 255) + image * (1 - (mask / 255))
+    blended = blend_unmasked_area(result, image, mask)
+
+    assert blended.dtype == np.uint8
+    assert np.abs(blended.astype(np.float64) - expected).max() <= 1
+    assert np.array_equal(blended[mask[:, :, 0] == 0], image[mask[:, :, 0] == 0])
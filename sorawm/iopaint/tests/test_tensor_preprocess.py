@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from sorawm.iopaint.helper import (
+    TensorTransferBuffers,
+    merge_overlapping_boxes,
+    norm_img,
+    pad_img_to_modulo,
+    symmetric_pad_index,
+    tensor_to_bgr_image,
+)
+
+
+@pytest.mark.parametrize("size, out_size", [(5, 5), (5, 8), (3, 11), (1, 4)])
+def test_symmetric_pad_index(size, out_size):
+    data = np.arange(size)
+    expected = np.pad(data, (0, out_size - size), mode="symmetric")
+    assert np.array_equal(data[symmetric_pad_index(size, out_size)], expected)
+
+
+@pytest.mark.parametrize(
+    "shape, mod, square, min_size",
+    [
+        ((37, 53), 8, False, None),
+        ((64, 64), 8, False, None),
+        ((45, 30), 8, True, None),
+        ((20, 31), 8, False, 64),
+    ],
+)
+def test_prepare_matches_numpy_path(shape, mod, square, min_size):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (*shape, 3), dtype=np.uint8)
+    mask = (rng.integers(0, 256, shape, dtype=np.uint8) > 200).astype(np.uint8) * 255
+
+    pad_image = pad_img_to_modulo(image, mod=mod, square=square, min_size=min_size)
+    pad_mask = pad_img_to_modulo(mask, mod=mod, square=square, min_size=min_size)
+    expected_image = torch.from_numpy(norm_img(pad_image)).unsqueeze(0)
+    expected_mask = torch.from_numpy((norm_img(pad_mask) > 0) * 1).unsqueeze(0)
+
+    buffers = TensorTransferBuffers(torch.device("cpu"))
+    image_t, mask_t = buffers.prepare(
+        image, mask, mod=mod, square=square, min_size=min_size
+    )
+
+    assert image_t.dtype == expected_image.dtype
+    assert mask_t.dtype == expected_mask.dtype
+    assert torch.equal(image_t, expected_image)
+    assert torch.equal(mask_t, expected_mask)
+
+
+def test_tensor_to_bgr_image_matches_numpy_path():
+    rng = np.random.default_rng(1)
+    output = torch.from_numpy(
+        rng.uniform(-0.2, 1.2, (1, 3, 40, 48)).astype(np.float32)
+    )
+
+    cur_res = output[0].permute(1, 2, 0).numpy()
+    cur_res = np.clip(cur_res * 255, 0, 255).astype("uint8")
+    expected = cv2.cvtColor(cur_res, cv2.COLOR_RGB2BGR)[0:37, 0:45, :]
+
+    result = tensor_to_bgr_image(output, 37, 45)
+    assert result.dtype == np.uint8
+    assert np.array_equal(result, expected)
+
+
+def test_merge_overlapping_boxes():
+    boxes = [[50, 0, 60, 10], [0, 0, 10, 10], [5, 5, 20, 20], [18, 18, 30, 30]]
+    assert merge_overlapping_boxes(boxes) == [[0, 0, 30, 30], [50, 0, 60, 10]]
+    assert merge_overlapping_boxes([[0, 0, 10, 10], [10, 0, 20, 10]]) == [
+        [0, 0, 10, 10],
+        [10, 0, 20, 10],
+    ]
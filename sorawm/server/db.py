@@ -1,9 +1,12 @@
+import time
 from contextlib import asynccontextmanager
 
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from sorawm.configs import SQLITE_PATH
+from sorawm.server.metrics import db_query_seconds
 
 
 class Base(DeclarativeBase):
@@ -12,15 +15,63 @@ class Base(DeclarativeBase):
 
 DATABASE_URL = f"sqlite+aiosqlite:///{SQLITE_PATH}"
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# 多进程共享同一个 sqlite 文件，写锁冲突时等待而不是立即报错
+engine = create_async_engine(DATABASE_URL, echo=False, connect_args={"timeout": 30})
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    # WAL 模式下读不阻塞写，多进程轮询与进度写入互不等待
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # 开始时间挂在本条语句的执行上下文上，语句出错时随上下文一起丢弃，不会残留
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _observe_query_latency(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start", None)
+    if started is None:
+        return
+    operation = statement.lstrip().split(None, 1)[0].lower() if statement else ""
+    db_query_seconds.observe(time.perf_counter() - started, operation=operation)
+
+
 async_session_maker = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
 
+def _add_missing_columns(sync_conn):
+    """给已有的 sqlite 表补上模型中新增的列（create_all 不会修改已有表）"""
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            row[1]
+            for row in sync_conn.execute(text(f"PRAGMA table_info({table.name})"))
+        }
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+            ddl += column.type.compile(dialect=sync_conn.dialect)
+            if column.server_default is not None:
+                ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+            sync_conn.execute(text(ddl))
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
 
 
 @asynccontextmanager
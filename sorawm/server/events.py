@@ -0,0 +1,103 @@
+import asyncio
+import time
+from contextlib import contextmanager
+
+from pydantic import BaseModel
+
+from sorawm.configs import EVENT_SUBSCRIBER_QUEUE_SIZE
+from sorawm.server.schemas import TERMINAL_STATUSES, Status
+
+
+def stage_for(status: Status, stage: str | None = None) -> str:
+    """
+    事件中的阶段名：处理中为 SoraWM.run 通过 stage_callback 上报的阶段，
+    未知时（如其他进程处理的任务）为 processing；其余为状态名
+    """
+    if status != Status.PROCESSING:
+        return status.lower()
+    return stage or "processing"
+
+
+class ProgressEvent(BaseModel):
+    task_id: str
+    status: Status
+    percentage: int
+    stage: str
+    eta_seconds: float | None = None
+    download_url: str | None = None
+
+
+class ProgressBroker:
+    """
+    进程内的进度事件分发。
+
+    每个订阅者一个有界队列，队列满时丢弃最旧的事件（进度事件只关心最新值），
+    慢客户端不会拖住 worker；终态事件总能送达。
+    """
+
+    def __init__(self, queue_size: int = EVENT_SUBSCRIBER_QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._last: dict[str, ProgressEvent] = {}
+        self._started: dict[str, tuple[float, int]] = {}
+
+    def publish(
+        self,
+        task_id: str,
+        status: Status,
+        percentage: int,
+        download_url: str | None = None,
+        stage: str | None = None,
+    ) -> ProgressEvent:
+        event = ProgressEvent(
+            task_id=task_id,
+            status=status,
+            percentage=percentage,
+            stage=stage_for(status, stage),
+            eta_seconds=self._eta(task_id, status, percentage),
+            download_url=download_url,
+        )
+        if status in TERMINAL_STATUSES:
+            self._last.pop(task_id, None)
+            self._started.pop(task_id, None)
+        else:
+            self._last[task_id] = event
+
+        for queue in self._subscribers.get(task_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+        return event
+
+    def last_event(self, task_id: str) -> ProgressEvent | None:
+        return self._last.get(task_id)
+
+    @contextmanager
+    def subscribe(self, task_id: str):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def _eta(self, task_id: str, status: Status, percentage: int) -> float | None:
+        if status != Status.PROCESSING:
+            return 0.0 if status == Status.FINISHED else None
+        now = time.monotonic()
+        started = self._started.setdefault(task_id, (now, percentage))
+        start_time, start_percentage = started
+        done = percentage - start_percentage
+        if done <= 0:
+            return None
+        return (now - start_time) / done * (100 - percentage)
+
+
+progress_broker = ProgressBroker()
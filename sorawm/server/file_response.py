@@ -0,0 +1,87 @@
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+import aiofiles
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from sorawm.configs import STREAM_CHUNK_SIZE
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(range_header: str, file_size: int) -> tuple[int, int]:
+    """
+    解析单段 Range 头
+
+    Returns:
+        (start, end)，end 包含在内；不可满足时抛出 416
+    """
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if match is None or match.groups() == ("", ""):
+        raise _range_not_satisfiable(file_size)
+    start_text, end_text = match.groups()
+    if start_text:
+        start = int(start_text)
+        end = int(end_text) if end_text else file_size - 1
+    else:
+        # bytes=-N 表示最后 N 个字节
+        start = max(0, file_size - int(end_text))
+        end = file_size - 1
+    end = min(end, file_size - 1)
+    if start > end or start >= file_size:
+        raise _range_not_satisfiable(file_size)
+    return start, end
+
+
+def _range_not_satisfiable(file_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=416,
+        detail="Requested range not satisfiable.",
+        headers={"Content-Range": f"bytes */{file_size}"},
+    )
+
+
+async def _iter_file(path: Path, start: int, length: int):
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while length > 0:
+            chunk = await f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(
+    path: Path,
+    range_header: str | None,
+    media_type: str,
+    filename: str | None = None,
+    headers: dict[str, str] | None = None,
+) -> StreamingResponse:
+    """支持 Range 请求的文件响应：无 Range 时 200 全量，有 Range 时 206 部分内容"""
+    file_size = path.stat().st_size
+    response_headers = {"Accept-Ranges": "bytes", **(headers or {})}
+    if filename is not None:
+        response_headers["Content-Disposition"] = (
+            f"attachment; filename*=utf-8''{quote(filename)}"
+        )
+
+    if range_header:
+        start, end = parse_range(range_header, file_size)
+        status_code = 206
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    else:
+        start, end = 0, file_size - 1
+        status_code = 200
+    length = end - start + 1
+    response_headers["Content-Length"] = str(length)
+
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=status_code,
+        media_type=media_type,
+        headers=response_headers,
+    )
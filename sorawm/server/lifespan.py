@@ -4,24 +4,33 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from loguru import logger
 
+from sorawm.configs import ensure_runtime_dirs
 from sorawm.server.db import init_db
+from sorawm.server.status_cache import status_cache
+from sorawm.server.storage import storage_manager
 from sorawm.server.worker import worker
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up...")
+    ensure_runtime_dirs()
 
     await init_db()
     logger.info("Database initialized")
 
+    await storage_manager.sweep_orphans()
+
     await worker.initialize()
 
-    _ = asyncio.create_task(worker.run())
+    worker.start()
+    _ = asyncio.create_task(status_cache.flush_loop())
+    _ = asyncio.create_task(storage_manager.run())
 
     logger.info("Application started successfully")
 
     yield
 
     logger.info("Shutting down...")
+    await status_cache.flush()
     logger.info("Application shutdown complete")
@@ -0,0 +1,249 @@
+"""
+Prometheus 文本格式的服务端指标
+计数器在工作线程（流水线 span 回调）与事件循环中都会被更新，统一用锁保护；
+不依赖 prometheus_client。多进程部署时每个进程各自暴露自己的指标。
+"""
+
+import math
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import psutil
+
+from sorawm.utils.tracing import add_span_listener
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("Counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def _samples(self) -> Iterable[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各桶计数(非累计), sum, count]
+        self._values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            return state[2] if state else 0
+
+    def _samples(self) -> Iterable[str]:
+        bucket_names = self.labelnames + ("le",)
+        for key, (bucket_counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(
+                self.buckets + (math.inf,), bucket_counts
+            ):
+                cumulative += bucket_count
+                labels = _format_labels(bucket_names, key + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """注册抓取时调用的回调，用于刷新 RSS 等即时值"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+queue_depth = registry.gauge("sorawm_queue_depth", "Tasks waiting in the queue")
+active_pipelines = registry.gauge(
+    "sorawm_active_pipelines", "Pipelines currently processing a task"
+)
+pipeline_pool_size = registry.gauge(
+    "sorawm_pipeline_pool_size", "Pipelines in this worker process"
+)
+stage_seconds = registry.histogram(
+    "sorawm_stage_seconds",
+    "Latency of a pipeline stage call",
+    ("stage",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0),
+)
+stage_items = registry.counter(
+    "sorawm_stage_items_total", "Frames processed by a pipeline stage", ("stage",)
+)
+task_duration_seconds = registry.histogram(
+    "sorawm_task_duration_seconds",
+    "Processing time of a task by final status",
+    ("status",),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600),
+)
+upload_bytes = registry.counter("sorawm_upload_bytes_total", "Bytes received in uploads")
+db_query_seconds = registry.histogram(
+    "sorawm_db_query_seconds", "Latency of database statements", ("operation",)
+)
+process_rss_bytes = registry.gauge(
+    "sorawm_process_resident_memory_bytes", "Resident memory of this process"
+)
+
+
+def observe_stage(stage: str, seconds: float, items: int) -> None:
+    stage_seconds.observe(seconds, stage=stage)
+    stage_items.inc(items, stage=stage)
+
+
+def _collect_process_metrics() -> None:
+    process_rss_bytes.set(psutil.Process(os.getpid()).memory_info().rss)
+
+
+registry.add_collector(_collect_process_metrics)
+add_span_listener(observe_stage)
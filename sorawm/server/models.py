@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import DateTime, Integer, String
+from sqlalchemy import Boolean, DateTime, Float, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from sorawm.server.db import Base
@@ -8,6 +8,12 @@ from sorawm.server.db import Base
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_status_created_at", "status", "created_at"),
+        Index("ix_tasks_created_at", "created_at"),
+        # claim 按 status = QUEUED 过滤后取 schedule_key 最小者
+        Index("ix_tasks_status_schedule_key", "status", "schedule_key"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     video_path: Mapped[str] = mapped_column(String, nullable=False)
@@ -15,7 +21,55 @@ class Task(Base):
     status: Mapped[str] = mapped_column(String, nullable=False, default="PROCESSING")
     percentage: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     download_url: Mapped[str] = mapped_column(String, nullable=True)
+    content_hash: Mapped[str] = mapped_column(String, nullable=True)
+    webhook_url: Mapped[str] = mapped_column(String, nullable=True)
+    stream_dir: Mapped[str] = mapped_column(String, nullable=True)
+    priority: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    video_frames: Mapped[int] = mapped_column(Integer, nullable=True)
+    video_pixels: Mapped[int] = mapped_column(Integer, nullable=True)
+    estimated_seconds: Mapped[float] = mapped_column(Float, nullable=True)
+    queued_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    schedule_key: Mapped[float] = mapped_column(Float, nullable=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    cancel_requested: Mapped[bool] = mapped_column(
+        Boolean, nullable=False, default=False, server_default="0"
+    )
+    lease_owner: Mapped[str] = mapped_column(String, nullable=True)
+    lease_expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.now, onupdate=datetime.now
     )
+
+
+class CachedResult(Base):
+    __tablename__ = "result_cache"
+    __table_args__ = (Index("ix_result_cache_last_used_at", "last_used_at"),)
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    path: Mapped[str] = mapped_column(String, nullable=False)
+    size_bytes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    hits: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
+class TaskFile(Base):
+    __tablename__ = "task_files"
+    __table_args__ = (Index("ix_task_files_last_accessed_at", "last_accessed_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    task_id: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    path: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+    size_bytes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    last_accessed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
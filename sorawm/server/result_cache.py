@@ -0,0 +1,97 @@
+import asyncio
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import delete, func, select
+
+from sorawm.configs import RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+from sorawm.server.db import get_session
+from sorawm.server.models import CachedResult
+
+
+def link_or_copy(src: Path, dst: Path):
+    """优先硬链接，跨文件系统时退回复制"""
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class ResultCache:
+    """
+    内容寻址的结果缓存。
+
+    键为上传内容 sha256 与流水线指纹的组合，值为缓存目录下与输出硬链接的文件；
+    总大小超过 RESULT_CACHE_MAX_BYTES 时按最近使用时间淘汰。
+    """
+
+    def __init__(self, cache_dir: Path = RESULT_CACHE_DIR) -> None:
+        # 目录在首次写入时创建，导入模块不产生文件系统副作用
+        self.cache_dir = cache_dir
+
+    async def materialize(self, cache_key: str, output_path: Path) -> bool:
+        """命中时把缓存结果链接到 output_path"""
+        async with get_session() as session:
+            entry = await session.get(CachedResult, cache_key)
+            if entry is None:
+                return False
+            cached_path = Path(entry.path)
+            if not cached_path.exists():
+                await session.delete(entry)
+                return False
+            # 跨文件系统时退回整段复制，不能阻塞事件循环
+            await asyncio.to_thread(link_or_copy, cached_path, output_path)
+            entry.last_used_at = datetime.now()
+            entry.hits += 1
+        return True
+
+    async def store(self, cache_key: str, output_path: Path):
+        cached_path = self.cache_dir / f"{cache_key}{output_path.suffix}"
+        await asyncio.to_thread(self._store_file, output_path, cached_path)
+        now = datetime.now()
+        async with get_session() as session:
+            entry = await session.get(CachedResult, cache_key)
+            if entry is None:
+                entry = CachedResult(key=cache_key, created_at=now, hits=0)
+                session.add(entry)
+            entry.path = str(cached_path)
+            entry.size_bytes = cached_path.stat().st_size
+            entry.last_used_at = now
+        await self.evict()
+
+    def _store_file(self, output_path: Path, cached_path: Path):
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        link_or_copy(output_path, cached_path)
+
+    async def evict(self):
+        async with get_session() as session:
+            total = (
+                await session.execute(
+                    select(func.coalesce(func.sum(CachedResult.size_bytes), 0))
+                )
+            ).scalar_one()
+            if total <= RESULT_CACHE_MAX_BYTES:
+                return
+            entries = (
+                await session.execute(
+                    select(CachedResult).order_by(CachedResult.last_used_at)
+                )
+            ).scalars()
+            evicted = []
+            for entry in entries:
+                if total <= RESULT_CACHE_MAX_BYTES:
+                    break
+                Path(entry.path).unlink(missing_ok=True)
+                total -= entry.size_bytes
+                evicted.append(entry.key)
+            await session.execute(
+                delete(CachedResult).where(CachedResult.key.in_(evicted))
+            )
+        logger.info(f"Evicted {len(evicted)} cached result(s), {total} bytes left")
+
+
+result_cache = ResultCache()
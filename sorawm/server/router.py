@@ -1,36 +1,95 @@
+import asyncio
+import re
 from pathlib import Path
+from typing import AsyncIterator
 from uuid import uuid4
 
-import aiofiles
-from fastapi import APIRouter, BackgroundTasks, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from sorawm.server.schemas import WMRemoveResults
+from sorawm.configs import EVENT_HEARTBEAT_INTERVAL
+from sorawm.server.events import ProgressEvent, progress_broker, stage_for
+from sorawm.server.file_response import ranged_file_response
+from sorawm.server.metrics import CONTENT_TYPE, registry
+from sorawm.server.schemas import (
+    TERMINAL_STATUSES,
+    Status,
+    StorageStats,
+    WMRemoveResults,
+    WorkerStats,
+)
+from sorawm.server.storage import storage_manager
+from sorawm.server.upload import check_content_length, receive_upload_form
 from sorawm.server.worker import worker
 
 router = APIRouter()
 
+_STREAM_FILE_PATTERN = re.compile(r"^[\w.-]+\.(m3u8|m4s|mp4)$")
+_STREAM_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
 
-async def process_upload_and_queue(
-    task_id: str, video_content: bytes, video_path: Path
-):
+
+# 请求体由 receive_upload_form 流式解析，这里只为 OpenAPI 文档声明表单结构
+_SUBMIT_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["video"],
+                    "properties": {
+                        "video": {"type": "string", "format": "binary"},
+                        "webhook_url": {"type": "string"},
+                        "priority": {"type": "integer", "default": 0},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/submit_remove_task", openapi_extra=_SUBMIT_FORM_SCHEMA)
+async def submit_remove_task(request: Request):
+    # 超限请求在读取请求体之前拒绝，不创建任务
+    check_content_length(request)
+    task_id = await worker.create_task(None)
     try:
-        async with aiofiles.open(video_path, "wb") as f:
-            await f.write(video_content)
-        await worker.queue_task(task_id, video_path)
+        form = await receive_upload_form(
+            request,
+            "video",
+            lambda filename: worker.upload_dir / f"{uuid4()}_{filename}",
+        )
+    except HTTPException as e:
+        await worker.mark_task_error(task_id, e.detail)
+        raise
     except Exception as e:
         await worker.mark_task_error(task_id, str(e))
-
-
-@router.post("/submit_remove_task")
-async def submit_remove_task(
-    background_tasks: BackgroundTasks, video: UploadFile = File(...)
-):
-    task_id = await worker.create_task()
-    content = await video.read()
-    upload_filename = f"{uuid4()}_{video.filename}"
-    video_path = worker.upload_dir / upload_filename
-    background_tasks.add_task(process_upload_and_queue, task_id, content, video_path)
+        raise HTTPException(status_code=500, detail="Failed to save upload.")
+    try:
+        priority = int(form.fields.get("priority") or 0)
+    except ValueError:
+        form.path.unlink(missing_ok=True)
+        await worker.mark_task_error(task_id, "Invalid priority.")
+        raise HTTPException(status_code=422, detail="priority must be an integer.")
+    await worker.queue_task(
+        task_id,
+        form.path,
+        form.content_hash,
+        priority,
+        webhook_url=form.fields.get("webhook_url") or None,
+    )
 
     return {"task_id": task_id, "message": "Task submitted."}
 
@@ -41,11 +100,124 @@ async def get_results(remove_task_id: str) -> WMRemoveResults:
     if result is None:
         raise HTTPException(status_code=404, detail="Task does not exist.")
 
-    return result
+    return await worker.get_task_estimate(remove_task_id, result)
+
+
+@router.post("/cancel/{task_id}")
+async def cancel_task(task_id: str):
+    status = await worker.cancel_task(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task does not exist.")
+    if status in (Status.FINISHED, Status.ERROR):
+        raise HTTPException(status_code=409, detail=f"Task already {status}.")
+    message = "Task cancelled." if status == Status.CANCELLED else "Cancellation requested."
+    return {"task_id": task_id, "status": status, "message": message}
+
+
+async def _status_event(task_id: str) -> ProgressEvent | None:
+    result = await worker.get_task_status(task_id)
+    if result is None:
+        return None
+    # 本进程处理的任务沿用最近一次推送的阶段，其他进程处理的任务阶段未知
+    last = progress_broker.last_event(task_id)
+    return ProgressEvent(
+        task_id=task_id,
+        status=result.status,
+        percentage=result.percentage,
+        stage=stage_for(result.status, last.stage if last else None),
+        download_url=result.download_url,
+    )
+
+
+async def progress_events(task_id: str) -> AsyncIterator[ProgressEvent | None]:
+    """
+    任务进度事件流，None 表示心跳。
+
+    本进程处理的任务由 worker 推送；超过心跳间隔没有事件时查询一次状态，
+    兼顾由其他进程处理的任务。终态事件后结束。
+    """
+    with progress_broker.subscribe(task_id) as queue:
+        last = progress_broker.last_event(task_id) or await _status_event(task_id)
+        if last is None:
+            return
+        yield last
+        while last.status not in TERMINAL_STATUSES:
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), timeout=EVENT_HEARTBEAT_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                event = await _status_event(task_id)
+                if event is None or (event.status, event.percentage) == (
+                    last.status,
+                    last.percentage,
+                ):
+                    yield None
+                    continue
+            last = event
+            yield event
+
+
+async def _ensure_task_exists(task_id: str):
+    if await worker.get_task_status(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task does not exist.")
+
+
+@router.get("/progress/{task_id}/stream")
+async def stream_progress(task_id: str):
+    await _ensure_task_exists(task_id)
+
+    async def sse():
+        async for event in progress_events(task_id):
+            if event is None:
+                yield ": ping\n\n"
+            else:
+                yield f"event: progress\ndata: {event.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/progress/{task_id}/ws")
+async def websocket_progress(websocket: WebSocket, task_id: str):
+    await websocket.accept()
+    if await worker.get_task_status(task_id) is None:
+        await websocket.close(code=4404, reason="Task does not exist.")
+        return
+    try:
+        async for event in progress_events(task_id):
+            if event is None:
+                await websocket.send_json({"type": "ping"})
+            else:
+                await websocket.send_json(
+                    {"type": "progress", **event.model_dump(mode="json")}
+                )
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/worker_stats")
+async def get_worker_stats() -> WorkerStats:
+    return await worker.get_stats()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    await worker.collect_metrics()
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/storage_stats")
+async def get_storage_stats() -> StorageStats:
+    return await storage_manager.get_stats()
 
 
 @router.get("/download/{task_id}")
-async def download_video(task_id: str):
+async def download_video(task_id: str, range: str | None = Header(None)):
     result = await worker.get_task_status(task_id)
     if result is None:
         raise HTTPException(status_code=404, detail="Task does not exist.")
@@ -57,6 +229,32 @@ async def download_video(task_id: str):
     if output_path is None or not output_path.exists():
         raise HTTPException(status_code=404, detail="Output file does not exits")
 
-    return FileResponse(
-        path=output_path, filename=output_path.name, media_type="video/mp4"
+    await storage_manager.touch(task_id)
+    return ranged_file_response(
+        output_path, range, media_type="video/mp4", filename=output_path.name
+    )
+
+
+@router.get("/stream/{task_id}/{file_name}")
+async def stream_video(task_id: str, file_name: str, range: str | None = Header(None)):
+    """处理中即可访问的 HLS 播放列表与 fMP4 分片，只返回已经写出的文件"""
+    if not _STREAM_FILE_PATTERN.match(file_name):
+        raise HTTPException(status_code=404, detail="Stream file does not exist.")
+    stream_dir = await worker.get_stream_dir(task_id)
+    if stream_dir is None:
+        raise HTTPException(status_code=404, detail="Task has no stream output.")
+    file_path = stream_dir / file_name
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="Stream file does not exist.")
+
+    await storage_manager.touch(task_id)
+    headers = None
+    if file_path.suffix == ".m3u8":
+        # 播放列表在处理过程中持续追加
+        headers = {"Cache-Control": "no-cache"}
+    return ranged_file_response(
+        file_path,
+        range,
+        media_type=_STREAM_MEDIA_TYPES[file_path.suffix],
+        headers=headers,
     )
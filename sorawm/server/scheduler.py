@@ -0,0 +1,237 @@
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import func, select
+
+from sorawm.configs import (
+    SCHEDULER_AGING_RATE,
+    SCHEDULER_COST_EMA_ALPHA,
+    SCHEDULER_COST_PATH,
+    SCHEDULER_DEFAULT_SECONDS_PER_MEGAPIXEL,
+    SCHEDULER_ESTIMATE_TTL,
+    SCHEDULER_PRIORITY_STEP_SECONDS,
+)
+from sorawm.server.db import get_session
+from sorawm.server.models import Task
+from sorawm.server.schemas import Status
+from sorawm.utils.video_utils import VideoLoader
+
+# 领取任务时进度即置为该值，其后的进度才对应实际处理量
+PROCESSING_START_PERCENTAGE = 10
+
+
+@dataclass
+class VideoCost:
+    frames: int
+    pixels: int  # 单帧像素数
+
+    @property
+    def megapixel_frames(self) -> float:
+        return self.frames * self.pixels / 1e6
+
+
+def probe_video_cost(video_path: Path) -> VideoCost:
+    """只做 ffprobe，不解码"""
+    loader = VideoLoader(video_path)
+    return VideoCost(frames=loader.total_frames, pixels=loader.width * loader.height)
+
+
+class CostModel:
+    """
+    本机每百万像素帧的处理耗时，按完成任务的实测值做指数滑动平均，持久化到磁盘
+    """
+
+    def __init__(self, path: Path = SCHEDULER_COST_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.seconds_per_megapixel = SCHEDULER_DEFAULT_SECONDS_PER_MEGAPIXEL
+        self.samples = 0
+        self._load()
+
+    def estimate(self, cost: VideoCost) -> float:
+        return cost.megapixel_frames * self.seconds_per_megapixel
+
+    def observe(self, cost: VideoCost, elapsed_seconds: float):
+        if cost.megapixel_frames <= 0 or elapsed_seconds <= 0:
+            return
+        measured = elapsed_seconds / cost.megapixel_frames
+        with self._lock:
+            if self.samples == 0:
+                self.seconds_per_megapixel = measured
+            else:
+                self.seconds_per_megapixel += SCHEDULER_COST_EMA_ALPHA * (
+                    measured - self.seconds_per_megapixel
+                )
+            self.samples += 1
+            self._save()
+        logger.debug(
+            f"Cost model updated: {self.seconds_per_megapixel:.4f} s/MP-frame "
+            f"({self.samples} samples)"
+        )
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text())
+            self.seconds_per_megapixel = float(data["seconds_per_megapixel"])
+            self.samples = int(data["samples"])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to load scheduler cost model: {e}")
+
+    def _save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(
+                json.dumps(
+                    {
+                        "seconds_per_megapixel": self.seconds_per_megapixel,
+                        "samples": self.samples,
+                    }
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Failed to save scheduler cost model: {e}")
+
+
+def job_score(
+    estimated_seconds: float | None,
+    priority: int,
+    queued_at: datetime | None,
+    now: datetime,
+) -> float:
+    """
+    调度分数，越小越先执行：短作业优先，优先级每级相当于 SCHEDULER_PRIORITY_STEP_SECONDS 的耗时，
+    等待时间按 SCHEDULER_AGING_RATE 抵扣耗时，长作业不会一直饿死
+    """
+    waited = (now - queued_at).total_seconds() if queued_at else 0.0
+    return (
+        (estimated_seconds or 0.0)
+        - priority * SCHEDULER_PRIORITY_STEP_SECONDS
+        - waited * SCHEDULER_AGING_RATE
+    )
+
+
+def schedule_key_clause(queued_at: datetime):
+    """
+    job_score 中与当前时间无关的部分，入队时写入 tasks.schedule_key。
+
+    job_score = schedule_key - SCHEDULER_AGING_RATE * now，对所有排队任务减去的是同一个值，
+    因此按 schedule_key 排序与按 job_score 排序一致，claim 可以直接走索引取最小值
+    """
+    return (
+        func.coalesce(Task.estimated_seconds, 0.0)
+        - Task.priority * SCHEDULER_PRIORITY_STEP_SECONDS
+        + queued_at.timestamp() * SCHEDULER_AGING_RATE
+    )
+
+
+class ScheduleEstimator:
+    """
+    对当前队列做一次列表调度模拟，得到每个任务的预计开始 / 完成时间；
+    结果缓存 SCHEDULER_ESTIMATE_TTL 秒，轮询不会每次都扫表。
+
+    集群的流水线总数由未过期的 lease 推断：持有 lease 的进程数乘以每进程流水线数
+    （假设各进程 WORKER_POOL_SIZE 相同），且不少于正在持有 lease 的流水线数；
+    空闲进程不持有 lease，看不到，因此多进程且有进程空闲时预计时间偏保守
+    """
+
+    def __init__(self, cost_model: CostModel) -> None:
+        self.cost_model = cost_model
+        self._snapshot: dict[str, tuple[datetime, datetime]] = {}
+        self._snapshot_at = 0.0
+
+    async def estimate(
+        self, task_id: str, slots_per_process: int
+    ) -> tuple[datetime | None, datetime | None]:
+        if time.monotonic() - self._snapshot_at > SCHEDULER_ESTIMATE_TTL:
+            self._snapshot = await self._simulate(slots_per_process)
+            self._snapshot_at = time.monotonic()
+        return self._snapshot.get(task_id, (None, None))
+
+    async def _simulate(
+        self, slots_per_process: int
+    ) -> dict[str, tuple[datetime, datetime]]:
+        now = datetime.now()
+        async with get_session() as session:
+            rows = (
+                await session.execute(
+                    select(
+                        Task.id,
+                        Task.status,
+                        Task.percentage,
+                        Task.estimated_seconds,
+                        Task.priority,
+                        Task.queued_at,
+                        Task.started_at,
+                        Task.lease_owner,
+                        Task.lease_expires_at,
+                    ).where(Task.status.in_([Status.QUEUED, Status.PROCESSING]))
+                )
+            ).all()
+
+        estimates = {}
+        slot_free_at = []
+        for row in rows:
+            if row.status != Status.PROCESSING:
+                continue
+            remaining = self._remaining_seconds(row, now)
+            finish = now + timedelta(seconds=remaining)
+            estimates[row.id] = (row.started_at or now, finish)
+            slot_free_at.append(finish)
+
+        slots = self._cluster_slots(rows, slots_per_process, now)
+        slot_free_at += [now] * max(0, slots - len(slot_free_at))
+        slot_free_at.sort()
+
+        queued = sorted(
+            (row for row in rows if row.status == Status.QUEUED),
+            key=lambda row: job_score(
+                row.estimated_seconds, row.priority, row.queued_at, now
+            ),
+        )
+        for row in queued:
+            start = slot_free_at.pop(0)
+            finish = start + timedelta(seconds=row.estimated_seconds or 0.0)
+            estimates[row.id] = (start, finish)
+            slot_free_at.append(finish)
+            slot_free_at.sort()
+        return estimates
+
+    @staticmethod
+    def _cluster_slots(rows, slots_per_process: int, now: datetime) -> int:
+        """按未过期 lease 的持有者估算集群流水线数，至少包含本进程"""
+        owners = {
+            row.lease_owner
+            for row in rows
+            if row.lease_owner is not None
+            and row.lease_expires_at is not None
+            and row.lease_expires_at >= now
+        }
+        # lease 持有者格式为 "主机名:进程号:流水线序号"，见 task_queue.make_owner_id
+        processes = {owner.rsplit(":", 1)[0] for owner in owners}
+        processes.add(f"{socket.gethostname()}:{os.getpid()}")
+        return max(len(owners), len(processes) * slots_per_process)
+
+    @staticmethod
+    def _remaining_seconds(row, now: datetime) -> float:
+        estimated = row.estimated_seconds or 0.0
+        elapsed = (now - row.started_at).total_seconds() if row.started_at else 0.0
+        done = (row.percentage - PROCESSING_START_PERCENTAGE) / (
+            100 - PROCESSING_START_PERCENTAGE
+        )
+        if done > 0 and elapsed > 0:
+            # 有实际进度时按已用时间外推
+            return elapsed * (1 - done) / done
+        return max(estimated - elapsed, 0.0)
+
+
+cost_model = CostModel()
+schedule_estimator = ScheduleEstimator(cost_model)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import StrEnum
 
 from pydantic import BaseModel
@@ -5,12 +6,44 @@ from pydantic import BaseModel
 
 class Status(StrEnum):
     UPLOADING = "UPLOADING"
+    QUEUED = "QUEUED"
     PROCESSING = "PROCESSING"
     FINISHED = "FINISHED"
     ERROR = "ERROR"
+    CANCELLED = "CANCELLED"
+
+
+TERMINAL_STATUSES = {Status.FINISHED, Status.ERROR, Status.CANCELLED}
 
 
 class WMRemoveResults(BaseModel):
     percentage: int
     status: Status
     download_url: str | None = None
+    stream_url: str | None = None
+    estimated_start_at: datetime | None = None
+    estimated_finish_at: datetime | None = None
+
+
+class StorageStats(BaseModel):
+    tracked_files: int
+    tracked_bytes: int
+    bytes_by_kind: dict[str, int]
+    quota_bytes: int
+    disk_total_bytes: int
+    disk_free_bytes: int
+    evicted_files: int
+    swept_orphans: int
+
+
+class WorkerStats(BaseModel):
+    pool_size: int
+    busy: int
+    queued: int
+    processed: int
+    failed: int
+    cancelled: int
+    cache_hits: int
+    admission_waits: int
+    threads_per_pipeline: int
+    available_memory_mb: int
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy import and_, bindparam, update
+
+from sorawm.configs import (
+    PROGRESS_FLUSH_INTERVAL,
+    STATUS_CACHE_MAX_ENTRIES,
+    STATUS_CACHE_TTL,
+)
+from sorawm.server.db import get_session
+from sorawm.server.models import Task
+from sorawm.server.schemas import TERMINAL_STATUSES, Status, WMRemoveResults
+
+
+@dataclass
+class CachedStatus:
+    result: WMRemoveResults
+    owned: bool  # 本进程正在处理的任务，缓存即为权威数据
+    fetched_at: float
+    dirty: bool = False
+
+
+class StatusCache:
+    """
+    任务状态的进程内缓存。
+
+    进度只写入内存，由 flush_loop 按 PROGRESS_FLUSH_INTERVAL 合并批量写库；
+    状态迁移由 worker 直接写库后同步到缓存。get_results 优先读缓存：
+    本进程处理中的任务和终态任务直接命中，其他进程的任务最多缓存 STATUS_CACHE_TTL 秒。
+    """
+
+    def __init__(self, max_entries: int = STATUS_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedStatus] = OrderedDict()
+
+    def get(self, task_id: str) -> WMRemoveResults | None:
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return None
+        fresh = (
+            entry.owned
+            or entry.result.status in TERMINAL_STATUSES
+            or time.monotonic() - entry.fetched_at < STATUS_CACHE_TTL
+        )
+        if not fresh:
+            return None
+        self._entries.move_to_end(task_id)
+        return entry.result
+
+    def record(self, task_id: str, result: WMRemoveResults, owned: bool = False):
+        """状态迁移（已写库）或从库中读取的结果写入缓存"""
+        # 迁移已经带上了最新进度，之前未刷盘的进度不再需要写
+        self._entries[task_id] = CachedStatus(
+            result=result,
+            owned=owned and result.status not in TERMINAL_STATUSES,
+            fetched_at=time.monotonic(),
+        )
+        self._entries.move_to_end(task_id)
+        self._evict()
+
+    def invalidate(self, task_id: str):
+        self._entries.pop(task_id, None)
+
+    def set_progress(self, task_id: str, percentage: int):
+        """只更新内存中的进度，等待下一次合并刷盘"""
+        entry = self._entries.get(task_id)
+        if entry is None or entry.result.status in TERMINAL_STATUSES:
+            return
+        if entry.result.percentage == percentage:
+            return
+        entry.result = entry.result.model_copy(update={"percentage": percentage})
+        entry.dirty = True
+
+    async def flush(self):
+        dirty = {
+            task_id: entry.result.percentage
+            for task_id, entry in self._entries.items()
+            if entry.dirty
+        }
+        if not dirty:
+            return
+        for task_id in dirty:
+            self._entries[task_id].dirty = False
+        # 只更新仍在处理中的任务，避免覆盖刷盘期间写入的终态
+        statement = (
+            update(Task)
+            .where(
+                and_(
+                    Task.id == bindparam("task_id"),
+                    Task.status == Status.PROCESSING,
+                )
+            )
+            .values(percentage=bindparam("task_percentage"))
+        )
+        async with get_session() as session:
+            connection = await session.connection()
+            await connection.execute(
+                statement,
+                [
+                    {"task_id": task_id, "task_percentage": percentage}
+                    for task_id, percentage in dirty.items()
+                ],
+            )
+        logger.debug(f"Flushed progress of {len(dirty)} task(s)")
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing task progress: {e}")
+
+    def _evict(self):
+        overflow = len(self._entries) - self.max_entries
+        if overflow <= 0:
+            return
+        # 按最近最少使用淘汰，处理中或未刷盘的任务保留
+        evictable = [
+            task_id
+            for task_id, entry in self._entries.items()
+            if not (entry.owned or entry.dirty)
+        ]
+        for task_id in evictable[:overflow]:
+            del self._entries[task_id]
+
+
+status_cache = StatusCache()
@@ -0,0 +1,228 @@
+import asyncio
+import shutil
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import and_, delete, func, select, update
+
+from sorawm.configs import (
+    RESULT_CACHE_DIR,
+    STORAGE_ORPHAN_GRACE_SECONDS,
+    STORAGE_QUOTA_BYTES,
+    STORAGE_SWEEP_INTERVAL,
+    STORAGE_TOUCH_INTERVAL,
+    STORAGE_TTL_SECONDS,
+    WORKING_DIR,
+)
+from sorawm.server.db import get_session
+from sorawm.server.models import Task, TaskFile
+from sorawm.server.schemas import TERMINAL_STATUSES, StorageStats
+from sorawm.server.status_cache import status_cache
+
+# 文件被淘汰时需要清空的任务字段
+_KIND_TASK_FIELDS = {
+    "output": {"output_path": None, "download_url": None},
+    "stream": {"stream_dir": None},
+}
+
+
+def path_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+
+def remove_path(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+class StorageManager:
+    """
+    工作目录下任务文件的登记与回收。
+
+    上传、输出与 HLS 分片目录按任务登记到 task_files 表；终态任务的文件
+    超过 STORAGE_TTL_SECONDS 未访问即删除，总量超过 STORAGE_QUOTA_BYTES 时按最近访问时间淘汰。
+    未登记且长时间未修改的文件（崩溃残留的 temp_ 文件等）在启动时清理。
+    """
+
+    def __init__(self, root: Path = WORKING_DIR) -> None:
+        self.root = root
+        self.evicted_files = 0
+        self.swept_orphans = 0
+        self._last_touch: dict[str, float] = {}
+
+    async def track(self, task_id: str, path: Path, kind: str):
+        size = await asyncio.to_thread(path_size, path)
+        now = datetime.now()
+        async with get_session() as session:
+            result = await session.execute(
+                select(TaskFile).where(TaskFile.path == str(path))
+            )
+            task_file = result.scalar_one_or_none()
+            if task_file is None:
+                task_file = TaskFile(task_id=task_id, path=str(path), created_at=now)
+                session.add(task_file)
+            task_file.kind = kind
+            task_file.size_bytes = size
+            task_file.last_accessed_at = now
+
+    async def touch(self, task_id: str):
+        """记录下载访问，按 STORAGE_TOUCH_INTERVAL 节流"""
+        now = time.monotonic()
+        if now - self._last_touch.get(task_id, 0.0) < STORAGE_TOUCH_INTERVAL:
+            return
+        self._last_touch[task_id] = now
+        async with get_session() as session:
+            await session.execute(
+                update(TaskFile)
+                .where(TaskFile.task_id == task_id)
+                .values(last_accessed_at=datetime.now())
+            )
+
+    async def evict(self):
+        """先按 TTL，再按配额淘汰终态任务的文件"""
+        deadline = datetime.now() - timedelta(seconds=STORAGE_TTL_SECONDS)
+        evictable = and_(
+            TaskFile.task_id == Task.id, Task.status.in_(list(TERMINAL_STATUSES))
+        )
+        async with get_session() as session:
+            expired = (
+                await session.execute(
+                    select(TaskFile).where(
+                        and_(evictable, TaskFile.last_accessed_at < deadline)
+                    )
+                )
+            ).scalars().all()
+
+            total = (
+                await session.execute(
+                    select(func.coalesce(func.sum(TaskFile.size_bytes), 0))
+                )
+            ).scalar_one()
+            total -= sum(task_file.size_bytes for task_file in expired)
+
+            over_quota = []
+            if total > STORAGE_QUOTA_BYTES:
+                expired_ids = {task_file.id for task_file in expired}
+                candidates = (
+                    await session.execute(
+                        select(TaskFile)
+                        .where(evictable)
+                        .order_by(TaskFile.last_accessed_at)
+                    )
+                ).scalars()
+                for task_file in candidates:
+                    if total <= STORAGE_QUOTA_BYTES:
+                        break
+                    if task_file.id in expired_ids:
+                        continue
+                    over_quota.append(task_file)
+                    total -= task_file.size_bytes
+
+            victims = [*expired, *over_quota]
+            if not victims:
+                return
+            for task_file in victims:
+                await asyncio.to_thread(remove_path, Path(task_file.path))
+                fields = _KIND_TASK_FIELDS.get(task_file.kind)
+                if fields:
+                    await session.execute(
+                        update(Task).where(Task.id == task_file.task_id).values(**fields)
+                    )
+                status_cache.invalidate(task_file.task_id)
+            await session.execute(
+                delete(TaskFile).where(TaskFile.id.in_([f.id for f in victims]))
+            )
+
+        self.evicted_files += len(victims)
+        logger.info(
+            f"Evicted {len(expired)} expired and {len(over_quota)} over-quota task file(s)"
+        )
+
+    async def sweep_orphans(self):
+        """
+        清理未登记、且超过宽限期未修改的文件（不含结果缓存目录）；
+        任务表引用但尚未登记的文件补登记，纳入 TTL / 配额管理
+        """
+        async with get_session() as session:
+            tracked = set((await session.execute(select(TaskFile.path))).scalars())
+            referenced = (
+                await session.execute(
+                    select(Task.id, Task.video_path, Task.output_path, Task.stream_dir)
+                )
+            ).all()
+        for task_id, *paths in referenced:
+            for kind, path in zip(("upload", "output", "stream"), paths):
+                if path and path not in tracked:
+                    tracked.add(path)
+                    if Path(path).exists():
+                        await self.track(task_id, Path(path), kind)
+
+        orphans = await asyncio.to_thread(self._find_orphans, tracked)
+        for path in orphans:
+            await asyncio.to_thread(remove_path, path)
+        self.swept_orphans += len(orphans)
+        if orphans:
+            logger.info(f"Swept {len(orphans)} orphaned file(s) from {self.root}")
+
+    def _find_orphans(self, tracked: set[str]) -> list[Path]:
+        grace_deadline = time.time() - STORAGE_ORPHAN_GRACE_SECONDS
+        skip_dirs = {RESULT_CACHE_DIR.resolve()}
+        orphans = []
+        candidates = [p for p in self.root.iterdir() if p.resolve() not in skip_dirs]
+        # uploads / progressive 等子目录下按单个条目检查
+        expanded = []
+        for path in candidates:
+            if path.is_dir() and str(path) not in tracked:
+                expanded.extend(path.iterdir())
+            else:
+                expanded.append(path)
+        for path in expanded:
+            if str(path) in tracked:
+                continue
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime < grace_deadline:
+                orphans.append(path)
+        return orphans
+
+    async def get_stats(self) -> StorageStats:
+        async with get_session() as session:
+            rows = (
+                await session.execute(
+                    select(
+                        TaskFile.kind,
+                        func.count(),
+                        func.coalesce(func.sum(TaskFile.size_bytes), 0),
+                    ).group_by(TaskFile.kind)
+                )
+            ).all()
+        disk = shutil.disk_usage(self.root)
+        return StorageStats(
+            tracked_files=sum(count for _, count, _ in rows),
+            tracked_bytes=sum(size for _, _, size in rows),
+            bytes_by_kind={kind: size for kind, _, size in rows},
+            quota_bytes=STORAGE_QUOTA_BYTES,
+            disk_total_bytes=disk.total,
+            disk_free_bytes=disk.free,
+            evicted_files=self.evicted_files,
+            swept_orphans=self.swept_orphans,
+        )
+
+    async def run(self):
+        while True:
+            try:
+                await self.evict()
+            except Exception as e:
+                logger.error(f"Error evicting task files: {e}")
+            await asyncio.sleep(STORAGE_SWEEP_INTERVAL)
+
+
+storage_manager = StorageManager()
@@ -0,0 +1,189 @@
+import socket
+import os
+from datetime import datetime, timedelta
+
+from loguru import logger
+from sqlalchemy import and_, func, or_, select, update
+
+from sorawm.configs import TASK_LEASE_SECONDS, TASK_MAX_ATTEMPTS
+from sorawm.server.db import get_session
+from sorawm.server.models import Task
+from sorawm.server.scheduler import schedule_key_clause
+from sorawm.server.schemas import Status
+
+
+def make_owner_id(slot: int) -> str:
+    """lease 持有者标识：主机名 + 进程号 + 流水线序号"""
+    return f"{socket.gethostname()}:{os.getpid()}:{slot}"
+
+
+class TaskQueue:
+    """
+    基于 tasks 表的持久化任务队列，多进程共享。
+
+    claim 通过带状态条件的 UPDATE 抢占任务，只有一个进程能更新成功；
+    处理中的任务持有 lease 并定期心跳续期，lease 过期（进程崩溃或重启）
+    的任务会被重新放回队列。
+    """
+
+    async def enqueue(self, task_id: str) -> bool:
+        """UPLOADING -> QUEUED，上传期间已被取消时返回 False"""
+        now = datetime.now()
+        async with get_session() as session:
+            result = await session.execute(
+                update(Task)
+                .where(and_(Task.id == task_id, Task.status == Status.UPLOADING))
+                .values(
+                    status=Status.QUEUED,
+                    percentage=0,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    queued_at=now,
+                    schedule_key=schedule_key_clause(now),
+                )
+            )
+        return result.rowcount == 1
+
+    async def claim(self, owner: str) -> tuple[str, str] | None:
+        """
+        抢占调度分数最小的任务（短作业优先 + 优先级 + 等待老化，见 job_score）。
+        排序键在入队时算好，这里只走 (status, schedule_key) 索引取一行
+
+        Returns:
+            (task_id, video_path)，队列为空或被其他进程抢先时返回 None
+        """
+        async with get_session() as session:
+            row = (
+                await session.execute(
+                    select(Task.id, Task.video_path)
+                    .where(Task.status == Status.QUEUED)
+                    .order_by(Task.schedule_key)
+                    .limit(1)
+                )
+            ).first()
+            if row is None:
+                return None
+
+            now = datetime.now()
+            result = await session.execute(
+                update(Task)
+                .where(and_(Task.id == row.id, Task.status == Status.QUEUED))
+                .values(
+                    status=Status.PROCESSING,
+                    lease_owner=owner,
+                    lease_expires_at=now + timedelta(seconds=TASK_LEASE_SECONDS),
+                    heartbeat_at=now,
+                    started_at=now,
+                    attempts=Task.attempts + 1,
+                )
+            )
+            if result.rowcount != 1:
+                return None
+        return row.id, row.video_path
+
+    async def heartbeat(self, task_id: str, owner: str) -> bool:
+        """续期 lease，返回 False 表示 lease 已被回收"""
+        now = datetime.now()
+        async with get_session() as session:
+            result = await session.execute(
+                update(Task)
+                .where(and_(Task.id == task_id, Task.lease_owner == owner))
+                .values(
+                    heartbeat_at=now,
+                    lease_expires_at=now + timedelta(seconds=TASK_LEASE_SECONDS),
+                )
+            )
+        return result.rowcount == 1
+
+    async def release(self, task_id: str, owner: str):
+        """释放 lease；lease 已被回收并由其他进程领取时不做任何修改"""
+        async with get_session() as session:
+            await session.execute(
+                update(Task)
+                .where(and_(Task.id == task_id, Task.lease_owner == owner))
+                .values(lease_owner=None, lease_expires_at=None)
+            )
+
+    async def request_cancel(self, task_id: str) -> Status | None:
+        """
+        取消任务：上传中 / 排队中的任务立即变为 CANCELLED，处理中的任务只打标记，
+        由持有 lease 的进程结束
+
+        Returns:
+            取消后的状态，任务不存在时返回 None
+        """
+        async with get_session() as session:
+            result = await session.execute(
+                update(Task)
+                .where(
+                    and_(
+                        Task.id == task_id,
+                        Task.status.in_([Status.UPLOADING, Status.QUEUED]),
+                    )
+                )
+                .values(status=Status.CANCELLED, cancel_requested=True)
+            )
+            if result.rowcount == 1:
+                return Status.CANCELLED
+            await session.execute(
+                update(Task)
+                .where(and_(Task.id == task_id, Task.status == Status.PROCESSING))
+                .values(cancel_requested=True)
+            )
+            status = await session.execute(select(Task.status).where(Task.id == task_id))
+            status = status.scalar_one_or_none()
+        return None if status is None else Status(status)
+
+    async def is_cancel_requested(self, task_id: str) -> bool:
+        async with get_session() as session:
+            result = await session.execute(
+                select(Task.cancel_requested).where(Task.id == task_id)
+            )
+            return bool(result.scalar_one_or_none())
+
+    async def requeue_expired(self) -> int:
+        """把 lease 过期的任务放回队列，超过最大重试次数的标记为 ERROR，已请求取消的标记为 CANCELLED"""
+        now = datetime.now()
+        expired = and_(
+            Task.status == Status.PROCESSING,
+            or_(Task.lease_expires_at.is_(None), Task.lease_expires_at < now),
+        )
+        async with get_session() as session:
+            await session.execute(
+                update(Task)
+                .where(and_(expired, Task.cancel_requested.is_(True)))
+                .values(
+                    status=Status.CANCELLED, lease_owner=None, lease_expires_at=None
+                )
+            )
+            failed = await session.execute(
+                update(Task)
+                .where(and_(expired, Task.attempts >= TASK_MAX_ATTEMPTS))
+                .values(status=Status.ERROR, lease_owner=None, lease_expires_at=None)
+            )
+            requeued = await session.execute(
+                update(Task)
+                .where(and_(expired, Task.attempts < TASK_MAX_ATTEMPTS))
+                .values(
+                    status=Status.QUEUED,
+                    percentage=0,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    # 保留原排序键，重新入队的任务不丢失已累积的等待时间
+                    schedule_key=func.coalesce(
+                        Task.schedule_key, schedule_key_clause(now)
+                    ),
+                )
+            )
+        if failed.rowcount:
+            logger.warning(f"{failed.rowcount} expired task(s) exceeded max attempts")
+        if requeued.rowcount:
+            logger.info(f"Requeued {requeued.rowcount} task(s) with expired lease")
+        return requeued.rowcount
+
+    async def queued_count(self) -> int:
+        async with get_session() as session:
+            result = await session.execute(
+                select(func.count()).select_from(Task).where(Task.status == Status.QUEUED)
+            )
+            return result.scalar_one()
@@ -0,0 +1,170 @@
+import hashlib
+from pathlib import Path
+from typing import Callable
+
+import aiofiles
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from sorawm.configs import MAX_UPLOAD_FORM_FIELD_SIZE, MAX_UPLOAD_SIZE
+from sorawm.server.metrics import upload_bytes
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Request body too large, limit is {MAX_UPLOAD_SIZE} bytes.",
+    )
+
+
+def check_content_length(request: Request):
+    """读取请求体之前按 Content-Length 拒绝超限请求"""
+    content_length = request.headers.get("content-length")
+    if content_length is None:
+        return
+    try:
+        length = int(content_length)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length.")
+    if length > MAX_UPLOAD_SIZE:
+        raise _too_large()
+
+
+class UploadForm:
+    """流式解析后的表单：文件字段已写入 path，其余字段为字符串"""
+
+    def __init__(self) -> None:
+        self.path: Path | None = None
+        self.filename: str | None = None
+        self.content_hash: str | None = None
+        self.fields: dict[str, str] = {}
+
+
+async def receive_upload_form(
+    request: Request,
+    file_field: str,
+    make_path: Callable[[str], Path],
+) -> UploadForm:
+    """
+    按块解析 multipart/form-data 请求体。
+
+    文件字段边接收边写入 make_path(filename) 并计算 sha256，不经过 Starlette 的临时文件；
+    请求体累计超过 MAX_UPLOAD_SIZE 时立即中断并返回 413，已写入的部分被删除。
+    文本字段超过 MAX_UPLOAD_FORM_FIELD_SIZE 时返回 413，其他文件字段直接拒绝，
+    内存占用与块大小同阶。
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data.")
+
+    # 解析器回调是同步的，先收集事件，每块解析完后再异步写盘
+    events: list[tuple[str, bytes | dict[bytes, bytes]]] = []
+    headers: dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        events.append(("begin", dict(headers)))
+        headers.clear()
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", b""))
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    form = UploadForm()
+    sha256 = hashlib.sha256()
+    field_name: str | None = None
+    field_value = bytearray()
+    file = None
+    writing_file = False
+    total_size = 0
+    try:
+        async for chunk in request.stream():
+            total_size += len(chunk)
+            if total_size > MAX_UPLOAD_SIZE:
+                raise _too_large()
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+            for kind, payload in events:
+                if kind == "begin":
+                    _, disposition = parse_options_header(
+                        payload.get(b"content-disposition", b"")
+                    )
+                    field_name = disposition.get(b"name", b"").decode("latin-1")
+                    filename = disposition.get(b"filename")
+                    if filename is not None:
+                        if field_name != file_field or file is not None:
+                            raise HTTPException(
+                                status_code=400,
+                                detail=f"Unexpected file field '{field_name}', "
+                                f"only a single '{file_field}' is accepted.",
+                            )
+                        form.filename = Path(filename.decode("utf-8", "replace")).name
+                        form.path = make_path(form.filename)
+                        file = await aiofiles.open(form.path, "wb")
+                        writing_file = True
+                elif kind == "data":
+                    if writing_file:
+                        sha256.update(payload)
+                        await file.write(payload)
+                        upload_bytes.inc(len(payload))
+                    else:
+                        if len(field_value) + len(payload) > MAX_UPLOAD_FORM_FIELD_SIZE:
+                            raise HTTPException(
+                                status_code=413,
+                                detail=f"Form field '{field_name}' too large, "
+                                f"limit is {MAX_UPLOAD_FORM_FIELD_SIZE} bytes.",
+                            )
+                        field_value.extend(payload)
+                elif writing_file:
+                    await file.close()
+                    writing_file = False
+                else:
+                    form.fields[field_name] = field_value.decode("utf-8", "replace")
+                    field_value.clear()
+            events.clear()
+        try:
+            parser.finalize()
+        except MultipartParseError as e:
+            raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+        if file is None:
+            raise HTTPException(status_code=422, detail=f"Missing file field '{file_field}'.")
+        if writing_file:
+            raise HTTPException(status_code=400, detail="Incomplete multipart body.")
+    except BaseException:
+        if file is not None:
+            await file.close()
+        if form.path is not None:
+            form.path.unlink(missing_ok=True)
+        raise
+    form.content_hash = sha256.hexdigest()
+    return form
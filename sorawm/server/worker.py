@@ -1,33 +1,95 @@
 import asyncio
-from asyncio import Queue
+import os
+import time
 from datetime import datetime
 from pathlib import Path
 from uuid import uuid4
 
+import cv2
+import httpx
+import psutil
+import torch
 from loguru import logger
 from sqlalchemy import select
 
-from sorawm.configs import WORKING_DIR
+from sorawm.configs import (
+    CANCEL_POLL_INTERVAL,
+    ENABLE_PROGRESSIVE_OUTPUT,
+    ENABLE_RESULT_CACHE,
+    PROGRESSIVE_OUTPUT_DIR,
+    QUEUE_POLL_INTERVAL,
+    WORKER_ERROR_BACKOFF,
+    WEBHOOK_TIMEOUT,
+    TASK_HEARTBEAT_INTERVAL,
+    TASK_LEASE_SECONDS,
+    WORKER_ADMISSION_POLL_INTERVAL,
+    WORKER_MIN_FREE_MEMORY_MB,
+    WORKER_POOL_SIZE,
+    WORKER_THREADS_PER_PIPELINE,
+    WORKING_DIR,
+)
 from sorawm.core import SoraWM
 from sorawm.server.db import get_session
+from sorawm.server.events import ProgressEvent, progress_broker
+from sorawm.server.metrics import (
+    active_pipelines,
+    pipeline_pool_size,
+    queue_depth,
+    task_duration_seconds,
+)
+from sorawm.server.result_cache import result_cache
+from sorawm.server.scheduler import (
+    VideoCost,
+    cost_model,
+    probe_video_cost,
+    schedule_estimator,
+)
 from sorawm.server.models import Task
-from sorawm.server.schemas import Status, WMRemoveResults
+from sorawm.server.schemas import Status, WMRemoveResults, WorkerStats
+from sorawm.server.status_cache import status_cache
+from sorawm.server.storage import storage_manager
+from sorawm.server.task_queue import TaskQueue, make_owner_id
+from sorawm.utils.cancellation import CancellationToken, TaskCancelledError
+from sorawm.utils.fingerprint_utils import result_cache_key
 
 
 class WMRemoveTaskWorker:
     def __init__(self) -> None:
-        self.queue = Queue()
-        self.sora_wm = None
+        self.queue = TaskQueue()
+        # 本进程入队时立即唤醒空闲流水线，跨进程依赖轮询
+        self._wakeup = asyncio.Event()
+        self.pool_size = max(1, WORKER_POOL_SIZE)
+        self.pipelines: list[SoraWM] = []
         self.output_dir = WORKING_DIR
         self.upload_dir = WORKING_DIR / "uploads"
         self.upload_dir.mkdir(exist_ok=True, parents=True)
 
+        self.threads_per_pipeline = WORKER_THREADS_PER_PIPELINE or max(
+            1, (os.cpu_count() or 1) // self.pool_size
+        )
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self._cancel_tokens: dict[str, CancellationToken] = {}
+        # lease 已被回收的任务，可能已由其他 worker 重新领取，本进程不得再写结果与状态
+        self._lost_leases: set[str] = set()
+        self.admission_waits = 0
+        self.cache_hits = 0
+        self._webhook_tasks: set[asyncio.Task] = set()
+
     async def initialize(self):
-        logger.info("Initializing SoraWM models...")
-        self.sora_wm = SoraWM()
-        logger.info("SoraWM models initialized")
+        logger.info(f"Initializing {self.pool_size} SoraWM pipeline(s)...")
+        # torch / OpenCV 的线程池是进程级的，按流水线数均分 CPU
+        torch.set_num_threads(self.threads_per_pipeline)
+        cv2.setNumThreads(self.threads_per_pipeline)
+        # 每条流水线独立的检测器与追踪状态
+        self.pipelines = [SoraWM() for _ in range(self.pool_size)]
+        logger.info(
+            f"SoraWM models initialized, {self.threads_per_pipeline} threads per pipeline"
+        )
 
-    async def create_task(self) -> str:
+    async def create_task(self, webhook_url: str | None = None) -> str:
         task_uuid = str(uuid4())
         async with get_session() as session:
             task = Task(
@@ -35,111 +97,484 @@ class WMRemoveTaskWorker:
                 video_path="",  # 暂时为空，后续会更新
                 status=Status.UPLOADING,
                 percentage=0,
+                webhook_url=webhook_url,
             )
             session.add(task)
+        self._record_status(task_uuid, Status.UPLOADING, 0)
         logger.info(f"Task {task_uuid} created with UPLOADING status")
         return task_uuid
 
-    async def queue_task(self, task_id: str, video_path: Path):
+    async def queue_task(
+        self,
+        task_id: str,
+        video_path: Path,
+        content_hash: str | None = None,
+        priority: int = 0,
+        webhook_url: str | None = None,
+    ):
+        try:
+            cost = await asyncio.to_thread(probe_video_cost, video_path)
+        except Exception as e:
+            logger.warning(f"Failed to probe {video_path} for scheduling: {e}")
+            cost = None
+
         async with get_session() as session:
             result = await session.execute(select(Task).where(Task.id == task_id))
             task = result.scalar_one()
+            if task.status == Status.CANCELLED:
+                video_path.unlink(missing_ok=True)
+                logger.info(f"Task {task_id} cancelled during upload")
+                return
             task.video_path = str(video_path)
-            task.status = Status.PROCESSING
-            task.percentage = 0
+            task.content_hash = content_hash
+            task.priority = priority
+            if webhook_url is not None:
+                # 表单字段与视频同在请求体中，上传完成后才能得知
+                task.webhook_url = webhook_url
+            if cost is not None:
+                task.video_frames = cost.frames
+                task.video_pixels = cost.pixels
+                task.estimated_seconds = cost_model.estimate(cost)
+            webhook_url = task.webhook_url
+
+        if ENABLE_RESULT_CACHE and content_hash:
+            output_path = self._output_path(task_id, video_path)
+            cache_key = await asyncio.to_thread(result_cache_key, content_hash)
+            if await result_cache.materialize(cache_key, output_path):
+                self.cache_hits += 1
+                video_path.unlink(missing_ok=True)
+                await self._mark_finished(task_id, output_path, webhook_url)
+                logger.info(f"Task {task_id} served from result cache: {output_path}")
+                return
 
-        self.queue.put_nowait((task_id, video_path))
+        if not await self.queue.enqueue(task_id):
+            video_path.unlink(missing_ok=True)
+            logger.info(f"Task {task_id} cancelled during upload")
+            return
+        await storage_manager.track(task_id, video_path, "upload")
+        self._record_status(task_id, Status.QUEUED, 0)
+        self._wakeup.set()
         logger.info(f"Task {task_id} queued for processing: {video_path}")
 
     async def mark_task_error(self, task_id: str, error_msg: str):
         async with get_session() as session:
             result = await session.execute(select(Task).where(Task.id == task_id))
             task = result.scalar_one_or_none()
+            webhook_url = None
             if task:
                 task.status = Status.ERROR
                 task.percentage = 0
+                webhook_url = task.webhook_url
+        self._notify_webhook(webhook_url, self._record_status(task_id, Status.ERROR, 0))
         logger.error(f"Task {task_id} marked as ERROR: {error_msg}")
 
+    async def cancel_task(self, task_id: str) -> Status | None:
+        """
+        取消任务：排队中的立即取消并删除上传文件；处理中的由本进程直接触发令牌，
+        其他进程在 CANCEL_POLL_INTERVAL 内感知
+
+        Returns:
+            取消后的任务状态，任务不存在时返回 None
+        """
+        status = await self.queue.request_cancel(task_id)
+        if status == Status.CANCELLED:
+            async with get_session() as session:
+                result = await session.execute(
+                    select(Task.video_path).where(Task.id == task_id)
+                )
+                video_path = result.scalar_one_or_none()
+            if video_path:
+                Path(video_path).unlink(missing_ok=True)
+            self._record_status(task_id, Status.CANCELLED, 0)
+            logger.info(f"Task {task_id} cancelled before processing")
+        elif status == Status.PROCESSING and task_id in self._cancel_tokens:
+            # cancel() 会结束并等待 ffmpeg 子进程，不能阻塞事件循环
+            await asyncio.to_thread(self._cancel_tokens[task_id].cancel)
+            logger.info(f"Task {task_id} cancellation requested")
+        return status
+
     async def run(self):
-        logger.info("Worker started, waiting for tasks...")
+        logger.info(f"Worker started with {self.pool_size} pipeline(s), waiting for tasks...")
+        await asyncio.gather(
+            self._reap_expired_leases(),
+            *(
+                self._pipeline_loop(pipeline, make_owner_id(slot))
+                for slot, pipeline in enumerate(self.pipelines)
+            ),
+        )
+
+    def start(self) -> asyncio.Task:
+        """在后台运行 run()，意外退出时记录异常并重启"""
+        task = asyncio.create_task(self.run())
+        task.add_done_callback(self._on_run_done)
+        return task
+
+    def _on_run_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is None:
+            return
+        logger.opt(exception=exc).error(
+            f"Worker loop crashed, restarting in {WORKER_ERROR_BACKOFF}s"
+        )
+        asyncio.get_running_loop().call_later(WORKER_ERROR_BACKOFF, self.start)
+
+    async def _pipeline_loop(self, sora_wm: SoraWM, owner: str):
         while True:
-            task_uuid, video_path = await self.queue.get()
-            logger.info(f"Processing task {task_uuid}: {video_path}")
+            # 单次迭代的异常（如 sqlite 锁超时）不能让该流水线永久退出
+            try:
+                await self._pipeline_iteration(sora_wm, owner)
+            except Exception:
+                logger.exception(f"Pipeline {owner} iteration failed")
+                await asyncio.sleep(WORKER_ERROR_BACKOFF)
 
+    async def _pipeline_iteration(self, sora_wm: SoraWM, owner: str):
+        await self._wait_for_admission()
+        claimed = await self.queue.claim(owner)
+        if claimed is None:
+            self._wakeup.clear()
             try:
-                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                file_suffix = video_path.suffix
-                output_filename = f"{task_uuid}_{timestamp}{file_suffix}"
-                output_path = self.output_dir / output_filename
-
-                async with get_session() as session:
-                    result = await session.execute(
-                        select(Task).where(Task.id == task_uuid)
-                    )
-                    task = result.scalar_one()
-                    task.status = Status.PROCESSING
-                    task.percentage = 10
-
-                loop = asyncio.get_event_loop()
-
-                def progress_callback(percentage: int):
-                    asyncio.run_coroutine_threadsafe(
-                        self._update_progress(task_uuid, percentage), loop
-                    )
-
-                await asyncio.to_thread(
-                    self.sora_wm.run, video_path, output_path, progress_callback
-                )
+                await asyncio.wait_for(self._wakeup.wait(), timeout=QUEUE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            return
 
-                async with get_session() as session:
-                    result = await session.execute(
-                        select(Task).where(Task.id == task_uuid)
-                    )
-                    task = result.scalar_one()
-                    task.status = Status.FINISHED
-                    task.percentage = 100
-                    task.output_path = str(output_path)
-                    task.download_url = f"/download/{task_uuid}"
-
-                logger.info(
-                    f"Task {task_uuid} completed successfully, output: {output_path}"
-                )
+        task_uuid, video_path = claimed
+        self.busy += 1
+        cancel_token = CancellationToken()
+        self._cancel_tokens[task_uuid] = cancel_token
+        heartbeat = asyncio.create_task(self._heartbeat(task_uuid, owner, cancel_token))
+        try:
+            await self._process_task(sora_wm, task_uuid, Path(video_path), cancel_token)
+        finally:
+            heartbeat.cancel()
+            del self._cancel_tokens[task_uuid]
+            self._lost_leases.discard(task_uuid)
+            self.busy -= 1
+            try:
+                await self.queue.release(task_uuid, owner)
+            except Exception:
+                # lease 未释放时由 requeue_expired 在过期后回收
+                logger.exception(f"Failed to release lease of task {task_uuid}")
 
+    async def _heartbeat(
+        self, task_id: str, owner: str, cancel_token: CancellationToken
+    ):
+        """续期 lease，并轮询其他进程发来的取消请求"""
+        last_renewal = time.monotonic()
+        while True:
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+            try:
+                if not cancel_token.cancelled and await self.queue.is_cancel_requested(
+                    task_id
+                ):
+                    logger.info(f"Task {task_id} cancellation requested")
+                    await asyncio.to_thread(cancel_token.cancel)
+                if time.monotonic() - last_renewal < TASK_HEARTBEAT_INTERVAL:
+                    continue
+                last_renewal = time.monotonic()
+                if not await self.queue.heartbeat(task_id, owner):
+                    logger.warning(f"Lease of task {task_id} lost by {owner}, abandoning it")
+                    self._lost_leases.add(task_id)
+                    await asyncio.to_thread(cancel_token.cancel)
+                    return
             except Exception as e:
-                logger.error(f"Error processing task {task_uuid}: {e}")
-                async with get_session() as session:
-                    result = await session.execute(
-                        select(Task).where(Task.id == task_uuid)
-                    )
-                    task = result.scalar_one()
-                    task.status = Status.ERROR
-                    task.percentage = 0
-
-            finally:
-                self.queue.task_done()
-
-    async def _update_progress(self, task_id: str, percentage: int):
+                logger.error(f"Error renewing lease for task {task_id}: {e}")
+
+    async def _reap_expired_leases(self):
+        while True:
+            try:
+                await self.queue.requeue_expired()
+            except Exception as e:
+                logger.error(f"Error requeueing expired tasks: {e}")
+            await asyncio.sleep(TASK_LEASE_SECONDS / 2)
+
+    async def _wait_for_admission(self):
+        """可用内存不足时等待；没有其他任务在跑时直接放行，避免饿死"""
+        while self.busy > 0 and self._available_memory_mb() < WORKER_MIN_FREE_MEMORY_MB:
+            self.admission_waits += 1
+            logger.debug(
+                f"Available memory {self._available_memory_mb()} MB below "
+                f"{WORKER_MIN_FREE_MEMORY_MB} MB, delay task admission"
+            )
+            await asyncio.sleep(WORKER_ADMISSION_POLL_INTERVAL)
+
+    @staticmethod
+    def _available_memory_mb() -> int:
+        return psutil.virtual_memory().available // (1024 * 1024)
+
+    async def _process_task(
+        self,
+        sora_wm: SoraWM,
+        task_uuid: str,
+        video_path: Path,
+        cancel_token: CancellationToken,
+    ):
+        logger.info(f"Processing task {task_uuid}: {video_path}")
+        webhook_url = None
+        content_hash = None
+        cost = None
+        task_started = time.monotonic()
+
         try:
+            output_path = self._output_path(task_uuid, video_path)
+            progressive_dir = (
+                PROGRESSIVE_OUTPUT_DIR / task_uuid if ENABLE_PROGRESSIVE_OUTPUT else None
+            )
+
+            async with get_session() as session:
+                result = await session.execute(
+                    select(Task).where(Task.id == task_uuid)
+                )
+                task = result.scalar_one()
+                task.status = Status.PROCESSING
+                task.percentage = 10
+                webhook_url = task.webhook_url
+                content_hash = task.content_hash
+                task.stream_dir = str(progressive_dir) if progressive_dir else None
+                if task.video_frames and task.video_pixels:
+                    cost = VideoCost(task.video_frames, task.video_pixels)
+            self._record_status(
+                task_uuid,
+                Status.PROCESSING,
+                10,
+                stream_url=self._stream_url(task_uuid, progressive_dir),
+                owned=True,
+                stage="loading",
+            )
+
+            loop = asyncio.get_event_loop()
+            # 两个回调都在处理线程中按顺序调用，进度总是带上最近上报的阶段
+            stage = ["loading"]
+
+            def stage_callback(name: str):
+                stage[0] = name
+
+            def progress_callback(percentage: int):
+                # 只更新内存缓存并推送事件，由 status_cache 合并写库
+                loop.call_soon_threadsafe(
+                    self._on_progress, task_uuid, percentage, stage[0]
+                )
+
+            started = time.monotonic()
+            await asyncio.to_thread(
+                sora_wm.run,
+                video_path,
+                output_path,
+                progress_callback,
+                progressive_dir,
+                cancel_token,
+                stage_callback,
+            )
+            if task_uuid in self._lost_leases:
+                self._abandon(task_uuid, output_path)
+                return
+            if cost is not None:
+                cost_model.observe(cost, time.monotonic() - started)
+
+            await self._mark_finished(task_uuid, output_path, webhook_url)
+            if ENABLE_RESULT_CACHE and content_hash:
+                await self._store_result(content_hash, output_path)
+
+            self.processed += 1
+            task_duration_seconds.observe(
+                time.monotonic() - task_started, status=Status.FINISHED
+            )
+            logger.info(
+                f"Task {task_uuid} completed successfully, output: {output_path}"
+            )
+
+        except TaskCancelledError:
+            if task_uuid in self._lost_leases:
+                self._abandon(task_uuid, output_path)
+                return
+            self.cancelled += 1
+            task_duration_seconds.observe(
+                time.monotonic() - task_started, status=Status.CANCELLED
+            )
             async with get_session() as session:
-                result = await session.execute(select(Task).where(Task.id == task_id))
-                task = result.scalar_one_or_none()
-                if task:
-                    task.percentage = percentage
-                    logger.debug(f"Task {task_id} progress updated to {percentage}%")
+                result = await session.execute(
+                    select(Task).where(Task.id == task_uuid)
+                )
+                task = result.scalar_one()
+                task.status = Status.CANCELLED
+                task.percentage = 0
+                task.stream_dir = None
+            video_path.unlink(missing_ok=True)
+            self._notify_webhook(
+                webhook_url, self._record_status(task_uuid, Status.CANCELLED, 0)
+            )
+            logger.info(f"Task {task_uuid} cancelled, resources released")
+
         except Exception as e:
-            logger.error(f"Error updating progress for task {task_id}: {e}")
+            if task_uuid in self._lost_leases:
+                logger.warning(f"Task {task_uuid} failed after its lease was lost: {e}")
+                return
+            self.failed += 1
+            task_duration_seconds.observe(
+                time.monotonic() - task_started, status=Status.ERROR
+            )
+            logger.error(f"Error processing task {task_uuid}: {e}")
+            async with get_session() as session:
+                result = await session.execute(
+                    select(Task).where(Task.id == task_uuid)
+                )
+                task = result.scalar_one()
+                task.status = Status.ERROR
+                task.percentage = 0
+            self._notify_webhook(
+                webhook_url, self._record_status(task_uuid, Status.ERROR, 0)
+            )
+
+    @staticmethod
+    def _abandon(task_uuid: str, output_path: Path):
+        """lease 丢失后放弃任务：只删除本进程的输出，上传文件、状态与 webhook 交给新持有者"""
+        output_path.unlink(missing_ok=True)
+        logger.warning(f"Task {task_uuid} abandoned after losing its lease")
+
+    @staticmethod
+    def _stream_url(task_uuid: str, stream_dir: Path | str | None) -> str | None:
+        if not stream_dir:
+            return None
+        return f"/stream/{task_uuid}/index.m3u8"
+
+    def _output_path(self, task_uuid: str, video_path: Path) -> Path:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        file_suffix = video_path.suffix
+        output_filename = f"{task_uuid}_{timestamp}{file_suffix}"
+        return self.output_dir / output_filename
+
+    async def _mark_finished(
+        self, task_uuid: str, output_path: Path, webhook_url: str | None
+    ):
+        async with get_session() as session:
+            result = await session.execute(select(Task).where(Task.id == task_uuid))
+            task = result.scalar_one()
+            task.status = Status.FINISHED
+            task.percentage = 100
+            task.output_path = str(output_path)
+            task.download_url = f"/download/{task_uuid}"
+            stream_dir = task.stream_dir
+        await storage_manager.track(task_uuid, output_path, "output")
+        if stream_dir:
+            await storage_manager.track(task_uuid, Path(stream_dir), "stream")
+        self._notify_webhook(
+            webhook_url,
+            self._record_status(
+                task_uuid,
+                Status.FINISHED,
+                100,
+                download_url=f"/download/{task_uuid}",
+                stream_url=self._stream_url(task_uuid, stream_dir),
+            ),
+        )
+
+    async def _store_result(self, content_hash: str, output_path: Path):
+        try:
+            cache_key = await asyncio.to_thread(result_cache_key, content_hash)
+            await result_cache.store(cache_key, output_path)
+        except Exception as e:
+            logger.warning(f"Failed to cache result {output_path}: {e}")
+
+    async def get_stats(self) -> WorkerStats:
+        return WorkerStats(
+            pool_size=self.pool_size,
+            busy=self.busy,
+            queued=await self.queue.queued_count(),
+            processed=self.processed,
+            failed=self.failed,
+            cancelled=self.cancelled,
+            cache_hits=self.cache_hits,
+            admission_waits=self.admission_waits,
+            threads_per_pipeline=self.threads_per_pipeline,
+            available_memory_mb=self._available_memory_mb(),
+        )
+
+    async def collect_metrics(self):
+        """抓取 /metrics 前刷新队列深度与流水线占用"""
+        queue_depth.set(await self.queue.queued_count())
+        active_pipelines.set(self.busy)
+        pipeline_pool_size.set(self.pool_size)
+
+    def _record_status(
+        self,
+        task_id: str,
+        status: Status,
+        percentage: int,
+        download_url: str | None = None,
+        stream_url: str | None = None,
+        owned: bool = False,
+        stage: str | None = None,
+    ) -> ProgressEvent:
+        status_cache.record(
+            task_id,
+            WMRemoveResults(
+                percentage=percentage,
+                status=status,
+                download_url=download_url,
+                stream_url=stream_url,
+            ),
+            owned=owned,
+        )
+        return progress_broker.publish(
+            task_id, status, percentage, download_url, stage=stage
+        )
+
+    def _on_progress(self, task_id: str, percentage: int, stage: str):
+        status_cache.set_progress(task_id, percentage)
+        progress_broker.publish(task_id, Status.PROCESSING, percentage, stage=stage)
+
+    def _notify_webhook(self, webhook_url: str | None, event: ProgressEvent):
+        if not webhook_url:
+            return
+        task = asyncio.create_task(self._post_webhook(webhook_url, event))
+        self._webhook_tasks.add(task)
+        task.add_done_callback(self._webhook_tasks.discard)
+
+    async def _post_webhook(self, webhook_url: str, event: ProgressEvent):
+        try:
+            async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT) as client:
+                response = await client.post(webhook_url, json=event.model_dump())
+                response.raise_for_status()
+            logger.info(f"Webhook for task {event.task_id} delivered to {webhook_url}")
+        except Exception as e:
+            logger.warning(f"Webhook for task {event.task_id} failed: {e}")
+
+    async def get_task_estimate(self, task_id: str, results: WMRemoveResults):
+        """补充预计开始 / 完成时间"""
+        if results.status not in (Status.QUEUED, Status.PROCESSING):
+            return results
+        start, finish = await schedule_estimator.estimate(task_id, self.pool_size)
+        return results.model_copy(
+            update={"estimated_start_at": start, "estimated_finish_at": finish}
+        )
 
     async def get_task_status(self, task_id: str) -> WMRemoveResults | None:
+        cached = status_cache.get(task_id)
+        if cached is not None:
+            return cached
         async with get_session() as session:
             result = await session.execute(select(Task).where(Task.id == task_id))
             task = result.scalar_one_or_none()
             if task is None:
                 return None
-            return WMRemoveResults(
+            results = WMRemoveResults(
                 percentage=task.percentage,
                 status=Status(task.status),
                 download_url=task.download_url,
+                stream_url=self._stream_url(task_id, task.stream_dir),
             )
+        status_cache.record(task_id, results)
+        return results
+
+    async def get_stream_dir(self, task_id: str) -> Path | None:
+        async with get_session() as session:
+            result = await session.execute(select(Task).where(Task.id == task_id))
+            task = result.scalar_one_or_none()
+            if task is None or task.stream_dir is None:
+                return None
+            return Path(task.stream_dir)
 
     async def get_output_path(self, task_id: str) -> Path | None:
         async with get_session() as session:
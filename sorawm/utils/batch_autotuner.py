@@ -0,0 +1,237 @@
+"""
+批处理大小自动调优
+按实测吞吐（帧/秒）与常驻内存在候选批大小间爬山搜索，在内存上限内收敛到吞吐最优的批大小；
+内存压力下回退到更小的批次。调优结果按 (主机, 分辨率, 模型) 持久化，后续运行直接从最优值开始
+"""
+
+import json
+import os
+import platform
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+
+import psutil
+from loguru import logger
+
+from sorawm.configs import (
+    BATCH_AUTOTUNE_CANDIDATES,
+    BATCH_AUTOTUNE_MAX_RSS_RATIO,
+    BATCH_AUTOTUNE_MIN_GAIN,
+    BATCH_AUTOTUNE_PATH,
+    BATCH_AUTOTUNE_PROBE_BATCHES,
+)
+
+_store_lock = threading.Lock()
+
+
+def autotune_key(width: int, height: int, model: str) -> str:
+    return f"{platform.node()}|{width}x{height}|{model}"
+
+
+@dataclass
+class BatchStats:
+    fps: float
+    peak_rss_mb: float
+
+
+class BatchSizeAutotuner:
+    """
+    批大小反馈控制器
+
+    每个批大小先跑 1 个预热批次（新尺寸的内存分配不计入），再计时 probe_batches 个批次。
+    以吞吐最高者为基准，取吞吐不低于其 (1 - min_gain) 的最小批大小为当前最优，
+    最优值的相邻批大小都已测过时收敛。常驻内存超过上限或出现内存压力时，
+    该批大小及更大的候选在本次运行中被排除。
+
+    只有常驻内存超限导致的回退会写回持久化结果；系统级内存压力可能只是其他进程的瞬时占用，
+    由它引起的回退只在本次运行生效，下次运行仍从原最优值开始
+    """
+
+    def __init__(
+        self,
+        key: str,
+        default_batch_size: int,
+        candidates: Sequence[int] = BATCH_AUTOTUNE_CANDIDATES,
+        probe_batches: int = BATCH_AUTOTUNE_PROBE_BATCHES,
+        min_gain: float = BATCH_AUTOTUNE_MIN_GAIN,
+        max_rss_bytes: Optional[int] = None,
+        memory_pressure: Optional[Callable[[], bool]] = None,
+        path: Path = BATCH_AUTOTUNE_PATH,
+    ):
+        """
+        Args:
+            key: 持久化键，见 autotune_key
+            default_batch_size: 没有历史结果时的起始批大小
+            candidates: 候选批大小（升序）
+            probe_batches: 每个批大小计时的批次数
+            min_gain: 更大批次的最小相对吞吐提升
+            max_rss_bytes: 常驻内存上限，默认为物理内存的 BATCH_AUTOTUNE_MAX_RSS_RATIO
+            memory_pressure: 返回是否存在内存压力的回调（如 MemoryManager.is_memory_pressure_high）
+            path: 调优结果文件
+        """
+        self.key = key
+        self.candidates = sorted(set(candidates))
+        self.probe_batches = max(1, probe_batches)
+        self.min_gain = min_gain
+        self.max_rss_bytes = max_rss_bytes or int(
+            psutil.virtual_memory().total * BATCH_AUTOTUNE_MAX_RSS_RATIO
+        )
+        self.memory_pressure = memory_pressure
+        self.path = path
+        self.stats: Dict[int, BatchStats] = {}
+        # 本次运行允许的最大候选下标
+        self._limit = len(self.candidates) - 1
+        # 上限是否因瞬时内存压力而降低，此时的调优结果不持久化
+        self._pressure_limited = False
+        self._process = psutil.Process(os.getpid())
+        self._reset_window()
+
+        tuned = self._load().get(key)
+        if tuned is not None:
+            self._index = self._nearest_index(tuned["batch_size"])
+            self.converged = True
+            logger.info(f"Batch size {self.batch_size} from autotune cache ({key})")
+        else:
+            self._index = self._nearest_index(default_batch_size)
+            self.converged = False
+
+    @property
+    def batch_size(self) -> int:
+        return self.candidates[self._index]
+
+    def observe(self, frames: int, seconds: float, rss_bytes: Optional[int] = None):
+        """
+        上报一个批次的处理结果
+
+        Args:
+            frames: 本批帧数（最后一批可能不满）
+            seconds: 本批端到端耗时（解码、检测、修复与写出）
+            rss_bytes: 当前常驻内存，默认读取本进程 RSS
+        """
+        rss = rss_bytes if rss_bytes is not None else self._process.memory_info().rss
+        if rss > self.max_rss_bytes:
+            self._back_off(rss, transient=False)
+            return
+        if self.memory_pressure and self.memory_pressure():
+            self._back_off(rss, transient=True)
+            return
+        if self.converged:
+            return
+
+        self._window_batches += 1
+        if self._window_batches == 1:
+            return
+        self._window_frames += frames
+        self._window_seconds += seconds
+        self._window_peak = max(self._window_peak, rss)
+        if self._window_batches - 1 < self.probe_batches:
+            return
+
+        self.stats[self.batch_size] = BatchStats(
+            fps=self._window_frames / max(self._window_seconds, 1e-9),
+            peak_rss_mb=self._window_peak / 1024**2,
+        )
+        logger.debug(
+            f"Batch size {self.batch_size}: {self.stats[self.batch_size].fps:.2f} fps, "
+            f"peak RSS {self.stats[self.batch_size].peak_rss_mb:.0f} MB"
+        )
+        self._step()
+
+    def _best_index(self) -> Optional[int]:
+        measured = [
+            i for i, size in enumerate(self.candidates) if size in self.stats and i <= self._limit
+        ]
+        if not measured:
+            return None
+        top_fps = max(self.stats[self.candidates[i]].fps for i in measured)
+        return min(
+            i for i in measured if self.stats[self.candidates[i]].fps >= top_fps * (1 - self.min_gain)
+        )
+
+    def _step(self):
+        """移动到最优值尚未测量的相邻批大小，都测过时收敛"""
+        best = self._best_index()
+        if best is None:
+            self._move(self._limit)
+            return
+        for neighbor in (best + 1, best - 1):
+            if 0 <= neighbor <= self._limit and self.candidates[neighbor] not in self.stats:
+                self._move(neighbor)
+                return
+        self._move(best)
+        self.converged = True
+        stats = self.stats[self.batch_size]
+        logger.info(
+            f"Batch size autotuned to {self.batch_size} "
+            f"({stats.fps:.2f} fps, peak RSS {stats.peak_rss_mb:.0f} MB)"
+        )
+        if not self._pressure_limited:
+            self._save(stats)
+
+    def _back_off(self, rss: int, transient: bool):
+        """
+        回退到更小的批大小
+
+        Args:
+            rss: 当前常驻内存
+            transient: 是否由系统级内存压力引起（而非本进程常驻内存超限）
+        """
+        if self._index == 0:
+            return
+        reason = "System memory pressure" if transient else "RSS above ceiling"
+        logger.warning(
+            f"{reason} at batch size {self.batch_size} "
+            f"(RSS {rss / 1024**2:.0f} MB), backing off"
+        )
+        self._limit = self._index - 1
+        self._pressure_limited = self._pressure_limited or transient
+        self.stats = {size: s for size, s in self.stats.items() if size <= self.candidates[self._limit]}
+        if self.converged:
+            self._move(self._limit)
+            if not self._pressure_limited:
+                stats = self.stats.get(self.batch_size)
+                self._save(stats or BatchStats(fps=0.0, peak_rss_mb=rss / 1024**2))
+        else:
+            self._step()
+
+    def _move(self, index: int):
+        if index != self._index:
+            self._index = index
+            self._reset_window()
+
+    def _reset_window(self):
+        self._window_batches = 0
+        self._window_frames = 0
+        self._window_seconds = 0.0
+        self._window_peak = 0
+
+    def _nearest_index(self, batch_size: int) -> int:
+        fitting = [i for i, size in enumerate(self.candidates) if size <= batch_size]
+        return fitting[-1] if fitting else 0
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Failed to load batch autotune results: {e}")
+            return {}
+
+    def _save(self, stats: BatchStats):
+        # 多条流水线可能同时收敛，读改写需串行
+        with _store_lock:
+            data = self._load()
+            data[self.key] = {
+                "batch_size": self.batch_size,
+                **asdict(stats),
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.path.write_text(json.dumps(data, indent=2))
+            except Exception as e:
+                logger.warning(f"Failed to save batch autotune results: {e}")
@@ -0,0 +1,52 @@
+"""
+协作式任务取消
+处理线程在帧 / 批次之间检查取消令牌；取消时立即结束已登记的 ffmpeg 子进程
+"""
+
+from __future__ import annotations
+
+import subprocess
+import threading
+
+from loguru import logger
+
+
+class TaskCancelledError(Exception):
+    """任务被取消"""
+
+
+class CancellationToken:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes: list[subprocess.Popen] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """可在任意线程调用；登记的子进程被立即结束"""
+        self._event.set()
+        self._kill_processes()
+
+    def register_process(self, process: subprocess.Popen) -> subprocess.Popen:
+        with self._lock:
+            self._processes.append(process)
+        if self.cancelled:
+            self._kill_processes()
+        return process
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            self._kill_processes()
+            raise TaskCancelledError("Task cancelled")
+
+    def _kill_processes(self):
+        with self._lock:
+            processes, self._processes = self._processes, []
+        for process in processes:
+            if process.poll() is None:
+                logger.debug(f"Killing ffmpeg process {process.pid}")
+                process.kill()
+                process.wait()
@@ -0,0 +1,86 @@
+"""
+ROI 合成工具
+只对掩码外接框（含上下文边距）做修复与合成，避免整帧拷贝和颜色转换
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from sorawm.iopaint.helper import blend_unmasked_area
+
+
+def mask_roi(
+    mask: np.ndarray, margin: int, width: int, height: int
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    计算掩码外接框并向外扩展上下文边距
+
+    Args:
+        mask: [H, W] 掩码，非零为修复区域
+        margin: 上下文边距（像素）
+        width: 帧宽
+        height: 帧高
+
+    Returns:
+        (x1, y1, x2, y2)，掩码为空时返回 None
+    """
+    x, y, w, h = cv2.boundingRect(mask)
+    if w == 0 or h == 0:
+        return None
+    return (
+        max(0, x - margin),
+        max(0, y - margin),
+        min(width, x + w + margin),
+        min(height, y + h + margin),
+    )
+
+
+def feathered_alpha(mask: np.ndarray, feather_px: int) -> np.ndarray:
+    """
+    对掩码边缘向外羽化，得到 0~255 的 uint8 alpha
+
+    先把掩码膨胀 feather_px 再模糊，羽化过渡只落在掩码外侧；
+    掩码内像素的 alpha 恒为 255，原水印像素不会混回输出
+
+    Args:
+        mask: [h, w] 二值掩码
+        feather_px: 羽化半径（像素），<= 0 时不羽化
+
+    Returns:
+        [h, w] uint8 alpha
+    """
+    if feather_px <= 0:
+        return mask
+    ksize = 2 * feather_px + 1
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (ksize, ksize))
+    alpha = cv2.GaussianBlur(cv2.dilate(mask, kernel), (ksize, ksize), 0)
+    # 高斯核截断与取整可能让膨胀边缘附近略低于 255
+    alpha[mask > 0] = 255
+    return alpha
+
+
+def blend_roi_inplace(
+    frame: np.ndarray,
+    roi_result: np.ndarray,
+    alpha: np.ndarray,
+    box: Tuple[int, int, int, int],
+) -> np.ndarray:
+    """
+    按 alpha 将 ROI 修复结果原地合成回帧缓冲区，仅处理 ROI 大小的数据
+
+    Args:
+        frame: [H, W, 3] 可写的 uint8 帧
+        roi_result: [h, w, 3] 与 frame 同通道顺序的修复结果
+        alpha: [h, w] uint8 alpha
+        box: (x1, y1, x2, y2)
+
+    Returns:
+        frame 本身
+    """
+    x1, y1, x2, y2 = box
+    frame[y1:y2, x1:x2] = blend_unmasked_area(roi_result, frame[y1:y2, x1:x2], alpha)
+    return frame
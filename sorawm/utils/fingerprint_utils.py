@@ -0,0 +1,93 @@
+"""
+内容与流水线指纹
+用于结果缓存：相同输入 + 相同流水线配置 => 相同输出
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from functools import lru_cache
+from pathlib import Path
+
+from sorawm import configs
+
+# 会影响输出视频的配置项
+FINGERPRINT_CONFIG_KEYS = (
+    "DEFAULT_WATERMARK_REMOVE_MODEL",
+    "DETECTION_MIN_CONFIDENCE",
+    "DETECTION_HIGH_CONFIDENCE",
+    "DETECTION_TEMPORAL_CONSISTENCY_WINDOW",
+    "DETECTION_MIN_CONSISTENT_FRAMES",
+    "DETECTION_MAX_JUMP_DISTANCE",
+    "TEMPLATE_MATCH_SCALES",
+    "TEMPLATE_MATCH_MIN_SCORE",
+    "TEMPLATE_SEARCH_EXPANSION_RATIO",
+    "BBOX_PADDING_RATIO",
+    "BBOX_MIN_EDGE_PX",
+    "BBOX_SMOOTHING_WINDOW",
+    "BBOX_STABILITY_THRESHOLD",
+    "MASK_DILATION_KERNEL_SIZE",
+    "MASK_DILATION_ITERATIONS",
+    "ENABLE_BATCH_PROCESSING",
+    "USE_FP16",
+    "LAMA_CPU_PRECISION",
+    "YOLO_CPU_PRECISION",
+    "ENABLE_ROI_COMPOSITING",
+    "ROI_CONTEXT_MARGIN",
+    "ROI_FEATHER_PX",
+    "ENCODING_PRESET",
+    "ENABLE_HW_ACCEL",
+)
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件 sha256"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _cached_file_sha256(path: str, mtime_ns: int, size: int) -> str:
+    return file_sha256(Path(path))
+
+
+def weights_sha256(path: Path) -> str | None:
+    """模型权重哈希，按 (路径, mtime, 大小) 缓存，文件不存在时返回 None"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return _cached_file_sha256(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def file_identity(path: Path) -> str | None:
+    """不读内容的廉价文件标识（文件名、大小、mtime），文件不存在时返回 None"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def pipeline_fingerprint() -> str:
+    """
+    流水线配置指纹：模型名、检测器权重哈希与相关配置项
+
+    Returns:
+        sha256 十六进制字符串
+    """
+    payload = {
+        "detector_weights": weights_sha256(configs.WATER_MARK_DETECT_YOLO_WEIGHTS),
+        "config": {key: getattr(configs, key) for key in FINGERPRINT_CONFIG_KEYS},
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def result_cache_key(content_hash: str) -> str:
+    """上传内容哈希 + 流水线指纹 => 结果缓存键"""
+    return hashlib.sha256(f"{content_hash}:{pipeline_fingerprint()}".encode()).hexdigest()
@@ -1,11 +1,13 @@
-import ruptures as rpt
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from typing import List, Tuple
 
 
 def find_2d_data_bkps(X: List[Tuple[int, int]]) -> List[int]:
+    # ruptures/pandas/sklearn 导入较慢，只在需要变点检测时加载
+    import pandas as pd
+    import ruptures as rpt
+    from sklearn.preprocessing import StandardScaler
+
     X_clean = [point if point is not None else (np.nan, np.nan) for point in X]
     X = np.array(X_clean, dtype=float)
     X = pd.DataFrame(X).interpolate("linear").bfill().ffill().to_numpy()
@@ -5,6 +5,7 @@
 
 import gc
 import psutil
+from functools import cached_property
 from typing import Optional, Dict, Any
 import torch
 from loguru import logger
@@ -23,11 +24,17 @@ class MemoryManager:
         """
         self.max_gpu_memory_ratio = max_gpu_memory_ratio
         self.max_cpu_memory_ratio = max_cpu_memory_ratio
-        self.gpu_available = torch.cuda.is_available()
-        
-        if self.gpu_available:
-            self.gpu_memory_total = torch.cuda.get_device_properties(0).total_memory
-            logger.info(f"GPU memory total: {self.gpu_memory_total / 1024**3:.2f} GB")
+
+    @cached_property
+    def gpu_available(self) -> bool:
+        """首次使用时才查询 CUDA，导入本模块不会初始化 CUDA 运行时"""
+        return torch.cuda.is_available()
+
+    @cached_property
+    def gpu_memory_total(self) -> int:
+        total = torch.cuda.get_device_properties(0).total_memory
+        logger.info(f"GPU memory total: {total / 1024**3:.2f} GB")
+        return total
     
     def get_memory_info(self) -> Dict[str, Any]:
         """
@@ -36,12 +43,13 @@ class MemoryManager:
         Returns:
             内存信息字典
         """
+        vm = psutil.virtual_memory()
         info = {
             "cpu_memory": {
-                "total": psutil.virtual_memory().total,
-                "available": psutil.virtual_memory().available,
-                "used": psutil.virtual_memory().used,
-                "percent": psutil.virtual_memory().percent,
+                "total": vm.total,
+                "available": vm.available,
+                "used": vm.used,
+                "percent": vm.percent,
             }
         }
         
@@ -60,15 +68,19 @@ class MemoryManager:
         
         return info
     
-    def is_memory_pressure_high(self) -> bool:
+    def is_memory_pressure_high(self, vm=None) -> bool:
         """
         检查是否存在内存压力
         
+        Args:
+            vm: psutil.virtual_memory() 快照，不传时现取
+            
         Returns:
             如果内存使用率过高返回 True
         """
         # 检查 CPU 内存
-        cpu_memory_percent = psutil.virtual_memory().percent / 100
+        vm = vm or psutil.virtual_memory()
+        cpu_memory_percent = vm.percent / 100
         if cpu_memory_percent > self.max_cpu_memory_ratio:
             logger.warning(f"High CPU memory usage: {cpu_memory_percent:.1%}")
             return True
@@ -111,7 +123,9 @@ class MemoryManager:
         Returns:
             优化后的批处理大小
         """
-        if self.is_memory_pressure_high():
+        # 同一次判断只取一次系统内存快照
+        vm = psutil.virtual_memory()
+        if self.is_memory_pressure_high(vm):
             # 内存压力高时，减少批处理大小
             optimal_size = max(1, base_batch_size // 2)
             logger.info(f"Memory pressure detected, reducing batch size to {optimal_size}")
@@ -129,7 +143,7 @@ class MemoryManager:
                 logger.info(f"Adjusted batch size from {base_batch_size} to {optimal_size} based on available memory")
         else:
             # CPU 模式下，根据系统内存调整
-            cpu_memory_available = psutil.virtual_memory().available
+            cpu_memory_available = vm.available
             estimated_memory_per_frame = frame_size[0] * frame_size[1] * frame_size[2] * 4
             max_batch_size = int(cpu_memory_available * 0.3 / estimated_memory_per_frame)  # 使用 30% 的可用内存
             
@@ -0,0 +1,491 @@
+"""
+CPU 低精度推理工具模块
+为 LaMa 与 YOLO 提供 bf16 / 动态 int8 / 静态 int8 ONNX 三种 CPU 精度模式，
+并在启用前通过校准集上的精度门限进行校验
+"""
+
+import hashlib
+import json
+from enum import StrEnum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import torch
+from loguru import logger
+
+from sorawm.configs import DATASETS_DEMO_DIR, PRECISION_CACHE_DIR, RESOURCES_DIR
+
+BBox = Tuple[int, int, int, int]
+Detection = Tuple[BBox, float]
+
+
+class CPUPrecision(StrEnum):
+    FP32 = "fp32"
+    BF16 = "bf16"
+    INT8_DYNAMIC = "int8_dynamic"
+    INT8_STATIC_ONNX = "int8_static_onnx"
+
+
+def cpu_supports_bf16() -> bool:
+    """检查当前 CPU 是否具备 bf16 加速指令（AVX512-BF16 / AMX）"""
+    checker = getattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported", None)
+    if checker is None:
+        return torch.backends.mkldnn.is_available()
+    try:
+        return bool(checker())
+    except Exception:
+        return False
+
+
+class BF16AutocastModule(torch.nn.Module):
+    """在 CPU bf16 autocast 与 channels_last 布局下运行被包装的模型"""
+
+    def __init__(self, module: torch.nn.Module):
+        super().__init__()
+        self.module = module.to(memory_format=torch.channels_last)
+
+    def forward(self, *args):
+        args = tuple(
+            arg.contiguous(memory_format=torch.channels_last)
+            if isinstance(arg, torch.Tensor) and arg.dim() == 4
+            else arg
+            for arg in args
+        )
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            output = self.module(*args)
+        if isinstance(output, torch.Tensor) and output.is_floating_point():
+            return output.float().contiguous()
+        return output
+
+
+def quantize_dynamic_int8(module: torch.nn.Module) -> torch.nn.Module:
+    """
+    对 Linear 与 Conv 层做动态 int8 量化
+
+    TorchScript 模型只能走 quantize_dynamic_jit，而它只量化 Linear；
+    LaMa 这类几乎全是卷积的模型量化后与 fp32 完全相同，因此直接拒绝
+
+    Args:
+        module: 原始 eager 模型
+
+    Returns:
+        量化后的模型
+
+    Raises:
+        ValueError: 传入 TorchScript 模型，或模型中没有可量化的层
+    """
+    from torch.ao.quantization import quantize_dynamic
+    import torch.ao.nn.quantized.dynamic as nnqd
+
+    if isinstance(module, torch.jit.ScriptModule):
+        raise ValueError(
+            "dynamic int8 on TorchScript only quantizes Linear layers, "
+            "use int8_static_onnx for convolutional models"
+        )
+
+    quantized = quantize_dynamic(
+        module,
+        {torch.nn.Linear, torch.nn.Conv2d},
+        dtype=torch.qint8,
+        mapping={torch.nn.Linear: nnqd.Linear, torch.nn.Conv2d: nnqd.Conv2d},
+    )
+    if count_quantized_modules(quantized) == 0:
+        raise ValueError("model has no Linear or Conv2d layers to quantize")
+    return quantized
+
+
+def count_quantized_modules(module: torch.nn.Module) -> int:
+    """统计模型中已替换为量化实现的子模块数量"""
+    return sum(
+        1
+        for child in module.modules()
+        if type(child).__module__.startswith("torch.ao.nn.quantized")
+    )
+
+
+class _CalibrationReader:
+    """onnxruntime 静态量化使用的校准数据读取器"""
+
+    def __init__(self, input_names: Sequence[str], samples: Iterable[Sequence[np.ndarray]]):
+        self._feeds = iter(
+            [dict(zip(input_names, sample)) for sample in samples]
+        )
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        return next(self._feeds, None)
+
+
+def quantize_static_onnx(
+    fp32_path: Path,
+    int8_path: Path,
+    input_names: Sequence[str],
+    calibration_samples: Iterable[Sequence[np.ndarray]],
+) -> Path:
+    """
+    使用 onnxruntime 对 ONNX 模型做静态 int8 量化（QDQ 格式）
+
+    Args:
+        fp32_path: 原始 fp32 ONNX 模型路径
+        int8_path: 量化后模型保存路径
+        input_names: 模型输入名称
+        calibration_samples: 校准输入，每个元素与 input_names 一一对应
+
+    Returns:
+        量化后模型路径
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    int8_path.parent.mkdir(parents=True, exist_ok=True)
+    quantize_static(
+        str(fp32_path),
+        str(int8_path),
+        _CalibrationReader(input_names, calibration_samples),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    return int8_path
+
+
+def onnx_cache_stem(name: str, weights_identity: Optional[str]) -> str:
+    """
+    量化产物的缓存文件名前缀
+
+    包含权重文件标识与 torch / onnxruntime 版本的摘要，权重更新或依赖升级后
+    文件名随之变化，旧的量化模型不会被静默复用
+    """
+    import onnxruntime
+
+    digest = hashlib.sha256(
+        f"{weights_identity}|torch-{torch.__version__}|ort-{onnxruntime.__version__}".encode()
+    ).hexdigest()[:12]
+    return f"{name}_{digest}"
+
+
+class OnnxRuntimeModule(torch.nn.Module):
+    """以 torch 模块接口包装 onnxruntime 推理会话"""
+
+    def __init__(self, onnx_path: Path, input_names: Sequence[str]):
+        super().__init__()
+        import onnxruntime as ort
+
+        self.onnx_path = onnx_path
+        self.input_names = list(input_names)
+        self.session = ort.InferenceSession(
+            str(onnx_path), providers=["CPUExecutionProvider"]
+        )
+
+    def forward(self, *args):
+        feeds = {
+            name: arg.detach().cpu().numpy()
+            for name, arg in zip(self.input_names, args)
+        }
+        outputs = self.session.run(None, feeds)
+        return torch.from_numpy(outputs[0])
+
+
+def export_static_int8_onnx(
+    module: torch.nn.Module,
+    load_calibration_inputs: Callable[[], List[Tuple[torch.Tensor, ...]]],
+    input_names: Sequence[str],
+    cache_name: str,
+    weights_identity: Optional[str],
+) -> OnnxRuntimeModule:
+    """
+    导出 ONNX 并做静态 int8 量化，结果缓存在 PRECISION_CACHE_DIR 下
+
+    Args:
+        module: 原始 torch 模型
+        load_calibration_inputs: 返回校准输入张量，仅在量化模型未缓存时调用
+        input_names: 模型输入名称
+        cache_name: 缓存文件名前缀
+        weights_identity: 权重文件标识（见 file_identity），参与缓存文件命名
+
+    Returns:
+        可直接替换原模型调用的 onnxruntime 模块
+    """
+    PRECISION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = onnx_cache_stem(cache_name, weights_identity)
+    fp32_path = PRECISION_CACHE_DIR / f"{stem}_fp32.onnx"
+    int8_path = PRECISION_CACHE_DIR / f"{stem}_int8.onnx"
+
+    if not int8_path.exists():
+        calibration_inputs = load_calibration_inputs()
+        dynamic_axes = {
+            name: {0: "batch", 2: "height", 3: "width"} for name in input_names
+        }
+        dynamic_axes["output"] = {0: "batch", 2: "height", 3: "width"}
+        torch.onnx.export(
+            module,
+            calibration_inputs[0],
+            str(fp32_path),
+            input_names=list(input_names),
+            output_names=["output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+        quantize_static_onnx(
+            fp32_path,
+            int8_path,
+            input_names,
+            (
+                [tensor.detach().cpu().numpy() for tensor in sample]
+                for sample in calibration_inputs
+            ),
+        )
+        logger.info(f"Static int8 ONNX model saved to {int8_path}")
+
+    return OnnxRuntimeModule(int8_path, input_names)
+
+
+def masked_psnr(
+    reference: np.ndarray, candidate: np.ndarray, mask: np.ndarray
+) -> float:
+    """
+    计算掩码区域内的 PSNR
+
+    Args:
+        reference: 参考输出
+        candidate: 待评估输出
+        mask: 掩码，>0 的像素参与计算
+
+    Returns:
+        PSNR（dB），完全一致时返回 inf
+    """
+    region = mask > 0
+    if region.ndim == 3:
+        region = region[:, :, 0]
+    if not np.any(region):
+        return float("inf")
+    diff = reference[region].astype(np.float64) - candidate[region].astype(np.float64)
+    mse = float(np.mean(diff**2))
+    if mse == 0:
+        return float("inf")
+    return 10.0 * np.log10(255.0**2 / mse)
+
+
+def bbox_iou(box_a: BBox, box_b: BBox) -> float:
+    x1 = max(box_a[0], box_b[0])
+    y1 = max(box_a[1], box_b[1])
+    x2 = min(box_a[2], box_b[2])
+    y2 = min(box_a[3], box_b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    area_a = max(0, box_a[2] - box_a[0]) * max(0, box_a[3] - box_a[1])
+    area_b = max(0, box_b[2] - box_b[0]) * max(0, box_b[3] - box_b[1])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def detection_map(
+    predictions: List[List[Detection]],
+    ground_truths: List[List[BBox]],
+    iou_threshold: float = 0.5,
+) -> float:
+    """
+    单类别 mAP@iou_threshold（全点插值）
+
+    Args:
+        predictions: 每张图像的预测 (bbox, confidence) 列表
+        ground_truths: 每张图像的真值 bbox 列表
+        iou_threshold: 判定为真阳性的 IoU 阈值
+
+    Returns:
+        平均精度
+    """
+    total_gt = sum(len(gts) for gts in ground_truths)
+    if total_gt == 0:
+        return 1.0 if not any(predictions) else 0.0
+
+    scored = [
+        (confidence, image_idx, bbox)
+        for image_idx, preds in enumerate(predictions)
+        for bbox, confidence in preds
+    ]
+    scored.sort(key=lambda item: -item[0])
+
+    matched = [np.zeros(len(gts), dtype=bool) for gts in ground_truths]
+    tp = np.zeros(len(scored))
+    for rank, (_, image_idx, bbox) in enumerate(scored):
+        gts = ground_truths[image_idx]
+        best_iou, best_idx = 0.0, -1
+        for gt_idx, gt in enumerate(gts):
+            iou = bbox_iou(bbox, gt)
+            if iou > best_iou:
+                best_iou, best_idx = iou, gt_idx
+        if best_iou >= iou_threshold and not matched[image_idx][best_idx]:
+            matched[image_idx][best_idx] = True
+            tp[rank] = 1
+
+    if len(scored) == 0:
+        return 0.0
+
+    cum_tp = np.cumsum(tp)
+    recall = cum_tp / total_gt
+    precision = cum_tp / np.arange(1, len(scored) + 1)
+
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+
+
+def load_yolo_labels(label_path: Path, width: int, height: int) -> List[BBox]:
+    """读取 YOLO 格式标注（class cx cy w h，归一化坐标）并转换为像素 bbox"""
+    boxes = []
+    for line in label_path.read_text().splitlines():
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        cx, cy, w, h = (float(v) for v in parts[1:5])
+        boxes.append(
+            (
+                int((cx - w / 2) * width),
+                int((cy - h / 2) * height),
+                int((cx + w / 2) * width),
+                int((cy + h / 2) * height),
+            )
+        )
+    return boxes
+
+
+def load_detection_calibration_set(
+    dataset_dir: Path = DATASETS_DEMO_DIR,
+) -> List[Tuple[np.ndarray, List[BBox]]]:
+    """
+    读取 datasets/demo 中的图像与标注（ultralytics 目录布局 images/<split>, labels/<split>）
+
+    Returns:
+        (BGR 图像, 真值 bbox 列表) 列表，缺少图像时返回空列表
+    """
+    samples = []
+    for label_path in sorted((dataset_dir / "labels").glob("*/*.txt")):
+        split = label_path.parent.name
+        for suffix in (".jpg", ".png", ".jpeg"):
+            image_path = dataset_dir / "images" / split / f"{label_path.stem}{suffix}"
+            if image_path.exists():
+                break
+        else:
+            continue
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        samples.append((image, load_yolo_labels(label_path, width, height)))
+    return samples
+
+
+def load_inpaint_calibration_set(
+    num_positions: int = 4,
+    crop_size: int = 512,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    以 resources/first_frame.png 及其标注的水印区域构造修复校准集，
+    并把水印掩码平移到画面其他位置以覆盖不同背景
+
+    Args:
+        num_positions: 每个标注框平移出的位置数量
+        crop_size: 围绕掩码裁剪的窗口边长，控制校准耗时
+
+    Returns:
+        (BGR 图像, 掩码) 列表
+    """
+    image_path = RESOURCES_DIR / "first_frame.png"
+    annotation_path = RESOURCES_DIR / "first_frame.json"
+    image = cv2.imread(str(image_path))
+    if image is None:
+        return []
+    height, width = image.shape[:2]
+
+    boxes = []
+    if annotation_path.exists():
+        shapes = json.loads(annotation_path.read_text()).get("shapes", [])
+        for shape in shapes:
+            (x1, y1), (x2, y2) = shape["points"][:2]
+            boxes.append(
+                (int(min(x1, x2)), int(min(y1, y2)), int(max(x1, x2)), int(max(y1, y2)))
+            )
+    if not boxes:
+        boxes.append((width // 20, height * 7 // 8, width // 4, height * 15 // 16))
+
+    samples = []
+    for x1, y1, x2, y2 in boxes:
+        box_w, box_h = x2 - x1, y2 - y1
+        for i in range(num_positions):
+            ox = int((width - box_w) * i / max(num_positions - 1, 1))
+            oy = int((height - box_h) * (num_positions - 1 - i) / max(num_positions - 1, 1))
+            mask = np.zeros((height, width), dtype=np.uint8)
+            mask[oy : oy + box_h, ox : ox + box_w] = 255
+
+            cx, cy = ox + box_w // 2, oy + box_h // 2
+            left = int(np.clip(cx - crop_size // 2, 0, max(width - crop_size, 0)))
+            top = int(np.clip(cy - crop_size // 2, 0, max(height - crop_size, 0)))
+            window = (slice(top, top + crop_size), slice(left, left + crop_size))
+            samples.append((image[window].copy(), mask[window].copy()))
+    return samples
+
+
+def evaluate_inpaint_gate(
+    reference_fn: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    candidate_fn: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    samples: List[Tuple[np.ndarray, np.ndarray]],
+    min_psnr: float,
+) -> Tuple[bool, float]:
+    """
+    修复模型精度门限：候选模式在每个校准样本掩码区域内的 PSNR 都不得低于 min_psnr
+
+    Returns:
+        (是否通过, 最差 PSNR)
+    """
+    if not samples:
+        logger.warning("Inpaint calibration set is empty, refusing reduced precision")
+        return False, 0.0
+
+    worst = float("inf")
+    for image, mask in samples:
+        psnr = masked_psnr(reference_fn(image, mask), candidate_fn(image, mask), mask)
+        worst = min(worst, psnr)
+    return worst >= min_psnr, worst
+
+
+def evaluate_detection_gate(
+    reference_fn: Callable[[np.ndarray], List[Detection]],
+    candidate_fn: Callable[[np.ndarray], List[Detection]],
+    samples: List[Tuple[np.ndarray, Optional[List[BBox]]]],
+    max_map_drop: float,
+) -> Tuple[bool, float, float]:
+    """
+    检测模型精度门限：候选模式的 mAP@0.5 相比 fp32 的下降不得超过 max_map_drop。
+    样本没有真值时，以 fp32 检测结果作为伪真值
+
+    Returns:
+        (是否通过, fp32 mAP, 候选 mAP)
+    """
+    if not samples:
+        logger.warning("Detection calibration set is empty, refusing reduced precision")
+        return False, 0.0, 0.0
+
+    reference_preds, candidate_preds, ground_truths = [], [], []
+    for image, gts in samples:
+        reference = reference_fn(image)
+        reference_preds.append(reference)
+        candidate_preds.append(candidate_fn(image))
+        ground_truths.append(gts if gts is not None else [bbox for bbox, _ in reference])
+
+    reference_map = detection_map(reference_preds, ground_truths)
+    candidate_map = detection_map(candidate_preds, ground_truths)
+    return candidate_map >= reference_map - max_map_drop, reference_map, candidate_map
+
+
+def describe_gate_result(mode: str, model_name: str, passed: bool, metrics: Dict[str, Any]):
+    metric_str = ", ".join(f"{k}={v:.3f}" for k, v in metrics.items())
+    if passed:
+        logger.info(f"{model_name} CPU precision {mode} enabled ({metric_str})")
+    else:
+        logger.warning(
+            f"{model_name} CPU precision {mode} rejected by accuracy gate ({metric_str}), "
+            f"falling back to fp32"
+        )
@@ -0,0 +1,213 @@
+"""
+轻量级流水线计时
+用命名 span 记录各阶段耗时与处理条数，导出 Chrome trace-event JSON 与分位数汇总。
+也可注册 span 监听器（如服务端 metrics）在不导出 trace 时接收各阶段耗时。
+未启用且没有监听器时 span() 只做一次 ContextVar 读取并返回共享的空上下文。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from sorawm.configs import ENABLE_TRACING, TRACE_OUTPUT_DIR
+
+_NOOP_SPAN = nullcontext()
+_current_tracer: ContextVar[Optional["Tracer"]] = ContextVar(
+    "sorawm_tracer", default=None
+)
+# 监听器签名: (stage, duration_seconds, items)，可能在工作线程中被调用
+SpanListener = Callable[[str, float, int], None]
+_span_listeners: List[SpanListener] = []
+
+
+def add_span_listener(listener: SpanListener) -> None:
+    """注册 span 监听器，监听器需自行保证线程安全"""
+    if listener not in _span_listeners:
+        _span_listeners.append(listener)
+
+
+def remove_span_listener(listener: SpanListener) -> None:
+    if listener in _span_listeners:
+        _span_listeners.remove(listener)
+
+
+def _notify_listeners(name: str, duration_ns: int, items: int) -> None:
+    for listener in _span_listeners:
+        try:
+            listener(name, duration_ns / 1e9, items)
+        except Exception as e:
+            logger.warning(f"Span listener failed for {name}: {e}")
+
+
+@contextmanager
+def _listener_span(name: str, items: int):
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        _notify_listeners(name, time.perf_counter_ns() - start, items)
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    start_ns: int
+    duration_ns: int
+    thread_id: int
+    items: int
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩法分位数，sorted_values 需已升序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Tracer:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.records: List[SpanRecord] = []
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+
+    @contextmanager
+    def span(self, name: str, items: int = 1, notify: bool = True):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            record = SpanRecord(
+                name=name,
+                start_ns=start - self._origin_ns,
+                duration_ns=time.perf_counter_ns() - start,
+                thread_id=threading.get_ident(),
+                items=items,
+            )
+            with self._lock:
+                self.records.append(record)
+            if notify:
+                _notify_listeners(name, record.duration_ns, items)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        每个阶段的调用次数、条数、总耗时与 p50/p95/p99（毫秒）
+        """
+        durations: Dict[str, List[float]] = {}
+        items: Dict[str, int] = {}
+        for record in self.records:
+            durations.setdefault(record.name, []).append(record.duration_ns / 1e6)
+            items[record.name] = items.get(record.name, 0) + record.items
+
+        result = {}
+        for name, values in durations.items():
+            values.sort()
+            total_ms = sum(values)
+            result[name] = {
+                "count": len(values),
+                "items": items[name],
+                "total_ms": total_ms,
+                "ms_per_item": total_ms / max(1, items[name]),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+            }
+        return dict(sorted(result.items(), key=lambda kv: -kv[1]["total_ms"]))
+
+    def format_summary(self) -> str:
+        lines = [
+            f"{'stage':<28}{'count':>8}{'items':>8}{'total ms':>12}"
+            f"{'p50':>10}{'p95':>10}{'p99':>10}"
+        ]
+        for name, stats in self.summary().items():
+            lines.append(
+                f"{name:<28}{stats['count']:>8}{stats['items']:>8}"
+                f"{stats['total_ms']:>12.1f}{stats['p50_ms']:>10.2f}"
+                f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict:
+        pid = os.getpid()
+        events = [
+            {
+                "name": record.name,
+                "cat": self.name,
+                "ph": "X",
+                "ts": record.start_ns / 1e3,
+                "dur": record.duration_ns / 1e3,
+                "pid": pid,
+                "tid": record.thread_id,
+                "args": {"items": record.items},
+            }
+            for record in self.records
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, output_dir: Path = TRACE_OUTPUT_DIR) -> Path:
+        """写出 Chrome trace（chrome://tracing / Perfetto 可打开）与汇总 JSON"""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{self.name}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.getpid()}"
+        trace_path = output_dir / f"{stem}.trace.json"
+        trace_path.write_text(json.dumps(self.chrome_trace()))
+        (output_dir / f"{stem}.summary.json").write_text(
+            json.dumps(self.summary(), indent=2)
+        )
+        return trace_path
+
+
+def span(name: str, items: int = 1):
+    """在当前 tracer 下记录一个 span；没有活动 tracer 与监听器时为空操作"""
+    tracer = _current_tracer.get()
+    if tracer is not None:
+        return tracer.span(name, items)
+    if _span_listeners:
+        return _listener_span(name, items)
+    return _NOOP_SPAN
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _current_tracer.get()
+
+
+@contextmanager
+def trace_run(name: str, enabled: bool = ENABLE_TRACING) -> Iterator[Optional[Tracer]]:
+    """
+    为一次运行建立 tracer，结束时导出 trace 并打印汇总
+
+    Args:
+        name: 运行名称，用于 trace 文件名
+        enabled: 是否启用，默认取 ENABLE_TRACING；已有活动 tracer 时复用它
+    """
+    if not enabled or _current_tracer.get() is not None:
+        yield _current_tracer.get()
+        return
+
+    tracer = Tracer(name)
+    token = _current_tracer.set(tracer)
+    try:
+        # 整次运行的根 span 只进 trace，不作为阶段上报给监听器
+        with tracer.span(name, notify=False):
+            yield tracer
+    finally:
+        _current_tracer.reset(token)
+        try:
+            trace_path = tracer.export()
+            logger.info(
+                f"Trace saved to {trace_path}\n{tracer.format_summary()}"
+            )
+        except Exception as e:
+            logger.warning(f"Failed to export trace: {e}")
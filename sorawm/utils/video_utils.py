@@ -3,6 +3,8 @@ from pathlib import Path
 import ffmpeg
 import numpy as np
 
+from sorawm.utils.tracing import span
+
 
 class VideoLoader:
     def __init__(self, video_path: Path):
@@ -39,13 +41,17 @@ class VideoLoader:
             .run_async(pipe_stdout=True)
         )
 
+        frame_size = self.width * self.height * 3
         try:
             while True:
-                in_bytes = process_in.stdout.read(self.width * self.height * 3)
-                if not in_bytes:
+                # 每帧独立的可写缓冲区，下游可原地合成
+                buffer = bytearray(frame_size)
+                with span("decode"):
+                    read_size = process_in.stdout.readinto(buffer)
+                if read_size < frame_size:
                     break
 
-                frame = np.frombuffer(in_bytes, np.uint8).reshape(
+                frame = np.frombuffer(buffer, np.uint8).reshape(
                     [self.height, self.width, 3]
                 )
                 yield frame
@@ -0,0 +1,92 @@
+"""
+预热结果缓存
+按 (组件, 权重, 设备, torch 版本) 持久化 CPU 低精度模式的精度门限结论与最近的推理尺寸，
+重启后的 worker 复用门限结论、跳过校准集推理，并按真实请求的尺寸预热
+"""
+
+import json
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from loguru import logger
+
+from sorawm.configs import WARMUP_CACHE_PATH, WARMUP_MAX_SHAPES
+
+
+# 记录的推理尺寸向上对齐到该倍数，避免检测框抖动产生大量只差几个像素的尺寸
+SHAPE_ALIGN = 64
+
+
+def align_shape(height: int, width: int) -> Tuple[int, int]:
+    return (-(-height // SHAPE_ALIGN) * SHAPE_ALIGN, -(-width // SHAPE_ALIGN) * SHAPE_ALIGN)
+
+
+def warmup_key(component: str, weights: Optional[str], device: Any) -> str:
+    """缓存键，权重文件、设备或 torch 版本变化后旧结论自动失效"""
+    return f"{component}|{weights}|{device}|torch-{torch.__version__}"
+
+
+class WarmupCache:
+    def __init__(self, path: Path = WARMUP_CACHE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def gate_result(self, key: str, mode: str) -> Optional[Dict[str, Any]]:
+        """
+        已缓存的精度门限结论
+
+        Returns:
+            {"passed": bool, "metrics": {...}}，没有缓存时返回 None
+        """
+        with self._lock:
+            return self._entries.get(key, {}).get("gates", {}).get(mode)
+
+    def record_gate(self, key: str, mode: str, passed: bool, metrics: Dict[str, float]):
+        with self._lock:
+            gates = self._entries.setdefault(key, {}).setdefault("gates", {})
+            gates[mode] = {"passed": passed, "metrics": metrics}
+            self._save()
+
+    def shapes(self, key: str) -> List[Tuple[int, int]]:
+        """最近记录的推理尺寸 (height, width)，按记录先后排列"""
+        with self._lock:
+            return [tuple(shape) for shape in self._entries.get(key, {}).get("shapes", [])]
+
+    def record_shape(self, key: str, shape: Tuple[int, int]):
+        """记录推理尺寸，只保留最近 WARMUP_MAX_SHAPES 个，出现新尺寸时才写盘"""
+        shape = [int(shape[0]), int(shape[1])]
+        with self._lock:
+            shapes = self._entries.setdefault(key, {}).setdefault("shapes", [])
+            if shape in shapes:
+                return
+            shapes.append(shape)
+            del shapes[:-WARMUP_MAX_SHAPES]
+            self._save()
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text())
+            if isinstance(data, dict):
+                self._entries = data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to load warmup cache: {e}")
+
+    def _save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self._entries, indent=2))
+        except Exception as e:
+            logger.warning(f"Failed to save warmup cache: {e}")
+
+
+@lru_cache(maxsize=1)
+def get_warmup_cache() -> WarmupCache:
+    """进程内共享实例，首次使用时才读盘"""
+    return WarmupCache()
@@ -1,11 +1,16 @@
+from functools import lru_cache
+
 import cv2
 import numpy as np
 
 from sorawm.configs import WATER_MARK_TEMPLATE_IMAGE_PATH
 
-tmpl = cv2.imread(WATER_MARK_TEMPLATE_IMAGE_PATH)
-tmpl_gray = cv2.cvtColor(tmpl, cv2.COLOR_BGR2GRAY)
-h_tmpl, w_tmpl = tmpl_gray.shape
+
+@lru_cache(maxsize=1)
+def load_template_gray() -> np.ndarray:
+    """首次检测时读取灰度水印模板，避免导入模块时读盘"""
+    tmpl = cv2.imread(str(WATER_MARK_TEMPLATE_IMAGE_PATH))
+    return cv2.cvtColor(tmpl, cv2.COLOR_BGR2GRAY)
 
 
 def detect_watermark(
@@ -15,6 +20,8 @@ def detect_watermark(
     debug=False,  # 添加调试参数
 ):
     """检测图像中的水印"""
+    tmpl_gray = load_template_gray()
+    h_tmpl, w_tmpl = tmpl_gray.shape
     img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     h_img, w_img = img_gray.shape
 
@@ -6,12 +6,35 @@ import numpy as np
 import torch
 from loguru import logger
 
-from sorawm.configs import DEFAULT_WATERMARK_REMOVE_MODEL, USE_FP16
+from sorawm.configs import (
+    DEFAULT_WATERMARK_REMOVE_MODEL,
+    ENABLE_ROI_COMPOSITING,
+    LAMA_CPU_PRECISION,
+    PRECISION_GATE_ENABLED,
+    PRECISION_GATE_MIN_PSNR,
+    ROI_CONTEXT_MARGIN,
+    ROI_FEATHER_PX,
+    USE_FP16,
+)
 from sorawm.iopaint.const import DEFAULT_MODEL_DIR
 from sorawm.iopaint.download import cli_download_model, scan_models
 from sorawm.iopaint.model_manager import ModelManager
 from sorawm.iopaint.schema import InpaintRequest
+from sorawm.utils.composite_utils import blend_roi_inplace, feathered_alpha, mask_roi
 from sorawm.utils.devices_utils import get_device
+from sorawm.utils.fingerprint_utils import file_identity
+from sorawm.utils.tracing import span
+from sorawm.utils.precision_utils import (
+    BF16AutocastModule,
+    CPUPrecision,
+    cpu_supports_bf16,
+    describe_gate_result,
+    evaluate_inpaint_gate,
+    export_static_int8_onnx,
+    load_inpaint_calibration_set,
+    quantize_dynamic_int8,
+)
+from sorawm.utils.warmup_cache import align_shape, get_warmup_cache, warmup_key
 
 # This codebase is from https://github.com/Sanster/IOPaint#, thanks for their amazing work!
 
@@ -29,11 +52,21 @@ class WaterMarkCleaner:
             cli_download_model(self.model)
         self.model_manager = ModelManager(name=self.model, device=self.device)
         self.inpaint_request = InpaintRequest()
+        weights_path = getattr(self.model_manager.model, "weights_path", None)
+        self._weights_identity = file_identity(weights_path()) if weights_path else None
+        self._warmup_key = warmup_key(
+            f"inpaint:{self.model}", self._weights_identity, self.device
+        )
+        self._seen_shapes = set()
         
         # 启用半精度推理（如果支持）
         if USE_FP16 and self.device.type == 'cuda':
             self._enable_fp16()
             logger.debug("Enabled FP16 inference for LAMA model")
+
+        # CPU 低精度推理（bf16 / int8），需通过精度门限校验
+        if self.device.type == "cpu" and LAMA_CPU_PRECISION != CPUPrecision.FP32:
+            self._enable_cpu_precision(CPUPrecision(LAMA_CPU_PRECISION))
         
         # 模型编译优化（PyTorch 2.0+）
         self._compile_model()
@@ -42,11 +75,54 @@ class WaterMarkCleaner:
         self._warmup_model()
 
     def clean(self, input_image: np.array, watermark_mask: np.array) -> np.array:
-        inpaint_result = self.model_manager(
-            input_image, watermark_mask, self.inpaint_request
+        if not ENABLE_ROI_COMPOSITING:
+            inpaint_result = self.model_manager(
+                input_image, watermark_mask, self.inpaint_request
+            )
+            inpaint_result = cv2.cvtColor(inpaint_result, cv2.COLOR_BGR2RGB)
+            return inpaint_result
+
+        roi = self.inpaint_roi(input_image, watermark_mask)
+        if roi is None:
+            return input_image
+        roi_result, box = roi
+
+        # 帧缓冲区可写时原地合成，否则只拷贝一次
+        with span("composite"):
+            frame = input_image if input_image.flags.writeable else input_image.copy()
+            x1, y1, x2, y2 = box
+            alpha = feathered_alpha(watermark_mask[y1:y2, x1:x2], ROI_FEATHER_PX)
+            return blend_roi_inplace(frame, roi_result, alpha, box)
+
+    def inpaint_roi(self, input_image: np.ndarray, watermark_mask: np.ndarray):
+        """
+        只对掩码外接框（含上下文边距）做修复
+
+        Args:
+            input_image: [H, W, 3] 输入帧
+            watermark_mask: [H, W] 掩码
+
+        Returns:
+            (roi_result, (x1, y1, x2, y2))，roi_result 与输入帧通道顺序一致；
+            掩码为空时返回 None
+        """
+        height, width = input_image.shape[:2]
+        box = mask_roi(watermark_mask, ROI_CONTEXT_MARGIN, width, height)
+        if box is None:
+            return None
+        x1, y1, x2, y2 = box
+        shape = align_shape(y2 - y1, x2 - x1)
+        if shape not in self._seen_shapes:
+            # 记录真实请求的 ROI 尺寸，重启后按这些尺寸预热
+            self._seen_shapes.add(shape)
+            get_warmup_cache().record_shape(self._warmup_key, shape)
+        roi_result = self.model_manager(
+            input_image[y1:y2, x1:x2],
+            watermark_mask[y1:y2, x1:x2],
+            self.inpaint_request,
         )
-        inpaint_result = cv2.cvtColor(inpaint_result, cv2.COLOR_BGR2RGB)
-        return inpaint_result
+        # 模型输出通道与输入相反，只在 ROI 上翻转回来
+        return roi_result[:, :, ::-1], box
 
     def _enable_fp16(self):
         """启用 FP16 半精度推理"""
@@ -58,6 +134,83 @@ class WaterMarkCleaner:
         except Exception as e:
             logger.warning(f"Failed to enable FP16 for LAMA model: {e}")
 
+    def _enable_cpu_precision(self, mode: CPUPrecision):
+        """启用 CPU 低精度 LaMa 推理，未通过精度门限时保持 fp32"""
+        inpaint_model = self.model_manager.model
+        fp32_module = getattr(inpaint_model, "model", None)
+        if not isinstance(fp32_module, torch.nn.Module):
+            logger.warning(f"{self.model} has no torch module, skip CPU precision {mode}")
+            return
+
+        cache = get_warmup_cache()
+        cached = cache.gate_result(self._warmup_key, mode) if PRECISION_GATE_ENABLED else None
+        if cached is not None and not cached["passed"]:
+            logger.info(f"Reusing cached LaMa {mode} gate result")
+            describe_gate_result(mode, "LaMa", False, cached["metrics"])
+            return
+
+        # 门限结论已缓存时不需要校准集
+        run_gate = PRECISION_GATE_ENABLED and cached is None
+        samples = load_inpaint_calibration_set() if run_gate else None
+        try:
+            if mode == CPUPrecision.BF16:
+                if not cpu_supports_bf16():
+                    logger.warning("CPU has no native bf16 support, bf16 may be slower")
+                candidate = BF16AutocastModule(fp32_module)
+            elif mode == CPUPrecision.INT8_DYNAMIC:
+                candidate = quantize_dynamic_int8(fp32_module)
+            else:
+                candidate = export_static_int8_onnx(
+                    fp32_module,
+                    lambda: [
+                        self._lama_inputs(image, mask)
+                        for image, mask in samples or load_inpaint_calibration_set()
+                    ],
+                    ["image", "mask"],
+                    cache_name=self.model,
+                    weights_identity=self._weights_identity,
+                )
+        except Exception as e:
+            logger.warning(f"Failed to build {mode} LaMa model, keep fp32: {e}")
+            return
+
+        if cached is not None:
+            logger.info(f"Reusing cached LaMa {mode} gate result")
+            describe_gate_result(mode, "LaMa", True, cached["metrics"])
+        elif run_gate:
+
+            def run_with(module):
+                def _run(image, mask):
+                    inpaint_model.model = module
+                    return self.model_manager(image, mask, self.inpaint_request)
+
+                return _run
+
+            try:
+                passed, worst_psnr = evaluate_inpaint_gate(
+                    run_with(fp32_module),
+                    run_with(candidate),
+                    samples,
+                    PRECISION_GATE_MIN_PSNR,
+                )
+                cache.record_gate(self._warmup_key, mode, passed, {"min_psnr": worst_psnr})
+            except Exception as e:
+                logger.warning(f"LaMa {mode} accuracy gate failed to run: {e}")
+                passed, worst_psnr = False, 0.0
+            describe_gate_result(mode, "LaMa", passed, {"min_psnr": worst_psnr})
+            if not passed:
+                inpaint_model.model = fp32_module
+                return
+
+        inpaint_model.model = candidate
+
+    def _lama_inputs(self, image: np.ndarray, mask: np.ndarray):
+        """构造与 LaMa 推理一致的模型输入，用于 ONNX 导出与校准"""
+        inpaint_model = self.model_manager.model
+        return inpaint_model.transfer_buffers.prepare(
+            image, mask, mod=inpaint_model.pad_mod
+        )
+
     def _compile_model(self):
         """模型编译优化（PyTorch 2.0+）"""
         try:
@@ -75,17 +228,19 @@ class WaterMarkCleaner:
             logger.warning(f"Model compilation failed: {e}")
 
     def _warmup_model(self):
-        """模型预热，避免首次推理延迟"""
+        """模型预热，避免首次推理延迟；优先使用上次运行记录的 ROI 尺寸"""
         try:
-            # 创建虚拟输入进行预热
-            dummy_image = np.random.randint(0, 255, (512, 512, 3), dtype=np.uint8)
-            dummy_mask = np.random.randint(0, 255, (512, 512), dtype=np.uint8)
-            dummy_mask[dummy_mask < 128] = 0
-            dummy_mask[dummy_mask >= 128] = 255
-            
-            with torch.no_grad():
-                _ = self.model_manager(dummy_image, dummy_mask, self.inpaint_request)
-            logger.debug("LAMA model warmup completed")
+            shapes = get_warmup_cache().shapes(self._warmup_key) or [(512, 512)]
+            for height, width in shapes:
+                # 创建虚拟输入进行预热
+                dummy_image = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+                dummy_mask = np.random.randint(0, 255, (height, width), dtype=np.uint8)
+                dummy_mask[dummy_mask < 128] = 0
+                dummy_mask[dummy_mask >= 128] = 255
+
+                with torch.no_grad():
+                    _ = self.model_manager(dummy_image, dummy_mask, self.inpaint_request)
+            logger.debug(f"LAMA model warmup completed for shapes {shapes}")
         except Exception as e:
             logger.warning(f"LAMA model warmup failed: {e}")
 
@@ -134,11 +289,7 @@ class WaterMarkCleaner:
                         mask = mask.astype(np.uint8)
                     
                     # 处理单个图像
-                    inpaint_result = self.model_manager(
-                        image, mask, self.inpaint_request
-                    )
-                    inpaint_result = cv2.cvtColor(inpaint_result, cv2.COLOR_BGR2RGB)
-                    results.append(inpaint_result)
+                    results.append(self.clean(image, mask))
                 except Exception as e:
                     logger.error(f"Failed to process image {i} in batch: {e}")
                     # 如果处理失败，返回原始图像
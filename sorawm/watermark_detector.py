@@ -1,10 +1,12 @@
+import shutil
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 
+import cv2
 import numpy as np
 import torch
 from loguru import logger
-from ultralytics import YOLO
 
 from sorawm.configs import (
     WATER_MARK_DETECT_YOLO_WEIGHTS, 
@@ -12,15 +14,36 @@ from sorawm.configs import (
     USE_FP16,
     DETECTION_MIN_CONFIDENCE,
     DETECTION_HIGH_CONFIDENCE,
-    DETECTION_TEMPORAL_CONSISTENCY_WINDOW
+    DETECTION_TEMPORAL_CONSISTENCY_WINDOW,
+    YOLO_CPU_PRECISION,
+    PRECISION_GATE_ENABLED,
+    PRECISION_GATE_MAX_MAP_DROP,
+    PRECISION_CACHE_DIR,
 )
 from sorawm.utils.download_utils import download_detector_weights
 from sorawm.utils.devices_utils import get_device
+from sorawm.utils.fingerprint_utils import file_identity
 from sorawm.utils.video_utils import VideoLoader
 from sorawm.utils.temporal_detector import TemporalConsistencyDetector
 from sorawm.utils.advanced_detector import AdvancedDetectionStrategy
 from sorawm.utils.missed_detection_handler import MissedDetectionHandler
 from sorawm.utils.template_matching import WatermarkTemplateMatcher
+from sorawm.utils.tracing import span
+from sorawm.utils.precision_utils import (
+    CPUPrecision,
+    cpu_supports_bf16,
+    describe_gate_result,
+    evaluate_detection_gate,
+    load_detection_calibration_set,
+    load_inpaint_calibration_set,
+    onnx_cache_stem,
+    quantize_dynamic_int8,
+    quantize_static_onnx,
+)
+from sorawm.utils.warmup_cache import get_warmup_cache, warmup_key
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
 
 # based on the sora tempalte to detect the whole, and then got the icon part area.
 
@@ -29,6 +52,9 @@ class SoraWaterMarkDetector:
     def __init__(self):
         download_detector_weights()
         logger.debug(f"Begin to load yolo water mark detet model.")
+        # ultralytics 导入耗时较长，推迟到构造检测器时
+        from ultralytics import YOLO
+
         self.model = YOLO(WATER_MARK_DETECT_YOLO_WEIGHTS)
         self.device = get_device()
         self.model.to(str(self.device))
@@ -37,6 +63,11 @@ class SoraWaterMarkDetector:
         if USE_FP16 and self.device.type == 'cuda':
             self.model.half()
             logger.debug("Enabled FP16 inference for YOLO model")
+
+        # CPU 低精度推理（bf16 / int8），需通过精度门限校验
+        self._autocast_bf16 = False
+        if self.device.type == "cpu" and YOLO_CPU_PRECISION != CPUPrecision.FP32:
+            self._enable_cpu_precision(CPUPrecision(YOLO_CPU_PRECISION))
         
         # 模型编译优化（PyTorch 2.0+）
         self._compile_model()
@@ -100,12 +131,15 @@ class SoraWaterMarkDetector:
                 raw_result, frame_idx
             )
         
-        # 应用时序一致性检查
-        processed_result = self.temporal_detector.process_detection(raw_result, frame_idx)
-        
-        # 智能漏检处理
-        if use_advanced:
-            processed_result = self.missed_handler.process_frame(frame_idx, processed_result)
+        # 应用时序一致性检查与智能漏检处理
+        with span("detect.tracker"):
+            processed_result = self.temporal_detector.process_detection(
+                raw_result, frame_idx
+            )
+            if use_advanced:
+                processed_result = self.missed_handler.process_frame(
+                    frame_idx, processed_result
+                )
         
         # 记录最后的边界框
         if processed_result["detected"] and processed_result["bbox"] is not None:
@@ -118,7 +152,7 @@ class SoraWaterMarkDetector:
     def _standard_detection(self, input_image: np.array) -> Dict[str, Any]:
         """标准检测方法"""
         # Run YOLO inference
-        results = self.model(input_image, verbose=False)
+        results = self._predict(input_image)
         # Extract predictions from the first (and only) result
         result = results[0]
 
@@ -146,6 +180,133 @@ class SoraWaterMarkDetector:
                 "center": (int(center_x), int(center_y)),
             }
 
+    def _predict(self, images):
+        """运行 YOLO 推理，bf16 模式下包裹 CPU autocast"""
+        context = (
+            torch.autocast("cpu", dtype=torch.bfloat16)
+            if self._autocast_bf16
+            else nullcontext()
+        )
+        items = len(images) if isinstance(images, list) else 1
+        with context, span("detect.yolo", items):
+            return self.model(images, verbose=False)
+
+    def _raw_detections(self, image: np.ndarray) -> List[Tuple[Tuple[int, int, int, int], float]]:
+        """返回未经时序处理的全部检测框，供精度门限计算 mAP"""
+        result = self._predict(image)[0]
+        detections = []
+        for box in result.boxes:
+            x1, y1, x2, y2 = (int(v) for v in box.xyxy[0].cpu().numpy())
+            detections.append(((x1, y1, x2, y2), float(box.conf[0].cpu().numpy())))
+        return detections
+
+    def _enable_cpu_precision(self, mode: CPUPrecision):
+        """启用 CPU 低精度 YOLO 推理，未通过精度门限时保持 fp32"""
+        cache = get_warmup_cache()
+        cache_key = warmup_key("yolo", file_identity(WATER_MARK_DETECT_YOLO_WEIGHTS), self.device)
+        cached = cache.gate_result(cache_key, mode) if PRECISION_GATE_ENABLED else None
+        if cached is not None and not cached["passed"]:
+            logger.info(f"Reusing cached YOLO {mode} gate result")
+            describe_gate_result(mode, "YOLO", False, cached["metrics"])
+            return
+
+        # 门限结论已缓存时不需要校准集与 fp32 参考结果
+        run_gate = PRECISION_GATE_ENABLED and cached is None
+        samples = self._load_calibration_samples() if run_gate else None
+        reference = (
+            {id(image): self._raw_detections(image) for image, _ in samples}
+            if run_gate
+            else {}
+        )
+
+        try:
+            if mode == CPUPrecision.BF16:
+                if not cpu_supports_bf16():
+                    logger.warning("CPU has no native bf16 support, bf16 may be slower")
+                self.model.model.to(memory_format=torch.channels_last)
+                self._autocast_bf16 = True
+            elif mode == CPUPrecision.INT8_DYNAMIC:
+                # 先融合 Conv+BN，避免 ultralytics 在量化后的模块上再次融合
+                self.model.model.fuse()
+                self.model.model = quantize_dynamic_int8(self.model.model)
+            else:
+                self.model = self._export_static_int8_onnx(
+                    lambda: samples or self._load_calibration_samples()
+                )
+        except Exception as e:
+            logger.warning(f"Failed to build {mode} YOLO model, keep fp32: {e}")
+            self._restore_fp32()
+            return
+
+        if cached is not None:
+            logger.info(f"Reusing cached YOLO {mode} gate result")
+            describe_gate_result(mode, "YOLO", True, cached["metrics"])
+        elif run_gate:
+            try:
+                passed, reference_map, candidate_map = evaluate_detection_gate(
+                    lambda image: reference[id(image)],
+                    self._raw_detections,
+                    samples,
+                    PRECISION_GATE_MAX_MAP_DROP,
+                )
+                cache.record_gate(
+                    cache_key,
+                    mode,
+                    passed,
+                    {"fp32_map": reference_map, "candidate_map": candidate_map},
+                )
+            except Exception as e:
+                logger.warning(f"YOLO {mode} accuracy gate failed to run: {e}")
+                passed, reference_map, candidate_map = False, 0.0, 0.0
+            describe_gate_result(
+                mode,
+                "YOLO",
+                passed,
+                {"fp32_map": reference_map, "candidate_map": candidate_map},
+            )
+            if not passed:
+                self._restore_fp32()
+
+    @staticmethod
+    def _load_calibration_samples():
+        samples = [(image, gts) for image, gts in load_detection_calibration_set()]
+        if not samples:
+            # datasets/demo 缺少图像时，以 fp32 检测结果作为伪真值
+            samples = [(image, None) for image, _ in load_inpaint_calibration_set(crop_size=640)]
+        return samples
+
+    def _restore_fp32(self):
+        """低精度模式构建失败或未通过精度门限时，重新加载 fp32 权重"""
+        self._autocast_bf16 = False
+        from ultralytics import YOLO
+
+        self.model = YOLO(WATER_MARK_DETECT_YOLO_WEIGHTS)
+        self.model.to(str(self.device))
+
+    def _export_static_int8_onnx(self, load_samples) -> "YOLO":
+        """导出 YOLO ONNX 并用校准图像做静态 int8 量化，量化模型已缓存时不读取校准图像"""
+        from ultralytics import YOLO
+
+        stem = onnx_cache_stem(
+            WATER_MARK_DETECT_YOLO_WEIGHTS.stem, file_identity(WATER_MARK_DETECT_YOLO_WEIGHTS)
+        )
+        int8_path = PRECISION_CACHE_DIR / f"{stem}_int8.onnx"
+        if not int8_path.exists():
+            imgsz = 640
+            # ultralytics 总是导出到权重文件旁边，移到缓存目录，不在 resources/ 下留下文件
+            PRECISION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            fp32_path = PRECISION_CACHE_DIR / f"{stem}_fp32.onnx"
+            exported = self.model.export(format="onnx", imgsz=imgsz, dynamic=False)
+            shutil.move(exported, fp32_path)
+            calibration = []
+            for image, _ in load_samples():
+                resized = cv2.resize(image, (imgsz, imgsz), interpolation=cv2.INTER_LINEAR)
+                tensor = resized[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+                calibration.append([tensor[np.newaxis]])
+            quantize_static_onnx(fp32_path, int8_path, ["images"], calibration)
+            logger.info(f"Static int8 ONNX YOLO model saved to {int8_path}")
+        return YOLO(str(int8_path), task="detect")
+
     def _compile_model(self):
         """模型编译优化（PyTorch 2.0+）"""
         try:
@@ -163,7 +324,7 @@ class SoraWaterMarkDetector:
         try:
             dummy_input = np.random.randint(0, 255, (640, 640, 3), dtype=np.uint8)
             with torch.no_grad():
-                _ = self.model(dummy_input, verbose=False)
+                _ = self._predict(dummy_input)
             logger.debug("Model warmup completed")
         except Exception as e:
             logger.warning(f"Model warmup failed: {e}")
@@ -188,7 +349,7 @@ class SoraWaterMarkDetector:
         # 使用 torch.no_grad() 降低内存占用
         with torch.no_grad():
             # 批量推理
-            batch_results = self.model(input_images, verbose=False)
+            batch_results = self._predict(input_images)
             
             # 处理每个结果
             for i, result in enumerate(batch_results):
@@ -229,7 +390,10 @@ class SoraWaterMarkDetector:
                 )
                 
                 # 应用时序一致性检查
-                processed_result = self.temporal_detector.process_detection(raw_result, frame_idx)
+                with span("detect.tracker"):
+                    processed_result = self.temporal_detector.process_detection(
+                        raw_result, frame_idx
+                    )
                 
                 if processed_result["detected"] and processed_result["bbox"] is not None:
                     self._last_bbox = processed_result["bbox"]
@@ -251,7 +415,8 @@ class SoraWaterMarkDetector:
         if self.template_matcher is None:
             return detection_result
 
-        template_result = self.template_matcher.match(frame, previous_bbox)
+        with span("detect.template"):
+            template_result = self.template_matcher.match(frame, previous_bbox)
         if not template_result["detected"]:
             return detection_result
 
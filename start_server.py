@@ -5,7 +5,6 @@ import uvicorn
 from loguru import logger
 
 from sorawm.configs import LOGS_PATH
-from sorawm.server.app import init_app
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--host", default="0.0.0.0", help="host")
@@ -17,11 +16,15 @@ logger.add(LOGS_PATH / "log_file.log", rotation="1 week")
 
 def start_server(port=args.port, host=args.host):
     logger.info(f"Starting server at {host}:{port}")
-    app = init_app()
-    config = uvicorn.Config(app, host=host, port=port, workers=args.workers)
-    server = uvicorn.Server(config=config)
+    # 多进程需要以导入字符串 + factory 的方式启动，任务通过 sqlite 队列在进程间共享
     try:
-        server.run()
+        uvicorn.run(
+            "sorawm.server.app:init_app",
+            factory=True,
+            host=host,
+            port=int(port),
+            workers=args.workers,
+        )
     finally:
         logger.info("Server shutdown.")
 
@@ -0,0 +1,112 @@
+"""
+测试批处理大小自动调优
+用模拟的吞吐曲线驱动调优器，验证收敛到吞吐最优批大小、内存压力下回退以及结果持久化
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+from sorawm.utils.batch_autotuner import BatchSizeAutotuner
+
+CANDIDATES = (1, 2, 4, 8, 16, 32)
+MB = 1024**2
+
+
+def simulated_fps(batch_size: int) -> float:
+    """吞吐在批大小 8 之后饱和，16 时因内存带宽略有下降"""
+    return {1: 10.0, 2: 18.0, 4: 30.0, 8: 40.0, 16: 41.0, 32: 36.0}[batch_size]
+
+
+def drive(tuner: BatchSizeAutotuner, max_batches: int = 200, rss_mb=lambda size: 100):
+    """按调优器当前批大小反复上报批次结果，直到收敛"""
+    for _ in range(max_batches):
+        if tuner.converged:
+            break
+        size = tuner.batch_size
+        tuner.observe(size, size / simulated_fps(size), rss_mb(size) * MB)
+    return tuner
+
+
+def make_tuner(path: Path, **kwargs) -> BatchSizeAutotuner:
+    kwargs.setdefault("max_rss_bytes", 1024 * MB)
+    return BatchSizeAutotuner(
+        "host|1280x720|lama", 4, candidates=CANDIDATES, probe_batches=2, path=path, **kwargs
+    )
+
+
+def test_converges_to_smallest_near_optimal_size():
+    """吞吐提升不足 min_gain 时选择较小的批大小"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tuner = drive(make_tuner(Path(tmp_dir) / "autotune.json"))
+        assert tuner.converged
+        # 16 只比 8 快 2.5%，不足 5% 的门槛
+        assert tuner.batch_size == 8, tuner.batch_size
+        assert 32 not in tuner.stats
+
+
+def test_rss_ceiling_backs_off():
+    """常驻内存超过上限的批大小被排除"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tuner = drive(
+            make_tuner(Path(tmp_dir) / "autotune.json", max_rss_bytes=500 * MB),
+            rss_mb=lambda size: 80 * size,
+        )
+        assert tuner.converged
+        assert tuner.batch_size == 4, tuner.batch_size
+
+
+def test_memory_pressure_after_convergence_is_not_persisted():
+    """收敛后出现系统级内存压力时本次运行回退一档，但不改写持久化结果"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "autotune.json"
+        pressure = {"high": False}
+        tuner = drive(make_tuner(path, memory_pressure=lambda: pressure["high"]))
+        assert tuner.batch_size == 8
+
+        pressure["high"] = True
+        tuner.observe(8, 0.2, 100 * MB)
+        assert tuner.batch_size == 4
+        assert json.loads(path.read_text())[tuner.key]["batch_size"] == 8
+
+        restarted = make_tuner(path)
+        assert restarted.batch_size == 8
+
+
+def test_rss_ceiling_after_convergence_is_persisted():
+    """收敛后本进程常驻内存超限时回退一档并更新持久化结果"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "autotune.json"
+        tuner = drive(make_tuner(path))
+        assert tuner.batch_size == 8
+
+        tuner.observe(8, 0.2, 2048 * MB)
+        assert tuner.batch_size == 4
+        assert json.loads(path.read_text())[tuner.key]["batch_size"] == 4
+
+
+def test_result_is_persisted_per_key():
+    """下次运行直接从持久化的最优值开始，不同分辨率互不影响"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "autotune.json"
+        drive(make_tuner(path))
+
+        data = json.loads(path.read_text())
+        assert data["host|1280x720|lama"]["batch_size"] == 8
+
+        restarted = make_tuner(path)
+        assert restarted.converged and restarted.batch_size == 8
+
+        other = BatchSizeAutotuner(
+            "host|1920x1080|lama", 4, candidates=CANDIDATES, max_rss_bytes=1024 * MB, path=path
+        )
+        assert not other.converged and other.batch_size == 4
+
+
+if __name__ == "__main__":
+    test_converges_to_smallest_near_optimal_size()
+    test_rss_ceiling_backs_off()
+    test_memory_pressure_after_convergence_is_not_persisted()
+    test_rss_ceiling_after_convergence_is_persisted()
+    test_result_is_persisted_per_key()
+    print("All batch autotuner tests passed")
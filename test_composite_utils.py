@@ -0,0 +1,58 @@
+"""
+测试 ROI 合成的羽化 alpha
+羽化只能落在掩码外侧：掩码内 alpha 必须为 255，原水印像素不得混回输出
+"""
+
+import numpy as np
+
+from sorawm.utils.composite_utils import blend_roi_inplace, feathered_alpha
+
+
+def make_mask(height: int = 64, width: int = 96) -> np.ndarray:
+    mask = np.zeros((height, width), dtype=np.uint8)
+    mask[20:40, 30:70] = 255
+    # 细长与单像素区域，最容易被模糊削弱
+    mask[50, 10:80] = 255
+    mask[5, 5] = 255
+    return mask
+
+
+def test_alpha_is_opaque_inside_mask():
+    """所有掩码像素 alpha == 255"""
+    mask = make_mask()
+    for feather_px in (1, 3, 8):
+        alpha = feathered_alpha(mask, feather_px)
+        assert alpha.dtype == np.uint8
+        assert np.all(alpha[mask > 0] == 255), feather_px
+
+
+def test_feather_falls_outside_mask():
+    """羽化向掩码外侧延伸，远离掩码的像素保持原帧"""
+    mask = make_mask()
+    alpha = feathered_alpha(mask, 3)
+    # 掩码上边缘在第 20 行，其外侧 1 像素处已有过渡
+    assert alpha[19, 50] > 0
+    assert alpha[10, 50] == 0
+    assert alpha[0, 95] == 0
+
+
+def test_blend_removes_all_watermark_pixels():
+    """合成后掩码内像素完全来自修复结果"""
+    mask = make_mask()
+    frame = np.full((*mask.shape, 3), 200, dtype=np.uint8)
+    roi_result = np.zeros_like(frame)
+    blend_roi_inplace(frame, roi_result, feathered_alpha(mask, 3), (0, 0, mask.shape[1], mask.shape[0]))
+    assert np.all(frame[mask > 0] == 0)
+
+
+def test_no_feather_returns_mask():
+    mask = make_mask()
+    assert feathered_alpha(mask, 0) is mask
+
+
+if __name__ == "__main__":
+    test_alpha_is_opaque_inside_mask()
+    test_feather_falls_outside_mask()
+    test_blend_removes_all_watermark_pixels()
+    test_no_feather_returns_mask()
+    print("All composite tests passed")
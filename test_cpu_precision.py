@@ -0,0 +1,45 @@
+"""
+测试 CPU 动态 int8 量化
+确认量化后的模型确实包含量化算子，且 TorchScript 模型被拒绝而不是原样返回
+"""
+
+import torch
+
+from sorawm.utils.precision_utils import count_quantized_modules, quantize_dynamic_int8
+
+
+class ConvNet(torch.nn.Module):
+    """与 LaMa / YOLO 类似、以卷积为主的小模型"""
+
+    def __init__(self):
+        super().__init__()
+        self.conv1 = torch.nn.Conv2d(3, 8, 3, padding=1)
+        self.conv2 = torch.nn.Conv2d(8, 3, 3, padding=1)
+
+    def forward(self, x):
+        return self.conv2(torch.relu(self.conv1(x)))
+
+
+def test_eager_convolutions_are_quantized():
+    """eager 模型的卷积层被替换为动态量化实现，且仍可推理"""
+    quantized = quantize_dynamic_int8(ConvNet().eval())
+    assert count_quantized_modules(quantized) == 2
+    assert isinstance(quantized.conv1, torch.ao.nn.quantized.dynamic.Conv2d)
+    output = quantized(torch.rand(1, 3, 16, 16))
+    assert output.shape == (1, 3, 16, 16)
+
+
+def test_torchscript_is_rejected():
+    """TorchScript 模型只能量化 Linear，卷积模型必须回退 fp32 而不是"假装"启用 int8"""
+    scripted = torch.jit.script(ConvNet().eval())
+    try:
+        quantize_dynamic_int8(scripted)
+    except ValueError:
+        return
+    raise AssertionError("quantize_dynamic_int8 accepted a TorchScript module")
+
+
+if __name__ == "__main__":
+    test_eager_convolutions_are_quantized()
+    test_torchscript_is_rejected()
+    print("All CPU precision tests passed")
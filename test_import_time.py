@@ -0,0 +1,123 @@
+"""
+测试入口模块的导入耗时与导入副作用
+在子进程中导入，确保重型依赖（ultralytics、diffusers 等）延迟加载，
+且导入时不创建目录、不读取模板图片、不初始化 CUDA
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+# 入口模块冷启动导入耗时上限（秒），慢速机器可用环境变量放宽
+IMPORT_TIME_BUDGET_SECONDS = float(os.environ.get("SORAWM_IMPORT_BUDGET_SECONDS", "5.0"))
+# 取多次运行中的最小值，降低磁盘缓存与调度抖动的影响
+IMPORT_TIME_RUNS = 3
+
+HEAVY_MODULES = ("ultralytics", "diffusers", "transformers", "ruptures", "pandas", "sklearn")
+
+ENTRY_MODULES = (
+    "sorawm.core",
+    "sorawm.iopaint.model_manager",
+    "sorawm.utils.watermark_utls",
+)
+
+PROBE = """
+import json
+import pathlib
+import sys
+import time
+
+import cv2
+
+side_effects = []
+_mkdir, _imread = pathlib.Path.mkdir, cv2.imread
+
+
+def mkdir(self, *args, **kwargs):
+    side_effects.append(f"mkdir {self}")
+    return _mkdir(self, *args, **kwargs)
+
+
+def imread(path, *args, **kwargs):
+    side_effects.append(f"imread {path}")
+    return _imread(path, *args, **kwargs)
+
+
+pathlib.Path.mkdir = mkdir
+cv2.imread = imread
+
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+seconds = time.perf_counter() - start
+
+import torch
+
+print(json.dumps({
+    "seconds": seconds,
+    "modules": sorted({name.split(".")[0] for name in sys.modules}),
+    "side_effects": side_effects,
+    "cuda_initialized": torch.cuda.is_initialized(),
+}))
+"""
+
+
+def probe_import(*modules: str) -> dict:
+    """在干净的子进程中导入模块，返回耗时、已加载的顶层包与导入副作用"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, *modules],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_heavy_modules_are_lazy():
+    """导入入口模块不加载重型依赖"""
+    report = probe_import(*ENTRY_MODULES)
+    loaded = sorted(set(HEAVY_MODULES) & set(report["modules"]))
+    assert not loaded, f"heavy modules loaded at import time: {loaded}"
+
+
+def test_import_has_no_side_effects():
+    """导入时不创建目录、不读取模板、不初始化 CUDA"""
+    report = probe_import(*ENTRY_MODULES)
+    # 只关心本仓库目录下的文件操作，第三方库自身的缓存目录不计
+    side_effects = [item for item in report["side_effects"] if str(ROOT) in item]
+    assert not side_effects, side_effects
+    assert not report["cuda_initialized"]
+
+
+def test_import_time_budget():
+    """sorawm.core 冷启动导入耗时在预算内"""
+    seconds = min(probe_import("sorawm.core")["seconds"] for _ in range(IMPORT_TIME_RUNS))
+    print(f"import sorawm.core: {seconds:.2f}s (budget {IMPORT_TIME_BUDGET_SECONDS:.1f}s)")
+    assert seconds <= IMPORT_TIME_BUDGET_SECONDS, (
+        f"import sorawm.core took {seconds:.2f}s, budget {IMPORT_TIME_BUDGET_SECONDS:.1f}s"
+    )
+
+
+def test_model_registry_resolves_lazily():
+    """模型注册表按名称解析类，名称与擦除模型标记和类属性一致"""
+    from sorawm.iopaint.model import models
+
+    assert "lama" in models
+    assert "lama" in models.erase_model_names()
+    for name in models:
+        model_cls = models[name]
+        assert model_cls.name == name, (name, model_cls.name)
+        assert model_cls.is_erase_model == (name in models.erase_model_names()), name
+
+
+if __name__ == "__main__":
+    test_heavy_modules_are_lazy()
+    test_import_has_no_side_effects()
+    test_import_time_budget()
+    test_model_registry_resolves_lazily()
+    print("All import tests passed")
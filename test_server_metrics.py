@@ -0,0 +1,92 @@
+"""
+测试服务端 Prometheus 指标的计数与文本输出
+"""
+
+import threading
+
+from sorawm.server.metrics import MetricsRegistry, observe_stage, stage_items
+from sorawm.utils.tracing import span
+
+
+def test_counter_and_gauge():
+    """计数器累加、标签分组与仪表盘赋值"""
+    registry = MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests", ("route",))
+    depth = registry.gauge("test_depth", "Depth")
+
+    requests.inc(route="a")
+    requests.inc(2, route="a")
+    requests.inc(route="b")
+    depth.set(5)
+    depth.dec(2)
+
+    text = registry.render()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{route="a"} 3.0' in text
+    assert 'test_requests_total{route="b"} 1.0' in text
+    assert "test_depth 3.0" in text
+
+    try:
+        requests.inc(-1, route="a")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("counter accepted a negative increment")
+
+
+def test_histogram_buckets_are_cumulative():
+    """直方图桶为累计计数，并输出 +Inf、_sum 与 _count"""
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "test_latency_seconds_sum 4.05" in text
+    assert "test_latency_seconds_count 4" in text
+
+
+def test_label_values_are_escaped():
+    """标签值中的引号、反斜杠与换行需要转义"""
+    registry = MetricsRegistry()
+    counter = registry.counter("test_escape_total", "Escape", ("name",))
+    counter.inc(name='a"b\\c\nd')
+    assert 'test_escape_total{name="a\\"b\\\\c\\nd"} 1.0' in registry.render()
+
+
+def test_thread_safe_increments():
+    """多线程并发累加不丢计数"""
+    registry = MetricsRegistry()
+    counter = registry.counter("test_threads_total", "Threads")
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value() == 80000
+
+
+def test_pipeline_spans_feed_stage_metrics():
+    """流水线 span 在没有 tracer 时也会上报到阶段指标"""
+    before = stage_items.value(stage="test.stage")
+    with span("test.stage", 4):
+        pass
+    observe_stage("test.stage", 0.01, 2)
+    assert stage_items.value(stage="test.stage") == before + 6
+
+
+if __name__ == "__main__":
+    test_counter_and_gauge()
+    test_histogram_buckets_are_cumulative()
+    test_label_values_are_escaped()
+    test_thread_safe_increments()
+    test_pipeline_spans_feed_stage_metrics()
+    print("All metrics tests passed")